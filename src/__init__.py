@@ -6,7 +6,14 @@ script_path = os.path.realpath(__file__)
 def init():
     # https://stackoverflow.com/questions/1158108/python-importing-a-file-that-is-a-symbolic-link
     # Handle double-imports
-    from aqt import mw
+    try:
+        from aqt import mw
+    except ImportError:
+        # Imported outside of Anki, e.g. by the command line interface.
+        return
+
+    if mw is None:
+        return
 
     addon_folder = mw.pm.addonFolder()
     if addon_folder not in __file__:
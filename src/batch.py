@@ -0,0 +1,143 @@
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class BatchProcessingError(Exception):
+    """Raised when a message batch cannot be submitted or retrieved."""
+
+    pass
+
+
+class ReibunBatchProcessor:
+    """Submits reibun requests through the Anthropic Message Batches API.
+
+    Requests are keyed by `custom_id`. Polls each submitted batch until it has
+    ended, and re-queues only the requests that errored, expired or returned
+    an unparsable response.
+    """
+
+    ENDED = "ended"
+
+    def __init__(
+        self,
+        client,
+        process_response: Callable[[str], Dict[str, str]],
+        poll_interval: float = 60.0,
+        max_attempts: int = 3,
+        on_status: Optional[Callable[[Any], None]] = None,
+        on_usage: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        :param client: Synchronous Anthropic client.
+        :param process_response: Parses and validates the raw response text.
+        :param poll_interval: Seconds to wait between batch status checks.
+        :param max_attempts: Number of times a failed request is submitted.
+        :param on_status: Called with the `MessageBatch` after every poll.
+        :param on_usage: Called with the usage of every successful request.
+        """
+        self._client = client
+        self._process_response = process_response
+        self._poll_interval = poll_interval
+        self._max_attempts = max(1, max_attempts)
+        self._on_status = on_status
+        self._on_usage = on_usage
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Stops processing, cancelling the batch that is being waited on.
+
+        Safe to call from any thread.
+        """
+        self._cancelled.set()
+
+    def run(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        """Processes the requests, retrying failures in follow-up batches.
+
+        :param requests: Mapping of custom_id -> Messages API parameters.
+        :returns: Mapping of custom_id -> parsed response for every request that
+            succeeded. Missing custom_ids failed on every attempt.
+        """
+        responses = {}
+        pending = dict(requests)
+
+        for attempt in range(1, self._max_attempts + 1):
+            if not pending or self._cancelled.is_set():
+                break
+
+            log.debug(f"Submitting batch of {len(pending)} requests (attempt {attempt}).")
+            batch_id = self._submit(pending)
+            if not self._wait_for_batch(batch_id):
+                break
+
+            succeeded, failed = self._collect_results(batch_id, pending)
+            responses.update(succeeded)
+            pending = {custom_id: pending[custom_id] for custom_id in failed}
+
+            if pending:
+                log.warning(f"{len(pending)} batch requests failed, re-queuing.")
+
+        return responses
+
+    def _submit(self, requests: Dict[str, Dict[str, Any]]) -> str:
+        try:
+            batch = self._client.messages.batches.create(
+                requests=[
+                    {"custom_id": custom_id, "params": params}
+                    for custom_id, params in requests.items()
+                ]
+            )
+        except Exception as e:
+            raise BatchProcessingError(f"Failed to submit message batch: {e}") from e
+
+        return batch.id
+
+    def _wait_for_batch(self, batch_id: str) -> bool:
+        """Blocks until the batch has ended.
+
+        :returns: False if processing was cancelled before the batch ended.
+        """
+        while True:
+            batch = self._client.messages.batches.retrieve(batch_id)
+            if self._on_status is not None:
+                self._on_status(batch)
+
+            if batch.processing_status == self.ENDED:
+                return True
+
+            if self._cancelled.is_set():
+                log.debug(f"Cancelling message batch {batch_id}.")
+                self._client.messages.batches.cancel(batch_id)
+                return False
+
+            # Woken early by `cancel`, to cancel the batch straight away.
+            self._cancelled.wait(self._poll_interval)
+
+    def _collect_results(
+        self, batch_id: str, requests: Dict[str, Dict[str, Any]]
+    ) -> Tuple[Dict[str, Dict[str, str]], Set[str]]:
+        succeeded = {}
+        for entry in self._client.messages.batches.results(batch_id):
+            if entry.custom_id not in requests:
+                continue
+
+            if entry.result.type != "succeeded":
+                log.error(f"Batch request {entry.custom_id} {entry.result.type}.")
+                continue
+
+            if self._on_usage is not None:
+                self._on_usage(entry.result.message.usage)
+
+            try:
+                response_content = entry.result.message.content[0].text
+                succeeded[entry.custom_id] = self._process_response(response_content)
+            except Exception as e:
+                log.error(f"Invalid batch response for {entry.custom_id}: {e}")
+
+        # Anything without a usable result (errored, expired, cancelled or
+        # missing from the results file) gets re-queued.
+        failed = set(requests) - set(succeeded)
+        return succeeded, failed
@@ -0,0 +1,436 @@
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .config import AnkiConfig
+from .constants import ConfigKeys, NoteConfig
+from .metrics import metrics
+from .paths import user_files_path
+from .reibun import ReibunGenerator
+from .sqlite_store import chunked
+from .utils import get_note_type, get_note_type_fields, strip_html_tags
+
+from aqt import mw, QAction
+from aqt.browser import Browser
+from aqt.operations import CollectionOp, QueryOp
+from aqt.qt import QTimer
+from aqt.utils import showWarning, tooltip
+from anki.collection import Collection, OpChanges
+from anki.notes import Note, NoteId
+
+if TYPE_CHECKING:
+    from .batch import ReibunBatchProcessor
+    from .bulk import BulkItem, BulkProgress, BulkReibunRunner, BulkResult
+    from .job_queue import BulkJobQueue
+    from .selection import NoteSelector
+
+log = logging.getLogger(__name__)
+
+UNDO_LABEL = "Generate Smart Reibun"
+WATERMARKS_FILENAME = "generation_watermarks.sqlite3"
+JOB_QUEUE_FILENAME = "bulk_jobs.sqlite3"
+
+# How often the progress dialog's cancel button is checked during a run.
+CANCEL_CHECK_INTERVAL_MS = 250
+
+
+class ReibunBrowserHook:
+    """Handles Anki browser hook operations for bulk Reibun generation."""
+
+    def __init__(self, config: AnkiConfig, generator: ReibunGenerator):
+        self.config = config
+        self.generator = generator
+        self._selector: Optional["NoteSelector"] = None
+        self._job_queue: Optional["BulkJobQueue"] = None
+        # Runs take minutes to hours and only modify notes in memory, so they
+        # run here instead of holding Anki's collection worker.
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="reibun-bulk"
+        )
+
+    @property
+    def selector(self) -> "NoteSelector":
+        # Created on first use, to keep the anki search imports and the
+        # watermark database out of Anki's startup.
+        if self._selector is None:
+            from .selection import GenerationWatermarks, NoteSelector
+
+            self._selector = NoteSelector(
+                self.config,
+                GenerationWatermarks(user_files_path(WATERMARKS_FILENAME)),
+            )
+        return self._selector
+
+    @property
+    def job_queue(self) -> "BulkJobQueue":
+        if self._job_queue is None:
+            from .job_queue import BulkJobQueue
+
+            self._job_queue = BulkJobQueue(user_files_path(JOB_QUEUE_FILENAME))
+        return self._job_queue
+
+    def on_note_generated(self, note: Note) -> None:
+        """Records a reibun generated outside of bulk runs, e.g. from the
+        editor, so the note isn't selected as missing one."""
+        self.selector.record_generated([note])
+
+    def on_browser_menus_did_init(self, browser: Browser) -> None:
+        """Adds the bulk generation actions to the browser's Notes menu.
+
+        The browser's table context menu mirrors the Notes menu, so the actions
+        are also available on right-click.
+        """
+        generate_action = QAction("📝 Generate Smart Reibun for Selected Notes", browser)
+        generate_action.triggered.connect(
+            lambda: self.handle_bulk_generation(browser)
+        )
+
+        pending_action = QAction(
+            "📝 Generate Smart Reibun for Notes Missing It", browser
+        )
+        pending_action.triggered.connect(
+            lambda: self.handle_pending_generation(browser)
+        )
+
+        resume_action = QAction(
+            "📝 Resume Interrupted Smart Reibun Generation", browser
+        )
+        resume_action.triggered.connect(lambda: self.handle_resume_generation(browser))
+
+        batch_action = QAction(
+            "📝 Generate Smart Reibun for Selected Notes (Message Batch)", browser
+        )
+        batch_action.triggered.connect(lambda: self.handle_batch_generation(browser))
+
+        browser.form.menu_Notes.addSeparator()
+        browser.form.menu_Notes.addAction(generate_action)
+        browser.form.menu_Notes.addAction(pending_action)
+        browser.form.menu_Notes.addAction(resume_action)
+        browser.form.menu_Notes.addAction(batch_action)
+
+    def handle_bulk_generation(self, browser: Browser) -> None:
+        """Generates reibun for every selected note in the browser.
+
+        :param browser: Browser instance.
+        """
+        note_ids = browser.selected_notes()
+        if not note_ids:
+            tooltip("No notes selected.", parent=browser)
+            return
+
+        self._start_bulk_generation(browser, lambda col: note_ids)
+
+    def handle_pending_generation(self, browser: Browser) -> None:
+        """Generates reibun for every note in the collection whose sentence
+        field is empty, or that was edited since its reibun was generated.
+
+        :param browser: Browser instance.
+        """
+        self._start_bulk_generation(browser, self.selector.select)
+
+    def handle_resume_generation(self, browser: Browser) -> None:
+        """Finishes the notes of bulk runs that were interrupted, e.g. by Anki
+        closing, before their results were saved.
+
+        Notes that were already generated are saved from the responses kept in
+        the job queue, without requesting them again.
+
+        :param browser: Browser instance.
+        """
+        note_ids = self.job_queue.unfinished()
+        if not note_ids:
+            tooltip("No interrupted Smart Reibun generation to resume.", parent=browser)
+            return
+
+        self._start_bulk_generation(
+            browser, lambda col: self._existing_notes(col, note_ids)
+        )
+
+    def _existing_notes(
+        self, col: Collection, note_ids: Sequence[NoteId]
+    ) -> List[NoteId]:
+        # Notes may have been deleted since the run was interrupted.
+        existing = []
+        for chunk in chunked(list(note_ids)):
+            placeholders = ",".join("?" * len(chunk))
+            existing += col.db.list(
+                f"SELECT id FROM notes WHERE id IN ({placeholders})", *chunk
+            )
+        return sorted(existing)
+
+    def _start_bulk_generation(
+        self,
+        browser: Browser,
+        select_notes: Callable[[Collection], Sequence[NoteId]],
+        generate: Optional[Callable[[Browser, List["BulkItem"], int], None]] = None,
+        failure_message: str = "Bulk Smart Reibun generation failed",
+    ) -> None:
+        """Collects the notes' items in a short collection op, then generates
+        them off the collection.
+
+        :param generate: Starts the generation of the collected items and the
+            number of skipped notes, defaults to `_generate_bulk`.
+        """
+        generate = generate or self._generate_bulk
+        query_op = QueryOp(
+            parent=browser,
+            op=lambda col: self._collect_bulk_items(col, select_notes(col)),
+            success=lambda collected: generate(browser, *collected),
+        )
+        query_op.failure(lambda e: showWarning(f"{failure_message}: {e}"))
+        query_op.with_progress("Collecting notes...").run_in_background()
+
+    def _generate_bulk(
+        self, browser: Browser, items: List["BulkItem"], skipped: int
+    ) -> None:
+        from .bulk import BulkReibunRunner
+
+        concurrency = getattr(self.config, ConfigKeys.BULK_CONCURRENCY)
+        runner = BulkReibunRunner(
+            self.generator,
+            concurrency=concurrency,
+            pack_token_budget=getattr(self.config, ConfigKeys.PACK_TOKEN_BUDGET),
+            on_progress=lambda progress: mw.taskman.run_on_main(
+                lambda: self._update_progress(progress)
+            ),
+            job_queue=self.job_queue,
+        )
+        self._run_off_collection(
+            browser,
+            "Generating Smart Reibun...",
+            lambda: self._run_bulk_generation(items, runner),
+            runner.cancel,
+            skipped,
+            failure_message="Bulk Smart Reibun generation failed",
+        )
+
+    def _run_off_collection(
+        self,
+        browser: Browser,
+        label: str,
+        generate: Callable[[], "BulkResult"],
+        cancel: Callable[[], None],
+        skipped: int,
+        failure_message: str,
+    ) -> None:
+        """Runs a generation on the add-on's executor, leaving the collection
+        free for other ops, e.g. the editor saving notes, while it runs. The
+        generated notes are then saved by `_on_bulk_generation_finished`.
+
+        :param cancel: Called from the main thread once the progress dialog
+            is cancelled.
+        :param skipped: Number of notes skipped while collecting the items.
+        """
+        mw.progress.start(label=label, parent=browser)
+
+        # Checked on a timer, as a message batch only reports progress once
+        # per poll.
+        cancel_timer = QTimer(mw)
+        cancel_timer.timeout.connect(lambda: mw.progress.want_cancel() and cancel())
+        cancel_timer.start(CANCEL_CHECK_INTERVAL_MS)
+
+        def on_done(future: "Future[BulkResult]") -> None:
+            cancel_timer.stop()
+            cancel_timer.deleteLater()
+            mw.progress.finish()
+            try:
+                result = future.result()
+            except Exception as e:
+                showWarning(f"{failure_message}: {e}")
+                return
+
+            result.skipped = skipped
+            self._on_bulk_generation_finished(browser, result)
+
+        future = self._executor.submit(generate)
+        future.add_done_callback(
+            lambda future: mw.taskman.run_on_main(lambda: on_done(future))
+        )
+
+    def handle_batch_generation(self, browser: Browser) -> None:
+        """Generates reibun for every selected note via the Message Batches API.
+
+        Batches can take a long time to complete, so this is intended for large
+        offline backfills where cost matters more than latency.
+
+        :param browser: Browser instance.
+        """
+        note_ids = browser.selected_notes()
+        if not note_ids:
+            tooltip("No notes selected.", parent=browser)
+            return
+
+        self._start_bulk_generation(
+            browser,
+            lambda col: note_ids,
+            generate=self._generate_batch,
+            failure_message="Batch Smart Reibun generation failed",
+        )
+
+    def _generate_batch(
+        self, browser: Browser, items: List["BulkItem"], skipped: int
+    ) -> None:
+        processor = self.generator.create_batch_processor(
+            on_status=lambda batch: mw.taskman.run_on_main(
+                lambda: self._update_batch_progress(batch)
+            ),
+        )
+        self._run_off_collection(
+            browser,
+            "Submitting message batch...",
+            lambda: self._run_batch_generation(items, processor),
+            processor.cancel,
+            skipped,
+            failure_message="Batch Smart Reibun generation failed",
+        )
+
+    def _run_batch_generation(
+        self, items: List["BulkItem"], processor: "ReibunBatchProcessor"
+    ) -> "BulkResult":
+        log.debug(f"Starting batch generation for {len(items)} notes.")
+        self.generator.load_corpus()
+
+        with metrics.profile("batch_generation", enabled=self.config.profile_mode):
+            return self.generator.update_note_fields_batch(items, processor)
+
+    def _update_batch_progress(self, batch) -> None:
+        counts = batch.request_counts
+        finished = counts.succeeded + counts.errored + counts.canceled + counts.expired
+        total = finished + counts.processing
+        mw.progress.update(
+            label=f"Waiting for message batch: {finished}/{total} requests processed",
+            value=finished,
+            max=total,
+        )
+
+    def _run_bulk_generation(
+        self, items: List["BulkItem"], runner: "BulkReibunRunner"
+    ) -> "BulkResult":
+        log.debug(f"Starting bulk generation for {len(items)} notes.")
+        # Built here if needed, rather than on the run's event loop.
+        self.generator.load_corpus()
+
+        with metrics.profile("bulk_generation", enabled=self.config.profile_mode):
+            return runner.run(items)
+
+    def _collect_bulk_items(
+        self, col: Collection, note_ids: Sequence[NoteId]
+    ) -> Tuple[List["BulkItem"], int]:
+        from .bulk import BulkItem
+
+        items = []
+        skipped = 0
+        # Selections are usually many notes of a few note types, so resolve each
+        # note type's config and target field once rather than per note.
+        note_types: Dict[int, Tuple[Dict[str, Any], Optional[int]]] = {}
+        for note_id in note_ids:
+            note = col.get_note(note_id)
+            if note.mid not in note_types:
+                note_types[note.mid] = self._resolve_bulk_note_type(note)
+            note_type_config, target_ord = note_types[note.mid]
+
+            if target_ord is None:
+                skipped += 1
+                continue
+
+            target_phrase = strip_html_tags(note.fields[target_ord])
+            if not target_phrase:
+                skipped += 1
+                continue
+
+            items.append(
+                BulkItem(
+                    note=note,
+                    target_phrase=target_phrase,
+                    field_mappings=note_type_config,
+                    difficulty=note_type_config.get(NoteConfig.DIFFICULTY),
+                    context_type=note_type_config.get(NoteConfig.CONTEXT),
+                )
+            )
+
+        return items, skipped
+
+    def _resolve_bulk_note_type(
+        self, note: Note
+    ) -> Tuple[Dict[str, Any], Optional[int]]:
+        """Looks up the config and target field ordinal of a note's type.
+
+        :returns: The note type config, and the ordinal of the target field or
+            None if notes of this type can't be generated for.
+        """
+        note_type_config = self.config.get_note_type_config(get_note_type(note))
+        fields = get_note_type_fields(note.note_type())
+
+        # The target field is recorded the first time a reibun is generated
+        # from the editor for this note type.
+        target_field_name = note_type_config.get(NoteConfig.TARGET)
+        if not target_field_name or not note_type_config.get(NoteConfig.FIELDS):
+            return note_type_config, None
+
+        return note_type_config, fields.ords.get(target_field_name)
+
+    def _update_progress(self, progress: "BulkProgress") -> None:
+        mw.progress.update(
+            label=progress.format_label(),
+            value=progress.processed,
+            max=progress.total,
+        )
+
+    def _write_notes(self, col: Collection, notes: List[Note]) -> OpChanges:
+        """Writes the generated notes back in chunks.
+
+        Each chunk is its own SQL transaction, so progress can be reported
+        between them and no single transaction grows with the selection. The
+        whole write still runs in one `CollectionOp`, which holds the
+        collection until the last chunk is written. The chunks are merged into
+        a single undo entry and the UI is only refreshed once, from the
+        returned changes.
+        """
+        chunk_size = max(1, getattr(self.config, ConfigKeys.WRITE_CHUNK_SIZE))
+        undo_entry = col.add_custom_undo_entry(UNDO_LABEL)
+
+        with metrics.span("note_write", notes=len(notes), chunk_size=chunk_size):
+            for start in range(0, len(notes), chunk_size):
+                chunk = notes[start : start + chunk_size]
+                col.update_notes(chunk)
+                col.merge_undo_entries(undo_entry)
+                self.job_queue.mark_applied([note.id for note in chunk])
+                self.selector.record_generated(chunk)
+
+                written = min(start + chunk_size, len(notes))
+                mw.taskman.run_on_main(
+                    lambda written=written: mw.progress.update(
+                        label=f"Saved {written}/{len(notes)} notes",
+                        value=written,
+                        max=len(notes),
+                    )
+                )
+
+        return col.merge_undo_entries(undo_entry)
+
+    def _on_bulk_generation_finished(
+        self, browser: Browser, result: "BulkResult"
+    ) -> None:
+        if not result.updated_notes:
+            tooltip(result.format_summary(), parent=browser)
+            return
+
+        def on_success(_) -> None:
+            mw.progress.finish()
+            tooltip(result.format_summary(), parent=browser)
+
+        def on_failure(e: Exception) -> None:
+            mw.progress.finish()
+            showWarning(f"Failed to save Smart Reibun: {e}")
+
+        # Updated by `_write_notes` as each chunk is written.
+        mw.progress.start(
+            label="Saving Smart Reibun...",
+            max=len(result.updated_notes),
+            parent=browser,
+        )
+        CollectionOp(
+            parent=browser,
+            op=lambda col: self._write_notes(col, result.updated_notes),
+        ).success(on_success).failure(on_failure).run_in_background()
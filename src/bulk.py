@@ -0,0 +1,239 @@
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+if TYPE_CHECKING:
+    from .job_queue import BulkJobQueue
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BulkItem:
+    """A single note queued for bulk sentence generation."""
+
+    note: Any
+    target_phrase: str
+    field_mappings: Dict[str, Any]
+    difficulty: Optional[str] = None
+    context_type: Optional[str] = None
+
+
+@dataclass
+class BulkProgress:
+    """Tracks the progress and throughput of a bulk generation run."""
+
+    total: int
+    completed: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def processed(self) -> int:
+        return self.completed + self.failed
+
+    @property
+    def notes_per_minute(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        if elapsed <= 0:
+            return 0.0
+        return self.processed / elapsed * 60
+
+    def format_label(self) -> str:
+        label = f"Generated {self.processed}/{self.total} notes"
+        label += f" ({self.notes_per_minute:.1f} notes/min)"
+        if self.failed:
+            label += f", {self.failed} failed"
+        return label
+
+
+@dataclass
+class BulkResult:
+    updated_notes: List[Any] = field(default_factory=list)
+    failed_notes: List[Any] = field(default_factory=list)
+    skipped: int = 0
+    cancelled: bool = False
+
+    def format_summary(self) -> str:
+        summary = f"Generated Smart Reibun for {len(self.updated_notes)} notes."
+        if self.failed_notes:
+            summary += f" {len(self.failed_notes)} failed."
+        if self.skipped:
+            summary += f" {self.skipped} skipped (no configured target field)."
+        if self.cancelled:
+            summary += " Generation was cancelled."
+        return summary
+
+
+class BulkReibunRunner:
+    """Generates reibun for many notes using a bounded pool of async workers.
+
+    When `pack_token_budget` is set, notes are grouped into packs that are each
+    generated with a single request.
+
+    When a `job_queue` is given, every response is checkpointed in it before
+    being applied, and notes already generated by an interrupted run are
+    applied from the queue instead of being requested again.
+
+    Notes are only modified in memory, the caller is responsible for writing
+    `BulkResult.updated_notes` back to the collection.
+    """
+
+    def __init__(
+        self,
+        generator,
+        concurrency: int = 8,
+        on_progress: Optional[Callable[[BulkProgress], None]] = None,
+        pack_token_budget: int = 0,
+        job_queue: Optional["BulkJobQueue"] = None,
+    ):
+        self._generator = generator
+        self._job_queue = job_queue
+        self._concurrency = max(1, int(concurrency))
+        self._pack_token_budget = pack_token_budget
+        self._on_progress = on_progress
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def run(self, items: List[BulkItem]) -> BulkResult:
+        """Runs the pipeline to completion on a fresh event loop.
+
+        Intended to be invoked from a background thread.
+        """
+        return asyncio.run(self._run(items))
+
+    async def _run(self, items: List[BulkItem]) -> BulkResult:
+        result = BulkResult()
+        progress = BulkProgress(total=len(items))
+
+        if self._job_queue is not None:
+            items = self._apply_stored(items, result, progress)
+
+        if self._pack_token_budget > 0:
+            packs = self._generator.plan_packs(items, self._pack_token_budget)
+        else:
+            packs = [[item] for item in items]
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for pack in packs:
+            queue.put_nowait(pack)
+
+        client = self._generator.create_async_client()
+        async with client:
+            workers = [
+                asyncio.create_task(self._worker(client, queue, result, progress))
+                for _ in range(min(self._concurrency, len(packs)))
+            ]
+            await asyncio.gather(*workers)
+
+        result.cancelled = self._cancelled
+        return result
+
+    async def _worker(
+        self,
+        client,
+        queue: asyncio.Queue,
+        result: BulkResult,
+        progress: BulkProgress,
+    ) -> None:
+        while not self._cancelled:
+            try:
+                pack = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            if self._job_queue is not None:
+                self._job_queue.mark_in_flight(item.note.id for item in pack)
+
+            responses = await self._generate(client, pack)
+            if self._job_queue is not None:
+                self._job_queue.store_responses(
+                    {item.note.id: response for item, response in zip(pack, responses)}
+                )
+
+            for item, response in zip(pack, responses):
+                self._apply(item, response, result, progress)
+
+            self._report_progress(progress)
+
+    def _apply_stored(
+        self, items: List[BulkItem], result: BulkResult, progress: BulkProgress
+    ) -> List[BulkItem]:
+        """Applies the responses already stored for `items` by an earlier run.
+
+        :returns: The items that still need to be generated.
+        """
+        stored = self._job_queue.enqueue(items)
+        if not stored:
+            return items
+
+        remaining = []
+        for item in items:
+            response = stored.get(item.note.id)
+            if response is None:
+                remaining.append(item)
+            else:
+                self._apply(item, response, result, progress)
+
+        self._report_progress(progress)
+        return remaining
+
+    def _apply(
+        self,
+        item: BulkItem,
+        response: Dict[str, str],
+        result: BulkResult,
+        progress: BulkProgress,
+    ) -> None:
+        success = False
+        if response:
+            try:
+                self._generator.apply_response(
+                    item.note, response, item.field_mappings
+                )
+                success = True
+            except Exception as e:
+                log.error(f"Failed to update note: {e}")
+                if self._job_queue is not None:
+                    self._job_queue.mark_failed([item.note.id], str(e))
+
+        if success:
+            progress.completed += 1
+            result.updated_notes.append(item.note)
+        else:
+            progress.failed += 1
+            result.failed_notes.append(item.note)
+
+    async def _generate(self, client, pack: List[BulkItem]) -> List[Dict[str, str]]:
+        try:
+            if len(pack) > 1:
+                return await self._generator.generate_packed_responses_async(
+                    client, pack
+                )
+
+            item = pack[0]
+            response = await self._generator.generate_response_async(
+                client,
+                item.target_phrase,
+                difficulty=item.difficulty,
+                context=item.context_type,
+            )
+            return [response]
+
+        except Exception as e:
+            log.error(f"Bulk generation failed for {len(pack)} notes: {e}")
+            return [{}] * len(pack)
+
+    def _report_progress(self, progress: BulkProgress) -> None:
+        if self._on_progress is None:
+            return
+
+        try:
+            self._on_progress(progress)
+        except Exception as e:
+            log.debug(f"Progress callback failed: {e}")
@@ -0,0 +1,127 @@
+from typing import Any, Dict, Optional
+
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+
+from .sqlite_store import evict_least_recent, open_db
+
+log = logging.getLogger(__name__)
+
+
+def normalize_word(word: str) -> str:
+    """Normalizes full/half-width variants and surrounding whitespace."""
+    return unicodedata.normalize("NFKC", word).strip().casefold()
+
+
+class ResponseCache:
+    """SQLite-backed cache of parsed LLM responses.
+
+    Entries expire after `ttl_seconds` and the least recently used entries are
+    evicted once the cache holds more than `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 0):
+        """
+        :param path: Location of the SQLite database file.
+        :param max_entries: Maximum number of cached responses.
+        :param ttl_seconds: Lifetime of a cached response, 0 disables expiry.
+        """
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._conn = open_db(
+            path,
+            [
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""",
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)",
+            ],
+        )
+        self.purge_expired()
+
+    @staticmethod
+    def make_key(
+        word: str,
+        difficulty: Optional[str],
+        context: Optional[str],
+        prompt: str,
+        model: str,
+    ) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        key_parts = [normalize_word(word), difficulty, context, prompt_hash, model]
+        return hashlib.sha256(
+            json.dumps(key_parts, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created = row
+            if self._is_expired(created, now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+            )
+
+        try:
+            return json.loads(response)
+        except json.JSONDecodeError:
+            log.warning(f"Discarding corrupt cache entry {key}.")
+            self.delete(key)
+            return None
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response, ensure_ascii=False), now, now),
+            )
+            evict_least_recent(self._conn, "responses", "key", self._max_entries)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def purge_expired(self) -> None:
+        if not self._ttl_seconds:
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (time.time() - self._ttl_seconds,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return bool(self._ttl_seconds) and created < now - self._ttl_seconds
@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from .cache import normalize_word
+from .sqlite_store import evict_least_recent, open_db
+
+log = logging.getLogger(__name__)
+
+
+class CandidatePool:
+    """SQLite-backed pools of alternative reibun, one pool per note and word.
+
+    A pool holds every valid candidate returned by a multi-candidate request
+    along with a cursor to the one currently applied, so further candidates
+    can be shown without another request, including after a restart. The
+    least recently used pools are evicted once more than `max_pools` are held.
+    """
+
+    def __init__(self, path: str, max_pools: int = 5000):
+        """
+        :param path: Location of the SQLite database file.
+        :param max_pools: Maximum number of pools kept.
+        """
+        self._max_pools = max_pools
+
+        self._lock = threading.Lock()
+        self._conn = open_db(
+            path,
+            [
+                """CREATE TABLE IF NOT EXISTS pools (
+                    key TEXT PRIMARY KEY,
+                    note_id INTEGER NOT NULL,
+                    candidates TEXT NOT NULL,
+                    cursor INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                )""",
+                "CREATE INDEX IF NOT EXISTS pools_accessed ON pools (accessed)",
+            ],
+        )
+
+    @staticmethod
+    def make_key(
+        note_id: int, word: str, difficulty: Optional[str], context: Optional[str]
+    ) -> str:
+        key_parts = [note_id, normalize_word(word), difficulty, context]
+        return hashlib.sha256(
+            json.dumps(key_parts, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def store(
+        self, key: str, note_id: int, candidates: List[Dict[str, Any]]
+    ) -> None:
+        """Replaces the pool for `key`, with the first candidate current."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pools (key, note_id, candidates, cursor, "
+                "accessed) VALUES (?, ?, ?, 0, ?)",
+                (
+                    key,
+                    note_id,
+                    json.dumps(candidates, ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+            evict_least_recent(self._conn, "pools", "key", self._max_pools)
+
+    def current(self, key: str) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        """Returns the current candidate without moving the cursor.
+
+        :returns: `(index, pool size, candidate)`, or None if there's no pool.
+        """
+        return self._select(key, step=0)
+
+    def advance(self, key: str) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        """Moves to the next candidate, wrapping around after the last one.
+
+        :returns: `(index, pool size, candidate)`, or None if there's no pool.
+        """
+        return self._select(key, step=1)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM pools WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM pools")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pools").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _select(self, key: str, step: int) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT candidates, cursor FROM pools WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            try:
+                candidates = json.loads(row[0])
+            except json.JSONDecodeError:
+                candidates = None
+            if not candidates:
+                log.warning(f"Discarding corrupt candidate pool {key}.")
+                self._conn.execute("DELETE FROM pools WHERE key = ?", (key,))
+                return None
+
+            cursor = (row[1] + step) % len(candidates)
+            self._conn.execute(
+                "UPDATE pools SET cursor = ?, accessed = ? WHERE key = ?",
+                (cursor, time.time(), key),
+            )
+
+        return cursor, len(candidates), candidates[cursor]
@@ -0,0 +1,328 @@
+"""Generates reibun for a word list without running Anki.
+
+Reads target words from a CSV/TSV file or an exported `.apkg` deck, generates
+a reibun for each with a pool of worker processes, and writes every row with
+its generated fields to an output CSV/TSV as soon as it's done. Run it from the
+folder containing the add-on, so the add-on can be imported as a package::
+
+    python -m reibun_koubou.cli words.tsv out.tsv --word-column Word --workers 4
+
+Rows are read lazily and only a bounded window of rows is in flight at once,
+so memory use doesn't grow with the size of the input. Rows whose output
+columns are already filled are copied through as is, so a partial output can
+be used as the input of a rerun.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import os
+import csv
+import sys
+import json
+import shutil
+import logging
+import sqlite3
+import zipfile
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.util import Finalize
+
+from .config import AnkiConfig
+from .constants import ConfigKeys, ResponseFields
+from .metrics import metrics
+from .reibun import ReibunGenerator
+
+log = logging.getLogger(__name__)
+
+# Rows submitted to the pool per worker before waiting on the oldest one.
+PENDING_PER_WORKER = 4
+
+# Anki separates the fields of a note with this character.
+FIELD_SEPARATOR = "\x1f"
+
+# The generator used by each worker process, see `_init_worker`.
+_worker_generator: Optional[ReibunGenerator] = None
+
+
+def read_delimited(
+    path: str, delimiter: str
+) -> Tuple[List[str], Iterator[Dict[str, str]]]:
+    """Reads a CSV/TSV file with a header row.
+
+    :returns: The column names, and an iterator over the rows.
+    """
+    f = open(path, newline="", encoding="utf-8-sig")
+    reader = csv.DictReader(f, delimiter=delimiter)
+    columns = list(reader.fieldnames or [])
+
+    def rows() -> Iterator[Dict[str, str]]:
+        with f:
+            yield from reader
+
+    return columns, rows()
+
+
+def read_apkg(
+    path: str, word_field: str, work_dir: str
+) -> Tuple[List[str], Iterator[Dict[str, str]]]:
+    """Reads the notes of an exported deck that have a `word_field` field.
+
+    Each row holds the note's guid and target word, the guid lets Anki's CSV
+    import update the original notes.
+
+    :returns: The column names, and an iterator over the rows.
+    """
+    with zipfile.ZipFile(path) as package:
+        names = set(package.namelist())
+        # Newer exports compress the collection, which needs Anki to read.
+        for name in ("collection.anki21", "collection.anki2"):
+            if name in names:
+                database = package.extract(name, work_dir)
+                break
+        else:
+            raise ValueError(
+                f"{path} has no legacy collection, export it with "
+                "'Support older Anki versions' enabled."
+            )
+
+    conn = sqlite3.connect(database)
+    field_ords = _read_field_ords(conn, word_field)
+
+    def rows() -> Iterator[Dict[str, str]]:
+        try:
+            cursor = conn.execute("SELECT guid, mid, flds FROM notes ORDER BY id")
+            for guid, mid, flds in cursor:
+                ord = field_ords.get(mid)
+                if ord is None:
+                    continue
+                fields = flds.split(FIELD_SEPARATOR)
+                yield {"guid": guid, word_field: fields[ord]}
+        finally:
+            conn.close()
+
+    return ["guid", word_field], rows()
+
+
+def _read_field_ords(conn: sqlite3.Connection, field_name: str) -> Dict[int, int]:
+    """Maps each note type id to the ordinal of its `field_name` field."""
+    try:
+        rows = conn.execute(
+            "SELECT ntid, ord FROM fields WHERE name = ?", (field_name,)
+        ).fetchall()
+        return {ntid: ord for ntid, ord in rows}
+    except sqlite3.OperationalError:
+        pass
+
+    # Collections before schema 15 keep note types as JSON.
+    (models,) = conn.execute("SELECT models FROM col").fetchone()
+    ords = {}
+    for mid, model in json.loads(models).items():
+        for field in model["flds"]:
+            if field["name"] == field_name:
+                ords[int(mid)] = field["ord"]
+    return ords
+
+
+def _create_config(overrides: Dict[str, Any]) -> AnkiConfig:
+    config = AnkiConfig()
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
+
+
+def _init_worker(overrides: Dict[str, Any], metrics_dir: str) -> None:
+    global _worker_generator
+
+    # The metrics exports aren't safe to share between processes.
+    metrics._directory = os.path.join(metrics_dir, f"worker-{os.getpid()}")
+    os.makedirs(metrics._directory, exist_ok=True)
+    # Workers skip atexit handlers, but run multiprocessing's finalizers.
+    Finalize(None, metrics.flush, exitpriority=10)
+    _worker_generator = ReibunGenerator(_create_config(overrides))
+    # Only opens the index `main` has built.
+    _worker_generator.load_corpus()
+
+
+def _generate(
+    word: str, difficulty: Optional[str], context: Optional[str]
+) -> Dict[str, str]:
+    try:
+        return _worker_generator.generate_response(
+            word, difficulty=difficulty, context=context
+        )
+    finally:
+        # The writer thread dies with the worker, without waiting for it.
+        metrics.wait_for_events()
+
+
+def parse_mappings(values: List[str]) -> Dict[str, str]:
+    """Parses `response_field=column` pairs, every response field defaults to
+    a column of the same name."""
+    mappings = {field: field for field in ResponseFields.required_fields}
+    for value in values:
+        response_field, _, column = value.partition("=")
+        if response_field not in mappings or not column:
+            raise ValueError(f"Invalid mapping: {value}")
+        mappings[response_field] = column
+    return mappings
+
+
+def worker_overrides(workers: int, config_path: Optional[str]) -> Dict[str, Any]:
+    """Config for each worker, the rate limits are split between workers as
+    each one paces its own requests."""
+    config = AnkiConfig()
+    overrides: Dict[str, Any] = {}
+    if config_path:
+        with open(config_path, encoding="utf-8") as f:
+            overrides.update(json.load(f))
+
+    unknown = set(overrides) - set(ConfigKeys.allowed_keys)
+    if unknown:
+        raise ValueError(f"Unknown config options: {', '.join(sorted(unknown))}")
+
+    for key in (ConfigKeys.RATE_LIMIT_RPM, ConfigKeys.RATE_LIMIT_TPM):
+        limit = overrides.get(key, getattr(config, key))
+        overrides[key] = max(1, limit // workers)
+    return overrides
+
+
+def run(
+    rows: Iterator[Dict[str, str]],
+    writer: csv.DictWriter,
+    word_column: str,
+    mappings: Dict[str, str],
+    pool: ProcessPoolExecutor,
+    max_pending: int,
+    difficulty: Optional[str] = None,
+    context: Optional[str] = None,
+) -> Tuple[int, int, int]:
+    """Generates for each row and writes the rows back in input order.
+
+    :returns: The number of generated, failed and skipped rows.
+    """
+    generated = failed = skipped = 0
+    pending: "deque[Tuple[Dict[str, str], Optional[Future]]]" = deque()
+
+    def write_oldest() -> None:
+        nonlocal generated, failed
+        row, future = pending.popleft()
+        if future is not None:
+            response = None
+            try:
+                response = future.result()
+            except Exception as e:
+                log.error(f"Failed to generate for {row[word_column]}: {e}")
+
+            if response:
+                for response_field, column in mappings.items():
+                    if response_field in response:
+                        row[column] = response[response_field]
+                generated += 1
+            else:
+                failed += 1
+
+        writer.writerow(row)
+
+    for row in rows:
+        word = (row.get(word_column) or "").strip()
+        if not word or all(row.get(column) for column in mappings.values()):
+            skipped += 1
+            pending.append((row, None))
+        else:
+            pending.append((row, pool.submit(_generate, word, difficulty, context)))
+
+        while len(pending) > max_pending:
+            write_oldest()
+
+    while pending:
+        write_oldest()
+
+    return generated, failed, skipped
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="A .csv, .tsv or .apkg file.")
+    parser.add_argument("output", help="A .csv or .tsv file.")
+    parser.add_argument("--word-column", required=True)
+    parser.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        metavar="FIELD=COLUMN",
+        help="Output column of a generated field, e.g. sentence=Sentence.",
+    )
+    parser.add_argument("--difficulty")
+    parser.add_argument("--context")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--config", help="JSON file overriding options of the add-on's config."
+    )
+    parser.add_argument(
+        "--metrics-dir", help="Keep each worker's metrics exports in this folder."
+    )
+    args = parser.parse_args(argv)
+
+    # Only the add-on's own progress, not every request of the HTTP client.
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    logging.getLogger(__package__).setLevel(logging.INFO)
+    log.setLevel(logging.INFO)
+
+    try:
+        mappings = parse_mappings(args.map)
+        overrides = worker_overrides(max(1, args.workers), args.config)
+    except ValueError as e:
+        parser.error(str(e))
+
+    work_dir = tempfile.mkdtemp(prefix="reibun-cli-")
+    metrics_dir = args.metrics_dir or work_dir
+    try:
+        if args.input.lower().endswith(".apkg"):
+            columns, rows = read_apkg(args.input, args.word_column, work_dir)
+        else:
+            columns, rows = read_delimited(args.input, _delimiter(args.input))
+            if args.word_column not in columns:
+                parser.error(f"{args.input} has no {args.word_column} column")
+
+        columns += [column for column in mappings.values() if column not in columns]
+
+        # Build the corpus index up front, rather than in every worker.
+        ReibunGenerator(_create_config(overrides)).load_corpus()
+
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            writer = csv.DictWriter(
+                out, columns, delimiter=_delimiter(args.output), extrasaction="ignore"
+            )
+            writer.writeheader()
+
+            with ProcessPoolExecutor(
+                max_workers=args.workers,
+                initializer=_init_worker,
+                initargs=(overrides, metrics_dir),
+            ) as pool:
+                generated, failed, skipped = run(
+                    rows,
+                    writer,
+                    args.word_column,
+                    mappings,
+                    pool,
+                    max_pending=args.workers * PENDING_PER_WORKER,
+                    difficulty=args.difficulty,
+                    context=args.context,
+                )
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    log.info(f"Generated {generated} rows, {failed} failed, {skipped} skipped.")
+    return 1 if failed else 0
+
+
+def _delimiter(path: str) -> str:
+    return "\t" if path.lower().endswith(".tsv") else ","
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,77 +1,200 @@
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Optional, Callable, List
 
 import os
-from dotenv import load_dotenv
+import copy
+import json
+import logging
 
-from aqt import mw
 from .constants import ConfigKeys
 
+try:
+    from aqt import mw
+except ImportError:
+    # Running headless, e.g. from the command line interface. The defaults from
+    # config.json are used and changes are only kept in memory.
+    mw = None
+
+log = logging.getLogger(__name__)
+
+
+# Batches rapid successive config changes (e.g. combobox edits) into one write.
+WRITE_DEBOUNCE_MS = 500
+
 
 class AnkiConfig:
+    """Read-through cache of the add-on config.
+
+    The config is read from the add-on manager once and kept in memory.
+    Changes are applied to the in-memory snapshot immediately and written
+    back to disk after a short debounce.
+    """
+
     def __init__(self):
-        self._load_env()
-        self.restore_defaults()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._write_pending = False
+        self._env_loaded = False
+        self._listeners: List[Callable[[], None]] = []
+
+        self._merge_defaults()
+
+        if mw:
+            # Pick up edits made through Anki's add-on config editor.
+            mw.addonManager.setConfigUpdatedAction(__name__, self._on_config_updated)
 
     def _load_env(self):
+        # Deferred until an environment option is first read, to keep the
+        # dotenv import out of Anki's startup.
+        if self._env_loaded:
+            return
+
+        from dotenv import load_dotenv
+
         addon_dir = os.path.dirname(os.path.abspath(__file__))
         env_path = os.path.join(addon_dir, ".env")
         load_dotenv(env_path)
+        self._env_loaded = True
 
     def set_note_type_config(self, note_type: str, note_type_config: Dict[str, Any]):
         # config.json holds default config options, users modifications
         # are saved to meta.json.
-        conf = mw.addonManager.getConfig(__name__)
-        if conf is None:
-            conf = {}
+        conf = self._get_config()
         conf[note_type] = note_type_config
 
-        print(f"saving {conf} to {__name__}")
-        mw.addonManager.writeConfig(__name__, conf)
+        log.debug(f"Saving {note_type} config to {__name__}")
+        self._schedule_write()
+        self._notify_changed()
 
     def get_note_type_config(self, note_type):
-        conf = mw.addonManager.getConfig(__name__)
-        return conf.get(note_type, {}) if conf else {}
+        # Callers modify the returned config before saving it, so hand out a
+        # copy rather than the snapshot itself.
+        return copy.deepcopy(self._get_config().get(note_type, {}))
 
     def __getattr__(self, item):
         if item in ConfigKeys.allowed_keys:
-            conf = mw.addonManager.getConfig(__name__)
-            if conf is None:
+            conf = self._get_config()
+            if item not in conf:
                 raise RuntimeError(f"Unable to retrieve {item} option!")
             return conf[item]
         else:
             raise AttributeError(f"{item} is not a valid attribute!")
 
     def __setattr__(self, key, value):
-        if key in ConfigKeys.allowed_keys:
-            conf = mw.addonManager.getConfig(__name__)
-            if conf is None:
-                raise RuntimeError(f"Unable to set {key} option!")
-            conf[key] = value
+        if key.startswith("_"):
+            object.__setattr__(self, key, value)
+        elif key in ConfigKeys.allowed_keys:
+            self._get_config()[key] = value
+            self._schedule_write()
+            self._notify_changed()
         else:
             raise AttributeError(f"{key} is not a valid attribute!")
 
+    def add_change_listener(self, listener: Callable[[], None]) -> None:
+        """Registers a callback run whenever the in-memory config changes,
+        e.g. to invalidate state derived from it."""
+        self._listeners.append(listener)
+
+    def flush(self) -> None:
+        """Writes any pending changes to disk immediately."""
+        if not self._write_pending or self._snapshot is None or not mw:
+            return
+
+        self._write_pending = False
+        mw.addonManager.writeConfig(__name__, self._snapshot)
+
     def restore_defaults(self) -> None:
         defaults = self.get_defaults()
         if not defaults:
             return
 
-        mw.addonManager.writeConfig(__name__, defaults)
+        self._snapshot = copy.deepcopy(defaults)
+        self._write_pending = True
+        self.flush()
+        self._notify_changed()
 
     def get_defaults(self) -> Union[Dict[str, Any], None]:
         if not mw:
-            return {}
+            return self._read_default_file()
 
         defaults = mw.addonManager.addonConfigDefaults("reibun_koubou")
         return defaults
 
+    def _read_default_file(self) -> Dict[str, Any]:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Unable to read default config: {e}")
+            return {}
+
+    def _get_config(self) -> Dict[str, Any]:
+        if self._snapshot is None:
+            if mw:
+                conf = mw.addonManager.getConfig(__name__)
+            else:
+                conf = copy.deepcopy(self._read_default_file())
+            self._snapshot = conf if conf is not None else {}
+        return self._snapshot
+
+    def _merge_defaults(self) -> None:
+        """Adds any options missing from the user's config, e.g. after an
+        update introduced new ones, without touching existing settings."""
+        defaults = self.get_defaults()
+        if not defaults:
+            return
+
+        conf = self._get_config()
+        missing = {key: value for key, value in defaults.items() if key not in conf}
+        if not missing:
+            return
+
+        conf.update(copy.deepcopy(missing))
+        self._write_pending = True
+        self.flush()
+
+    def _schedule_write(self) -> None:
+        if self._write_pending or not mw:
+            return
+
+        self._write_pending = True
+        mw.taskman.run_on_main(
+            lambda: mw.progress.single_shot(WRITE_DEBOUNCE_MS, self.flush, False)
+        )
+
+    def _on_config_updated(self, conf: Dict[str, Any]) -> None:
+        self._snapshot = conf
+        self._write_pending = False
+        self._notify_changed()
+
+    def _notify_changed(self) -> None:
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                log.exception(f"Config change listener failed: {e}")
+
     @property
     def claude_api_key(self) -> str:
         """Get Claude API key from environment variables"""
+        self._load_env()
         api_key = os.getenv("CLAUDE_API_KEY")
         if not api_key:
             raise ValueError("CLAUDE_API_KEY not found in environment variables")
         return api_key
 
+    @property
+    def claude_base_url(self) -> Optional[str]:
+        """Optional API base URL override, e.g. a local stand-in server."""
+        self._load_env()
+        return os.getenv("CLAUDE_BASE_URL") or None
+
     @property
     def debug_mode(self) -> bool:
+        self._load_env()
         return os.getenv("DEBUG_MODE", "false").lower() == "true"
+
+    @property
+    def profile_mode(self) -> bool:
+        """Profile generation runs with cProfile, see `Metrics.profile`."""
+        self._load_env()
+        return os.getenv("PROFILE_MODE", "false").lower() == "true"
@@ -2,6 +2,7 @@ class NoteConfig:
     FIELDS = "field_mappings"
     CONTEXT = "context"
     DIFFICULTY = "difficulty"
+    TARGET = "target_field"
 
 
 class ConfigKeys:
@@ -9,12 +10,32 @@ class ConfigKeys:
     DEFAULT_DIFFICULTY = "default_difficulty"
     CONTEXT_OPTIONS = "context_options"
     DEFAULT_CONTEXT = "default_context"
+    BULK_CONCURRENCY = "bulk_concurrency"
+    CACHE_MAX_ENTRIES = "cache_max_entries"
+    CACHE_TTL_DAYS = "cache_ttl_days"
+    PACK_TOKEN_BUDGET = "pack_token_budget"
+    RATE_LIMIT_RPM = "rate_limit_requests_per_minute"
+    RATE_LIMIT_TPM = "rate_limit_tokens_per_minute"
+    PREFETCH = "prefetch_on_open"
+    CANDIDATE_COUNT = "candidate_count"
+    WRITE_CHUNK_SIZE = "bulk_write_chunk_size"
+    CORPUS_PATH = "corpus_path"
 
     allowed_keys = [
         DIFFICULTY_OPTIONS,
         CONTEXT_OPTIONS,
         DEFAULT_CONTEXT,
         DEFAULT_DIFFICULTY,
+        BULK_CONCURRENCY,
+        CACHE_MAX_ENTRIES,
+        CACHE_TTL_DAYS,
+        PACK_TOKEN_BUDGET,
+        RATE_LIMIT_RPM,
+        RATE_LIMIT_TPM,
+        PREFETCH,
+        CANDIDATE_COUNT,
+        WRITE_CHUNK_SIZE,
+        CORPUS_PATH,
     ]
 
 
@@ -0,0 +1,402 @@
+"""Local example sentence corpus, served before falling back to the API.
+
+The corpus is built once from a user supplied TSV file into an on-disk index:
+
+- `sentences.bin` holds every sentence record back to back, with the byte
+  offset of each record in `offsets.bin`.
+- `keys.bin` holds the sorted character unigram and bigram keys, with the
+  start of each key's posting list in `starts.bin`.
+- `postings.bin` holds the posting lists, the ascending indices of the
+  sentences containing each key.
+
+Every file is memory-mapped, so lookups only page in the few blocks they touch
+and the index costs next to no resident memory. A lookup binary searches the
+keys of the word, reads the shortest posting list and verifies a bounded
+number of its sentences, which takes well under a millisecond.
+"""
+
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+import os
+import json
+import mmap
+import logging
+import unicodedata
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from .constants import ResponseFields
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+META_FILENAME = "meta.json"
+INDEX_FILES = (
+    "sentences.bin",
+    "offsets.bin",
+    "keys.bin",
+    "starts.bin",
+    "postings.bin",
+)
+
+# Keys pack two code points into one integer, unigrams use a second code
+# point past the end of Unicode.
+CODE_POINT_BITS = 21
+UNIGRAM = (1 << CODE_POINT_BITS) - 1
+
+# Sentences verified per lookup, and matches ranked, to bound lookup time for
+# words made of very common characters.
+MAX_SCANNED = 512
+MAX_MATCHES = 32
+
+# Accepted sentence lengths, in characters, for each JLPT level.
+LENGTH_RANGES = {
+    "N5": (6, 16),
+    "N4": (8, 22),
+    "N3": (10, 30),
+    "N2": (12, 40),
+    "N1": (14, 60),
+}
+DEFAULT_LENGTH_RANGE = (6, 40)
+
+# Dictionary form endings of verbs and i-adjectives. Words ending in one are
+# also looked up by their stem, to match inflected forms.
+INFLECTING_ENDINGS = set("うくぐすつぬぶむるい")
+
+
+@dataclass(frozen=True)
+class CorpusEntry:
+    """A sentence of the corpus and its translation."""
+
+    sentence_id: int
+    sentence: str
+    translation: str
+    reading: str = ""
+    # Span of the matched word in the sentence, set by lookups.
+    word_start: int = 0
+    word_end: int = 0
+
+    def to_response(self) -> Dict[str, str]:
+        """Formats the entry like a generated response, with the matched word
+        in bold.
+
+        Only has the fields the corpus can fill: a reading if the corpus has
+        one that spells out the word, and never any notes.
+        """
+        word = self.sentence[self.word_start : self.word_end]
+        response = {
+            ResponseFields.SENTENCE: _bold(
+                self.sentence, self.word_start, self.word_end
+            ),
+            ResponseFields.TRANSLATION: self.translation,
+        }
+
+        at = self.reading.find(word) if word else -1
+        if at >= 0:
+            response[ResponseFields.READING] = _bold(
+                self.reading, at, at + len(word)
+            )
+        return response
+
+
+class CorpusIndex:
+    """Read-only, memory-mapped index of a corpus built with `build`."""
+
+    def __init__(self, directory: str):
+        """
+        :param directory: Folder holding the index files.
+        """
+        with open(os.path.join(directory, META_FILENAME), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self._files = []
+        self._maps = []
+        self._sentences = self._map(directory, "sentences.bin")
+        self._offsets = self._map(directory, "offsets.bin").cast("Q")
+        self._keys = self._map(directory, "keys.bin").cast("Q")
+        self._starts = self._map(directory, "starts.bin").cast("Q")
+        self._postings = self._map(directory, "postings.bin").cast("I")
+
+    @property
+    def source_path(self) -> str:
+        return self.meta["source"]
+
+    @classmethod
+    def open_or_build(cls, source_path: str, directory: str) -> "CorpusIndex":
+        """Opens the index in `directory`, (re)building it first if it's
+        missing or the corpus file has changed since it was built."""
+        if _read_meta(directory) != _source_meta(source_path):
+            cls.build(source_path, directory)
+        return cls(directory)
+
+    @classmethod
+    def build(cls, source_path: str, directory: str) -> None:
+        """Builds the index of a TSV corpus file.
+
+        Two formats are read, line by line:
+
+        - Tatoeba sentence pairs, `id, sentence, translation id, translation`.
+          Only the first translation of each sentence is kept.
+        - `sentence, translation` with an optional third `reading` column,
+          numbered by line. Readings use the furigana format of generated
+          ones, e.g. `人[ひと]`.
+
+        The index is written to temporary files which replace the old index
+        once complete, with the metadata written last.
+        """
+        os.makedirs(directory, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        paths = {name: os.path.join(directory, name + suffix) for name in INDEX_FILES}
+
+        postings: Dict[int, array] = {}
+        offsets = array("Q", [0])
+        with metrics.span("corpus_build") as span:
+            with open(paths["sentences.bin"], "wb") as f:
+                for index, entry in enumerate(_read_corpus(source_path)):
+                    record = "\t".join(
+                        (
+                            str(entry.sentence_id),
+                            entry.sentence,
+                            entry.translation,
+                            entry.reading,
+                        )
+                    ).encode("utf-8")
+                    f.write(record)
+                    offsets.append(offsets[-1] + len(record))
+
+                    for key in _keys(_normalize(entry.sentence)):
+                        postings.setdefault(key, array("I")).append(index)
+
+            count = len(offsets) - 1
+            span.set("sentences", count)
+            if not count:
+                raise ValueError(f"No sentences found in {source_path}")
+
+            keys = array("Q", sorted(postings))
+            starts = array("Q", [0])
+            with open(paths["postings.bin"], "wb") as f:
+                for key in keys:
+                    sentence_indices = postings.pop(key)
+                    sentence_indices.tofile(f)
+                    starts.append(starts[-1] + len(sentence_indices))
+
+            for name, values in (
+                ("offsets.bin", offsets),
+                ("keys.bin", keys),
+                ("starts.bin", starts),
+            ):
+                with open(paths[name], "wb") as f:
+                    values.tofile(f)
+
+        # Readers check the metadata first, so it's replaced last.
+        meta_path = os.path.join(directory, META_FILENAME)
+        _remove(meta_path)
+        for name, path in paths.items():
+            os.replace(path, os.path.join(directory, name))
+        with open(meta_path + suffix, "w", encoding="utf-8") as f:
+            json.dump({**_source_meta(source_path), "sentences": count}, f)
+        os.replace(meta_path + suffix, meta_path)
+
+        log.info(f"Indexed {count} corpus sentences from {source_path}.")
+
+    def lookup(
+        self, word: str, difficulty: Optional[str] = None
+    ) -> Optional[CorpusEntry]:
+        """Finds the best sentence using `word` for the difficulty.
+
+        Words that inflect are also matched, and bolded, by their stem when the
+        dictionary form isn't found. Sentences outside the length range suited to the
+        difficulty don't match.
+
+        :returns: The sentence, or None if the corpus has no suitable one.
+        """
+        word = _normalize(word)
+        if not word:
+            return None
+
+        shortest, longest = LENGTH_RANGES.get(difficulty, DEFAULT_LENGTH_RANGE)
+        shortest = max(shortest, len(word) + 2)
+        rejected = 0
+
+        def suitable(text: str, end: int) -> bool:
+            nonlocal rejected
+            if shortest <= len(text) <= longest:
+                return True
+            rejected += 1
+            return False
+
+        with metrics.span("corpus_lookup") as span:
+            matches = self.find(word, suitable)
+            if not matches and len(word) > 1 and word[-1] in INFLECTING_ENDINGS:
+                matches = self.find(
+                    word[:-1],
+                    lambda text, end: _inflects(text, end) and suitable(text, end),
+                )
+
+            # Prefer sentences in the middle of the range.
+            middle = (shortest + longest) / 2
+            entry = min(
+                matches,
+                key=lambda match: abs(len(match.sentence) - middle),
+                default=None,
+            )
+            result = "hit" if entry else ("mismatch" if rejected else "miss")
+            span.set("result", result)
+
+        metrics.increment("corpus_lookups", result=result)
+        return entry
+
+    def find(
+        self, word: str, verify: Optional[Callable[[str, int], bool]] = None
+    ) -> List[CorpusEntry]:
+        """Returns up to `MAX_MATCHES` sentences containing `word`.
+
+        :param verify: Further checks a match, given the normalized sentence
+            and the position right after `word` in it.
+        """
+        postings = [self._posting_list(key) for key in set(_word_keys(word))]
+        if not postings:
+            return []
+        candidates = min(postings, key=len)
+
+        matches = []
+        for index in candidates[:MAX_SCANNED]:
+            fields = self._read(index)
+            text = _normalize(fields[1])
+            at = text.find(word)
+            if at < 0 or (verify is not None and not verify(text, at + len(word))):
+                continue
+
+            sentence_id, sentence, translation, reading = fields
+            start = sentence.find(word)
+            if start < 0:
+                # Only matches once normalized, so the word can't be bolded.
+                continue
+
+            matches.append(
+                CorpusEntry(
+                    int(sentence_id),
+                    sentence,
+                    translation,
+                    reading,
+                    word_start=start,
+                    word_end=start + len(word),
+                )
+            )
+            if len(matches) >= MAX_MATCHES:
+                break
+
+        return matches
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def close(self) -> None:
+        for view in (self._offsets, self._keys, self._starts, self._postings):
+            view.release()
+        self._sentences.release()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+
+    def _posting_list(self, key: int) -> memoryview:
+        index = bisect_left(self._keys, key)
+        if index == len(self._keys) or self._keys[index] != key:
+            return self._postings[0:0]
+        return self._postings[self._starts[index] : self._starts[index + 1]]
+
+    def _read(self, index: int) -> List[str]:
+        """Returns the id, sentence, translation and reading of a sentence."""
+        record = self._sentences[self._offsets[index] : self._offsets[index + 1]]
+        return str(record, "utf-8").split("\t")
+
+    def _map(self, directory: str, name: str) -> memoryview:
+        f = open(os.path.join(directory, name), "rb")
+        self._files.append(f)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped)
+
+
+def _read_corpus(path: str) -> Iterator[CorpusEntry]:
+    seen = set()
+    with open(path, encoding="utf-8-sig") as f:
+        for line_number, line in enumerate(f, 1):
+            columns = [column.strip() for column in line.rstrip("\r\n").split("\t")]
+            if len(columns) == 4 and columns[0].isdigit():
+                sentence_id, sentence, _, translation = columns
+                sentence_id = int(sentence_id)
+                reading = ""
+            elif len(columns) in (2, 3):
+                sentence_id, sentence, translation = line_number, columns[0], columns[1]
+                reading = columns[2] if len(columns) == 3 else ""
+            else:
+                continue
+
+            if not sentence or not translation or sentence_id in seen:
+                continue
+            seen.add(sentence_id)
+            yield CorpusEntry(sentence_id, sentence, translation, reading)
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).strip()
+
+
+def _keys(text: str) -> Set[int]:
+    keys = {(ord(char) << CODE_POINT_BITS) | UNIGRAM for char in text}
+    keys.update(
+        (ord(first) << CODE_POINT_BITS) | ord(second)
+        for first, second in zip(text, text[1:])
+    )
+    return keys
+
+
+def _word_keys(word: str) -> List[int]:
+    # Bigrams narrow the candidates down far more than single characters.
+    if len(word) == 1:
+        return [(ord(word) << CODE_POINT_BITS) | UNIGRAM]
+    return [
+        (ord(first) << CODE_POINT_BITS) | ord(second)
+        for first, second in zip(word, word[1:])
+    ]
+
+
+def _bold(text: str, start: int, end: int) -> str:
+    return f"{text[:start]}<b>{text[start:end]}</b>{text[end:]}"
+
+
+def _inflects(text: str, end: int) -> bool:
+    # A stem followed by okurigana, e.g. 食べ in 食べた but not in 食べ物.
+    return end < len(text) and "ぁ" <= text[end] <= "ゟ"
+
+
+def _source_meta(source_path: str) -> Dict[str, object]:
+    stat = os.stat(source_path)
+    return {
+        "version": INDEX_VERSION,
+        "source": source_path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _read_meta(directory: str) -> Optional[Dict[str, object]]:
+    try:
+        with open(os.path.join(directory, META_FILENAME), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    meta.pop("sentences", None)
+    return meta
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,382 @@
+"""Offline throughput and latency benchmark for reibun generation.
+
+Starts a local `MockClaudeServer`, points `ReibunGenerator` at it and generates
+reibun for a set of synthetic notes in each mode:
+
+- single: one streamed request at a time, as from the editor.
+- bulk: `BulkReibunRunner` with one request per note.
+- packed: `BulkReibunRunner` with several notes per request.
+
+Must be run with the Python environment Anki uses, so that the add-on's
+dependencies are importable::
+
+    python src/dev/benchmark.py --notes 200 --latency lognormal:400:0.4 --error-rate 0.02
+
+Every run is appended to a history file together with the current git commit,
+and compared with the latest run of the same scenario on a different commit.
+`--strict` fails when throughput or p95 latency regressed by more than
+`--threshold`.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import tempfile
+import importlib
+import subprocess
+from dataclasses import dataclass, asdict
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "reibun_koubou_bench"
+HISTORY_FILENAME = "benchmark_history.jsonl"
+
+MODES = ["single", "bulk", "packed"]
+
+FIELD_MAPPINGS = {
+    "field_mappings": {
+        "sentence": "Sentence",
+        "reading": "Reading",
+        "translation": "Translation",
+        "notes": "Notes",
+    }
+}
+
+
+@dataclass
+class Scenario:
+    """Settings that must match for two runs to be comparable."""
+
+    notes: int
+    latency: str
+    token_interval_ms: float
+    error_rate: float
+    concurrency: int
+    pack_token_budget: int
+    seed: int
+
+    def key(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+
+@dataclass
+class ModeResult:
+    mode: str
+    notes: int
+    failed: int
+    requests: int
+    duration_s: float
+    notes_per_sec: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+class BenchmarkNote(dict):
+    """Minimal stand-in for `anki.notes.Note`, fields are dict items."""
+
+    def __init__(self, note_id: int):
+        super().__init__(Word="", Sentence="", Reading="", Translation="", Notes="")
+        self.id = note_id
+
+
+def load_package():
+    # Load the add-on as a package without running its __init__, which expects
+    # a fully initialised main window.
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [ADDON_DIR]
+    sys.modules[PACKAGE_NAME] = package
+    return package
+
+
+def import_module(name: str):
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+
+def create_generator(scenario: Scenario, work_dir: str):
+    config_module = import_module("config")
+    reibun = import_module("reibun")
+    cache = import_module("cache")
+    usage = import_module("usage")
+
+    with open(os.path.join(ADDON_DIR, "config.json"), encoding="utf-8") as f:
+        conf = json.load(f)
+    conf.update(
+        {
+            "bulk_concurrency": scenario.concurrency,
+            "pack_token_budget": scenario.pack_token_budget,
+            # Client side pacing would hide the generation path's own cost.
+            "rate_limit_requests_per_minute": 1_000_000,
+            "rate_limit_tokens_per_minute": 1_000_000_000,
+        }
+    )
+
+    config = config_module.AnkiConfig()
+    # There's no add-on manager outside of Anki, seed the config directly.
+    config._on_config_updated(conf)
+
+    class TimedGenerator(reibun.ReibunGenerator):
+        """Records how long each note took to generate."""
+
+        latencies: List[float]
+
+        def update_note_field(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().update_note_field(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+        async def generate_response_async(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await super().generate_response_async(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+        async def generate_packed_responses_async(self, client, items):
+            start = time.perf_counter()
+            try:
+                return await super().generate_packed_responses_async(client, items)
+            finally:
+                self.latencies.extend([time.perf_counter() - start] * len(items))
+
+    generator = TimedGenerator(config)
+    generator.latencies = []
+    # Keep the benchmark out of the user's cache and ledger, and start cold so
+    # every note reaches the server.
+    generator._cache = cache.ResponseCache(
+        os.path.join(work_dir, f"cache-{time.monotonic_ns()}.sqlite3")
+    )
+    generator._ledger = usage.UsageLedger(os.path.join(work_dir, "ledger.sqlite3"))
+    return generator
+
+
+def run_mode(
+    mode: str, scenario: Scenario, server, work_dir: str
+) -> ModeResult:
+    bulk = import_module("bulk")
+
+    generator = create_generator(scenario, work_dir)
+    notes = [BenchmarkNote(index) for index in range(scenario.notes)]
+    for note in notes:
+        note["Word"] = f"{mode}単語{note.id}"
+
+    requests_before = server.message_requests
+    start = time.perf_counter()
+
+    if mode == "single":
+        failed = 0
+        for note in notes:
+            try:
+                if not generator.update_note_field(note, note["Word"], FIELD_MAPPINGS):
+                    failed += 1
+            except Exception:
+                failed += 1
+    else:
+        runner = bulk.BulkReibunRunner(
+            generator,
+            concurrency=scenario.concurrency,
+            pack_token_budget=scenario.pack_token_budget if mode == "packed" else 0,
+        )
+        result = runner.run(
+            [
+                bulk.BulkItem(
+                    note=note,
+                    target_phrase=note["Word"],
+                    field_mappings=FIELD_MAPPINGS,
+                )
+                for note in notes
+            ]
+        )
+        failed = len(result.failed_notes)
+
+    duration = time.perf_counter() - start
+    latencies = sorted(latency * 1000 for latency in generator.latencies)
+
+    return ModeResult(
+        mode=mode,
+        notes=len(notes),
+        failed=failed,
+        requests=server.message_requests - requests_before,
+        duration_s=round(duration, 3),
+        notes_per_sec=round((len(notes) - failed) / duration, 2) if duration else 0,
+        p50_ms=percentile(latencies, 50),
+        p95_ms=percentile(latencies, 95),
+        p99_ms=percentile(latencies, 99),
+    )
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return round(ordered[rank], 2)
+
+
+def current_commit() -> Dict[str, Any]:
+    def git(*args) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=ADDON_DIR, capture_output=True, text=True
+        ).stdout.strip()
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def find_baseline(
+    history: List[Dict[str, Any]], scenario: Scenario, commit: str
+) -> Optional[Dict[str, Any]]:
+    for entry in reversed(history):
+        if entry["scenario"] == scenario.key() and entry["commit"] != commit:
+            return entry
+    return None
+
+
+def find_regressions(
+    results: List[ModeResult], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    regressions = []
+    for result in results:
+        previous = baseline["results"].get(result.mode)
+        if previous is None:
+            continue
+
+        if result.notes_per_sec < previous["notes_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{result.mode}: {result.notes_per_sec} notes/s, "
+                f"was {previous['notes_per_sec']} at {baseline['commit']}"
+            )
+        if result.p95_ms > previous["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{result.mode}: p95 {result.p95_ms}ms, "
+                f"was {previous['p95_ms']}ms at {baseline['commit']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument(
+        "--latency",
+        default="lognormal:400:0.4",
+        help="Time to first token, e.g. fixed:300, uniform:200:800 or "
+        "lognormal:400:0.5 (milliseconds).",
+    )
+    parser.add_argument("--token-interval-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pack-token-budget", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", help="Defaults to user_files.")
+    parser.add_argument("--no-history", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative change in notes/s or p95 that counts as a regression.",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Exit with an error if any mode regressed.",
+    )
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    scenario = Scenario(
+        notes=args.notes,
+        latency=args.latency,
+        token_interval_ms=args.token_interval_ms,
+        error_rate=args.error_rate,
+        concurrency=args.concurrency,
+        pack_token_budget=args.pack_token_budget,
+        seed=args.seed,
+    )
+
+    load_package()
+    mock_server = import_module("dev.mock_server")
+    metrics = import_module("metrics").metrics
+    paths = import_module("paths")
+
+    with tempfile.TemporaryDirectory() as work_dir, mock_server.MockClaudeServer(
+        error_rate=scenario.error_rate,
+        seed=scenario.seed,
+        latency=mock_server.LatencyDistribution.parse(scenario.latency),
+        token_interval=scenario.token_interval_ms / 1000,
+    ) as server:
+        os.environ["CLAUDE_BASE_URL"] = server.base_url
+        os.environ["CLAUDE_API_KEY"] = "mock"
+        os.environ["DEBUG_MODE"] = "false"
+        # Keep the benchmark's spans out of the user's metrics.
+        metrics._directory = work_dir
+
+        results = [run_mode(mode, scenario, server, work_dir) for mode in modes]
+
+    for result in results:
+        print(
+            f"{result.mode:>7}: {result.notes_per_sec:8.2f} notes/s  "
+            f"p50 {result.p50_ms:8.1f}ms  p95 {result.p95_ms:8.1f}ms  "
+            f"p99 {result.p99_ms:8.1f}ms  "
+            f"{result.requests} requests, {result.failed} failed"
+        )
+
+    if args.no_history:
+        return
+
+    history_path = args.history or paths.user_files_path(HISTORY_FILENAME)
+    commit = current_commit()
+    baseline = find_baseline(load_history(history_path), scenario, commit["commit"])
+
+    with open(history_path, "a", encoding="utf-8") as f:
+        entry = {
+            **commit,
+            "timestamp": time.time(),
+            "scenario": scenario.key(),
+            "results": {result.mode: asdict(result) for result in results},
+        }
+        f.write(json.dumps(entry) + "\n")
+
+    if baseline is None:
+        print("No earlier run of this scenario on another commit to compare with.")
+        return
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if not regressions:
+        print(f"No regressions compared with {baseline['commit']}.")
+
+    if args.strict and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
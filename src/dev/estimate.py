@@ -1,13 +1,47 @@
-from typing import List, Dict, Union
-import tiktoken
+from typing import TYPE_CHECKING, List, Dict, Optional, Union
 
 import json
+import threading
+
+if TYPE_CHECKING:
+    from ..usage import UsageLedger
+
+ENCODING_NAME = "cl100k_base"  # Claude uses cl100k_base
+
+# Fallback per-word averages used until the usage ledger has measurements.
+DEFAULT_PROMPT_TOKENS = 400
+DEFAULT_OUTPUT_TOKENS = 150
+
+# Cache writes and reads are billed relative to the base input price.
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """Returns the shared tokenizer, loading it on first use.
+
+    Loading the encoding takes hundreds of milliseconds, so it's done once per
+    process rather than once per estimator.
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding(ENCODING_NAME)
+    return _encoding
 
 
 class TokenCostEstimator:
-    def __init__(self):
-        # Initialize tokenizer for counting
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Claude uses cl100k_base
+    def __init__(self, ledger: Optional["UsageLedger"] = None):
+        """
+        :param ledger: Recorded API usage used to calibrate batch estimates.
+        """
+        self.ledger = ledger
 
         # Approximate costs per 1k tokens (as of April 2024)
         self.cost_per_1k = {
@@ -16,10 +50,20 @@ class TokenCostEstimator:
             "claude-3-haiku": {"input": 0.015, "output": 0.03},
         }
 
+    @property
+    def tokenizer(self):
+        return get_encoding()
+
     def count_tokens(self, text: str) -> int:
         """Count the number of tokens in a text string"""
         return len(self.tokenizer.encode(text))
 
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Count the number of tokens in each of several text strings"""
+        if not texts:
+            return []
+        return [len(tokens) for tokens in self.tokenizer.encode_batch(texts)]
+
     def estimate_cost(
         self,
         prompt: Union[str, Dict, List],
@@ -44,7 +88,7 @@ class TokenCostEstimator:
         input_tokens = self.count_tokens(prompt)
 
         # Get costs for the specified model
-        model_costs = self.cost_per_1k.get(model, self.cost_per_1k["claude-3-haiku"])
+        model_costs = self._get_model_costs(model, "claude-3-haiku")
 
         # Calculate costs
         input_cost = (input_tokens / 1000) * model_costs["input"]
@@ -64,28 +108,72 @@ class TokenCostEstimator:
     def estimate_batch_cost(
         self,
         number_of_requests: int,
-        avg_prompt_tokens: int,
-        avg_output_tokens: int,
-        model: str = "claude-3-sonnet",
+        avg_prompt_tokens: Optional[int] = None,
+        avg_output_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        mode: Optional[str] = None,
     ) -> Dict[str, float]:
         """
         Estimate the cost for a batch of similar requests
 
+        Averages that aren't given are taken from the usage ledger, i.e. from
+        what similar requests actually cost, including prompt cache savings.
+        Without any recorded usage, conservative defaults are used.
+
         Args:
-            number_of_requests: Number of API calls planned
-            avg_prompt_tokens: Average number of tokens per prompt
+            number_of_requests: Number of words to generate
+            avg_prompt_tokens: Average number of prompt tokens per word
             avg_output_tokens: Average number of tokens per response
-            model: Model name to use for pricing
+            model: Model name to use for pricing, defaults to the model the
+                generator requests, which is also what the ledger records
+            mode: Only calibrate from requests made in this mode, e.g. "packed"
 
         Returns:
             Dictionary with total token counts and estimated costs
         """
-        model_costs = self.cost_per_1k.get(model, self.cost_per_1k["claude-3-sonnet"])
-
-        total_input_tokens = avg_prompt_tokens * number_of_requests
-        total_output_tokens = avg_output_tokens * number_of_requests
-
-        input_cost = (total_input_tokens / 1000) * model_costs["input"]
+        if model is None:
+            from ..reibun import MODEL
+
+            model = MODEL
+        model_costs = self._get_model_costs(model, "claude-3-sonnet")
+
+        measured = None
+        if self.ledger is not None and (
+            avg_prompt_tokens is None or avg_output_tokens is None
+        ):
+            measured = self.ledger.averages(model=model, mode=mode)
+            if measured is None:
+                measured = self.ledger.averages(mode=mode)
+
+        # Share of prompt tokens billed at the full, cache write and cache read
+        # price. Given averages are assumed to be uncached.
+        input_share, write_share, read_share = 1.0, 0.0, 0.0
+        if avg_prompt_tokens is None:
+            if measured is not None and measured.prompt_tokens:
+                avg_prompt_tokens = measured.prompt_tokens
+                input_share = measured.input_tokens / measured.prompt_tokens
+                write_share = (
+                    measured.cache_creation_input_tokens / measured.prompt_tokens
+                )
+                read_share = measured.cache_read_input_tokens / measured.prompt_tokens
+            else:
+                avg_prompt_tokens = DEFAULT_PROMPT_TOKENS
+
+        if avg_output_tokens is None:
+            avg_output_tokens = (
+                measured.output_tokens
+                if measured is not None
+                else DEFAULT_OUTPUT_TOKENS
+            )
+
+        total_input_tokens = round(avg_prompt_tokens * number_of_requests)
+        total_output_tokens = round(avg_output_tokens * number_of_requests)
+
+        input_cost = (total_input_tokens / 1000) * model_costs["input"] * (
+            input_share
+            + write_share * CACHE_WRITE_MULTIPLIER
+            + read_share * CACHE_READ_MULTIPLIER
+        )
         output_cost = (total_output_tokens / 1000) * model_costs["output"]
         total_cost = input_cost + output_cost
 
@@ -97,6 +185,14 @@ class TokenCostEstimator:
             "input_cost": round(input_cost, 4),
             "output_cost": round(output_cost, 4),
             "total_cost": round(total_cost, 4),
-            "cost_per_request": round(total_cost / number_of_requests, 4),
+            "cost_per_request": round(total_cost / max(1, number_of_requests), 4),
             "model": model,
+            "calibrated_from": measured.sample_size if measured is not None else 0,
         }
+
+    def _get_model_costs(self, model: str, default: str) -> Dict[str, float]:
+        # Full model ids, e.g. "claude-3-haiku-20240307", are priced by family.
+        for name, costs in self.cost_per_1k.items():
+            if model.startswith(name):
+                return costs
+        return self.cost_per_1k[default]
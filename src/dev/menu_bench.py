@@ -0,0 +1,140 @@
+"""Measures how long the editor context menu takes to build.
+
+Must be run with the Python environment Anki uses, so that `aqt` is
+importable. The add-on's entries are added to a fresh `QMenu` for every
+iteration, as happens on each right-click in the editor, and the build time
+is compared against the budget of a single frame::
+
+    python src/dev/menu_bench.py --iterations 500 --strict
+
+`--cold` drops the cached menu models before every build, which shows the
+cost of the first right-click after a config change.
+"""
+
+from typing import Dict, List
+
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import importlib
+import statistics
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "reibun_koubou_bench"
+
+# One frame at 60Hz, the right-click should never take longer than this.
+FRAME_BUDGET_MS = 1000 / 60
+
+
+class FakeNote:
+    def __init__(self, note_type: str):
+        self._note_type = {"name": note_type}
+
+    def note_type(self):
+        return self._note_type
+
+
+class FakeEditor:
+    def __init__(self, note: FakeNote):
+        self.note = note
+        self.currentField = 0
+
+
+class FakeEditorWebView:
+    def __init__(self, editor: FakeEditor):
+        self.editor = editor
+
+
+def load_editor_hook_module():
+    # Load the add-on as a package without running its __init__, which expects
+    # a fully initialised main window.
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [ADDON_DIR]
+    sys.modules[PACKAGE_NAME] = package
+    return importlib.import_module(PACKAGE_NAME + ".editor_hook")
+
+
+def create_hook(editor_hook_module):
+    with open(os.path.join(ADDON_DIR, "config.json"), encoding="utf-8") as f:
+        defaults = json.load(f)
+
+    hook = editor_hook_module.ReibunEditorHook()
+    # There's no add-on manager outside of Anki, seed the config directly.
+    hook.config._on_config_updated(defaults)
+    return hook
+
+
+def measure(hook, note_types: List[str], iterations: int, cold: bool) -> List[float]:
+    from aqt.qt import QMenu
+
+    web_views = [FakeEditorWebView(FakeEditor(FakeNote(name))) for name in note_types]
+    # Like the editor, keep previous menus alive rather than deleting them.
+    menus = []
+    timings = []
+
+    for i in range(iterations):
+        web_view = web_views[i % len(web_views)]
+        if cold:
+            hook._menu_models.clear()
+
+        menu = QMenu()
+        start = time.perf_counter()
+        hook.on_editor_context_menu(web_view, menu)
+        timings.append((time.perf_counter() - start) * 1000)
+        menus.append(menu)
+
+    return timings
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+    return {
+        "iterations": len(timings),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+        "max_ms": round(ordered[-1], 3),
+        "frame_budget_ms": round(FRAME_BUDGET_MS, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--note-types", type=int, default=5)
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="Rebuild the menu model on every iteration.",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Exit with an error if the p95 build time exceeds one frame.",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from aqt.qt import QApplication
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    hook = create_hook(load_editor_hook_module())
+    note_types = [f"Bench Note Type {i}" for i in range(max(1, args.note_types))]
+
+    # The first build creates the reusable widgets, keep it out of the results.
+    measure(hook, note_types, 1, args.cold)
+    timings = measure(hook, note_types, args.iterations, args.cold)
+    app.processEvents()
+
+    summary = summarize(timings)
+    print(json.dumps(summary, indent=2))
+
+    if args.strict and summary["p95_ms"] > FRAME_BUDGET_MS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
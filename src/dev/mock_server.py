@@ -0,0 +1,520 @@
+"""Local stand-in for the Anthropic API used for offline development.
+
+Serves the Messages API, including streaming, and the Message Batches API.
+Point the add-on at it by setting `CLAUDE_BASE_URL`, e.g.::
+
+    python src/dev/mock_server.py --port 8765 --latency lognormal:400:0.5
+    CLAUDE_BASE_URL=http://127.0.0.1:8765 CLAUDE_API_KEY=mock ...
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import re
+import math
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXAMPLE_RESPONSE = {
+    "sentence": "試しに、この新しい料理を作ってみましょう。",
+    "reading": "試[ため]しに、この新[あたら]しい料理[りょうり]を作[つく]ってみましょう。",
+    "translation": "Let's try making this new dish.",
+    "notes": "• Suggests trying something out<br>• Casual, everyday usage",
+}
+
+
+# Error returned for each simulated failure status code.
+ERROR_TYPES = {
+    429: "rate_limit_error",
+    500: "api_error",
+    529: "overloaded_error",
+}
+
+
+def example_response_text(params: Dict[str, Any]) -> str:
+    """Answers with the example response, once per word for packed prompts and
+    once per candidate for multi-candidate prompts."""
+    words = _packed_words(params)
+    if words is None:
+        count = _candidate_count(params)
+        if count is None:
+            return json.dumps(EXAMPLE_RESPONSE, ensure_ascii=False)
+
+        sentence = EXAMPLE_RESPONSE["sentence"]
+        return json.dumps(
+            [
+                dict(EXAMPLE_RESPONSE, sentence=f"{sentence}({index + 1})")
+                for index in range(count)
+            ],
+            ensure_ascii=False,
+        )
+
+    return json.dumps(
+        [dict(EXAMPLE_RESPONSE, word=word) for word in words], ensure_ascii=False
+    )
+
+
+def _packed_words(params: Dict[str, Any]) -> Optional[List[str]]:
+    """Extracts the word list from a packed prompt's user message, if any."""
+    messages = params.get("messages") or [{}]
+    content = messages[-1].get("content", "")
+    if not isinstance(content, str) or "Target Words" not in content:
+        return None
+
+    lines = content.split("Target Words", 1)[1].splitlines()[1:]
+    words = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("- "):
+            words.append(line[2:])
+        elif line and words:
+            break
+    return words
+
+
+def _candidate_count(params: Dict[str, Any]) -> Optional[int]:
+    """Extracts the number of candidates asked for by the system prompt, if any."""
+    system = params.get("system") or ""
+    if isinstance(system, list):
+        system = "".join(block.get("text", "") for block in system)
+
+    match = re.search(r"Generate (\d+) different example sentences", system)
+    return int(match.group(1)) if match else None
+
+
+class LatencyDistribution:
+    """Samples simulated response latencies.
+
+    Built from a spec string with all times in milliseconds: `fixed:MS`,
+    `uniform:MIN:MAX` or `lognormal:MEDIAN:SIGMA`.
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "lognormal": 2}
+
+    def __init__(self, kind: str = "fixed", *params: float):
+        if self.KINDS.get(kind) != len(params):
+            raise ValueError(f"Invalid latency distribution: {kind} {params}")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, *params = spec.split(":")
+        return cls(kind, *(float(param) for param in params))
+
+    def sample(self, rng: random.Random) -> float:
+        """Returns a latency in seconds."""
+        if self.kind == "fixed":
+            milliseconds = self.params[0]
+        elif self.kind == "uniform":
+            milliseconds = rng.uniform(*self.params)
+        else:
+            median, sigma = self.params
+            milliseconds = median * math.exp(rng.gauss(0, sigma))
+        return max(0.0, milliseconds) / 1000
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{param:g}" for param in self.params)])
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MockClaudeServer:
+    """Threaded HTTP server mimicking the Messages and Message Batches endpoints.
+
+    :param response_text: Builds the assistant text for a request's params.
+    :param error_rate: Probability that any message or batch request errors.
+    :param fail_custom_ids: custom_ids that error on their first submission only,
+        used to exercise partial failure re-queuing deterministically.
+    :param polls_until_ended: Number of status polls before a batch ends.
+    :param latency: Time before a message response starts, i.e. the time to
+        first token. No delay if None.
+    :param token_interval: Seconds between streamed chunks. Non-streamed
+        responses take as long as streaming every chunk would.
+    :param chunk_size: Characters of response text per streamed chunk.
+    :param error_status_codes: Status codes failed message requests return.
+    :param retry_after: `retry-after` header sent with rate limit errors.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        response_text: Callable[[Dict[str, Any]], str] = example_response_text,
+        error_rate: float = 0.0,
+        fail_custom_ids: Optional[Iterable[str]] = None,
+        polls_until_ended: int = 1,
+        seed: Optional[int] = None,
+        latency: Optional[LatencyDistribution] = None,
+        token_interval: float = 0.0,
+        chunk_size: int = 16,
+        error_status_codes: Tuple[int, ...] = (429, 529, 500),
+        retry_after: float = 1.0,
+    ):
+        self.response_text = response_text
+        self.error_rate = error_rate
+        self.fail_custom_ids = set(fail_custom_ids or ())
+        self.polls_until_ended = polls_until_ended
+        self.latency = latency
+        self.token_interval = token_interval
+        self.chunk_size = max(1, chunk_size)
+        self.error_status_codes = error_status_codes
+        self.retry_after = retry_after
+
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.submitted_custom_ids: List[List[str]] = []
+        self.message_requests = 0
+        self.message_errors = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockClaudeServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockClaudeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def create_message(
+        self, params: Dict[str, Any]
+    ) -> Tuple[float, Optional[int], Dict[str, Any]]:
+        """Decides the outcome of a Messages API request.
+
+        :returns: The delay before responding, the error status code or None
+            on success, and the message or error body.
+        """
+        with self._lock:
+            self.message_requests += 1
+            delay = self.latency.sample(self._random) if self.latency else 0.0
+            failed = self.error_rate and self._random.random() < self.error_rate
+            status = self._random.choice(self.error_status_codes) if failed else None
+            if failed:
+                self.message_errors += 1
+
+        if status is not None:
+            return delay, status, {
+                "type": "error",
+                "error": {
+                    "type": ERROR_TYPES.get(status, "api_error"),
+                    "message": "Mock failure",
+                },
+            }
+
+        return delay, None, self.build_message(params)
+
+    def stream_events(self, message: Dict[str, Any]) -> Iterable[Tuple[str, Dict]]:
+        """Splits a message into the server-sent events of a streamed response."""
+        text = message["content"][0]["text"]
+        usage = message["usage"]
+
+        yield "message_start", {
+            "type": "message_start",
+            "message": dict(
+                message,
+                content=[],
+                stop_reason=None,
+                usage=dict(usage, output_tokens=1),
+            ),
+        }
+        yield "content_block_start", {
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {"type": "text", "text": ""},
+        }
+        for start in range(0, len(text), self.chunk_size):
+            yield "content_block_delta", {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {
+                    "type": "text_delta",
+                    "text": text[start : start + self.chunk_size],
+                },
+            }
+        yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+        yield "message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": usage["output_tokens"]},
+        }
+        yield "message_stop", {"type": "message_stop"}
+
+    def generation_time(self, message: Dict[str, Any]) -> float:
+        """Time the response text takes to stream in, after the first token."""
+        chunks = math.ceil(len(message["content"][0]["text"]) / self.chunk_size)
+        return max(0, chunks - 1) * self.token_interval
+
+    def create_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        batch_id = f"msgbatch_{uuid.uuid4().hex}"
+        results = [self._build_result(request) for request in requests]
+
+        with self._lock:
+            self.submitted_custom_ids.append([r["custom_id"] for r in requests])
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "created_at": _timestamp(),
+                "polls": 0,
+                "results": results,
+            }
+            return self._batch_object(self.batches[batch_id])
+
+    def retrieve_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            batch["polls"] += 1
+            return self._batch_object(batch)
+
+    def cancel_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            batch["polls"] = max(batch["polls"], self.polls_until_ended)
+            return self._batch_object(batch)
+
+    def _build_result(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        custom_id = request["custom_id"]
+        should_fail = custom_id in self.fail_custom_ids or (
+            self.error_rate and self._random.random() < self.error_rate
+        )
+        self.fail_custom_ids.discard(custom_id)
+
+        if should_fail:
+            return {
+                "custom_id": custom_id,
+                "result": {
+                    "type": "errored",
+                    "error": {
+                        "type": "error",
+                        "error": {"type": "api_error", "message": "Mock failure"},
+                    },
+                },
+            }
+
+        params = request["params"]
+        return {
+            "custom_id": custom_id,
+            "result": {
+                "type": "succeeded",
+                "message": self.build_message(params),
+            },
+        }
+
+    def build_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        text = self.response_text(params)
+        return {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": params.get("model", "mock"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": len(json.dumps(params.get("messages", []))) // 4,
+                "output_tokens": len(text) // 4,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        }
+
+    def _batch_object(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        ended = batch["polls"] >= self.polls_until_ended
+        results = batch["results"]
+        errored = sum(r["result"]["type"] == "errored" for r in results)
+
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else len(results),
+                "succeeded": len(results) - errored if ended else 0,
+                "errored": errored if ended else 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": batch["created_at"],
+            "expires_at": batch["created_at"],
+            "ended_at": _timestamp() if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": (
+                f"{self.base_url}/v1/messages/batches/{batch['id']}/results"
+                if ended
+                else None
+            ),
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive between requests, like the real API.
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self._read_json()
+                parts = self.path.split("?")[0].strip("/").split("/")
+
+                if parts == ["v1", "messages"]:
+                    self._send_message(body)
+                elif parts == ["v1", "messages", "batches"]:
+                    self._send_json(200, server.create_batch(body["requests"]))
+                elif parts[:3] == ["v1", "messages", "batches"] and parts[-1] == "cancel":
+                    self._send_batch(server.cancel_batch(parts[3]))
+                else:
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts[:3] != ["v1", "messages", "batches"] or len(parts) < 4:
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+                elif len(parts) == 5 and parts[4] == "results":
+                    self._send_results(parts[3])
+                else:
+                    self._send_batch(server.retrieve_batch(parts[3]))
+
+            def _send_message(self, params: Dict[str, Any]):
+                delay, status, payload = server.create_message(params)
+                time.sleep(delay)
+
+                if status is not None:
+                    headers = {}
+                    if status == 429:
+                        headers["retry-after"] = f"{server.retry_after:g}"
+                    self._send_json(status, payload, headers)
+                elif params.get("stream"):
+                    self._send_stream(payload)
+                else:
+                    time.sleep(server.generation_time(payload))
+                    self._send_json(200, payload)
+
+            def _send_stream(self, message: Dict[str, Any]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                for event, data in server.stream_events(message):
+                    if event == "content_block_delta" and server.token_interval:
+                        time.sleep(server.token_interval)
+                    body = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    self._write_chunk(body.encode("utf-8"))
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _send_batch(self, batch: Optional[Dict[str, Any]]):
+                if batch is None:
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+                else:
+                    self._send_json(200, batch)
+
+            def _send_results(self, batch_id: str):
+                batch = server.batches.get(batch_id)
+                if batch is None:
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+                    return
+
+                body = "\n".join(
+                    json.dumps(result, ensure_ascii=False) for result in batch["results"]
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/binary")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(
+                self,
+                status: int,
+                payload: Dict[str, Any],
+                headers: Optional[Dict[str, str]] = None,
+            ):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--polls-until-ended", type=int, default=1)
+    parser.add_argument(
+        "--latency",
+        type=LatencyDistribution.parse,
+        default=None,
+        help="Time to first token, e.g. fixed:300, uniform:200:800 or "
+        "lognormal:400:0.5 (milliseconds).",
+    )
+    parser.add_argument(
+        "--token-interval-ms",
+        type=float,
+        default=0.0,
+        help="Delay between streamed chunks.",
+    )
+    args = parser.parse_args()
+
+    server = MockClaudeServer(
+        host=args.host,
+        port=args.port,
+        error_rate=args.error_rate,
+        polls_until_ended=args.polls_until_ended,
+        latency=args.latency,
+        token_interval=args.token_interval_ms / 1000,
+    )
+    print(f"Mock Claude API listening on {server.base_url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
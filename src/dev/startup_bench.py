@@ -0,0 +1,109 @@
+"""Measures the add-on's contribution to Anki's startup time.
+
+Must be run with the Python environment Anki uses, so that `aqt` is
+importable. Each run happens in a fresh interpreter: `aqt` is imported first
+so Anki's own cost is excluded, then the add-on's modules are imported and
+`main.init()` is called, mirroring what happens when Anki loads the add-on::
+
+    python src/dev/startup_bench.py --runs 10
+"""
+
+from typing import Any, Dict, List
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "reibun_koubou_bench"
+
+# Dependencies that should only be imported once generation is first used.
+HEAVY_MODULES = [
+    "anthropic",
+    "httpx",
+    "pydantic",
+    "jinja2",
+    "yaml",
+    "dotenv",
+    "tiktoken",
+    "asyncio",
+]
+
+RUN_SCRIPT = """
+import sys, json, time, types, importlib
+
+import aqt
+from aqt import gui_hooks
+
+before = set(sys.modules)
+start = time.perf_counter()
+
+# Load the add-on as a package without running its __init__, which expects a
+# fully initialised main window.
+package = types.ModuleType({package!r})
+package.__path__ = [{addon_dir!r}]
+sys.modules[{package!r}] = package
+main = importlib.import_module({package!r} + ".main")
+imported = time.perf_counter()
+
+main.init()
+initialised = time.perf_counter()
+
+loaded = {{name.split(".")[0] for name in set(sys.modules) - before}}
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "init_ms": (initialised - imported) * 1000,
+    "loaded": sorted(loaded),
+}}))
+"""
+
+
+def run_once() -> Dict[str, Any]:
+    script = RUN_SCRIPT.format(package=PACKAGE_NAME, addon_dir=ADDON_DIR)
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import_ms = [result["import_ms"] for result in results]
+    init_ms = [result["init_ms"] for result in results]
+    total_ms = [a + b for a, b in zip(import_ms, init_ms)]
+    loaded = set().union(*(result["loaded"] for result in results))
+
+    return {
+        "runs": len(results),
+        "import_ms_median": round(statistics.median(import_ms), 2),
+        "init_ms_median": round(statistics.median(init_ms), 2),
+        "total_ms_median": round(statistics.median(total_ms), 2),
+        "total_ms_max": round(max(total_ms), 2),
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in loaded],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Exit with an error if any heavy dependency is imported at startup.",
+    )
+    args = parser.parse_args()
+
+    summary = summarize([run_once() for _ in range(args.runs)])
+    print(json.dumps(summary, indent=2))
+
+    if args.strict and summary["heavy_modules_loaded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,25 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 
+import copy
 import logging
 from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from .reibun import ReibunGenerator
 from .config import AnkiConfig
+from .metrics import metrics
+from .prefetch import ReibunPrefetcher
+from .jobs import GenerationJob
 from .utils import (
     get_note_type,
     get_current_field_name,
     strip_html_tags,
-    execute_in_background_thread,
 )
 from .constants import ConfigKeys, NoteConfig
 from .ui.field_dialog import FieldMappingDialog
 
 from aqt import (
+    mw,
     QAction,
     QMenu,
     editor,
@@ -25,24 +30,118 @@ from aqt import (
     QHBoxLayout,
 )
 
-from PyQt6.QtCore import Qt
-
-from aqt.utils import showWarning
+from aqt.operations.note import update_note
+from aqt.utils import showWarning, tooltip
 from anki.notes import Note
 
 log = logging.getLogger(__name__)
 
+# Threads running generation requests, shared by all editors.
+GENERATION_WORKERS = 4
+
+# Threads running prefetches. Kept apart from the generation workers, so
+# speculative requests never delay a reibun the user asked for.
+PREFETCH_WORKERS = 2
+
 
-@dataclass
+@dataclass(frozen=True)
 class ReibunContext:
-    """Contains all necessary context for sentence generation operations."""
+    """Contains all necessary context for sentence generation operations.
+
+    Captured when a generation is started and owned by that generation alone,
+    so concurrent generations from several editors can't affect each other.
+    """
 
     note: Note
     note_type: str
     target_field_name: str
     target_field_value: str
-    difficulty: int
-    context_type: str
+    difficulty: Optional[str]
+    context_type: Optional[str]
+    field_mappings: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class ContextMenuModel:
+    """Everything the context menu shows for a note type, derived from config."""
+
+    context_options: Tuple[str, ...]
+    difficulty_options: Tuple[str, ...]
+    context: str
+    difficulty: str
+
+
+class ComboBoxActionTemplate:
+    """A labelled combobox menu entry that is built once and reused.
+
+    A `QWidgetAction` only shows its default widget in one menu at a time, and
+    gets it back once removed from that menu. Detaching the action from the
+    previous context menu lets the same widgets be added to each new one
+    instead of being rebuilt on every right-click.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        config_key: str,
+        on_changed: Callable[[str, str, str], None],
+    ):
+        """
+        :param label: Text shown next to the combobox.
+        :param config_key: Note type config entry the combobox edits.
+        :param on_changed: Called with `(note_type, config_key, text)` when the
+            user picks a new value.
+        """
+        widget = QWidget()
+        layout = QHBoxLayout(widget)
+        layout.setContentsMargins(20, 2, 8, 2)
+        self._combo = QComboBox()
+        layout.addWidget(QLabel(label))
+        layout.addWidget(self._combo)
+
+        # Not parented to any menu, so it outlives the menus it's shown in.
+        self.action = QWidgetAction(None)
+        self.action.setDefaultWidget(widget)
+
+        self._items: Tuple[str, ...] = ()
+        self._note_type: Optional[str] = None
+        self._config_key = config_key
+        self._on_changed = on_changed
+        self._combo.currentTextChanged.connect(self._on_text_changed)
+
+    def bind(
+        self, items: Tuple[str, ...], value: str, note_type: str
+    ) -> QWidgetAction:
+        """Shows `items` with `value` selected, without emitting changes.
+
+        :param note_type: Note type whose config changes are saved to.
+        """
+        self._note_type = note_type
+        # The editor keeps old context menus around, release the widget from
+        # the last one it was shown in.
+        for container in self.action.associatedObjects():
+            if isinstance(container, QMenu):
+                container.removeAction(self.action)
+
+        self._combo.blockSignals(True)
+        try:
+            if items != self._items:
+                self._combo.clear()
+                self._combo.addItems(items)
+                self._items = items
+
+            if value and value in items:
+                self._combo.setCurrentText(value)
+            else:
+                self._combo.setCurrentIndex(0)
+        finally:
+            self._combo.blockSignals(False)
+
+        return self.action
+
+    def _on_text_changed(self, text: str) -> None:
+        if self._note_type is not None:
+            self._on_changed(self._note_type, self._config_key, text)
 
 
 class ReibunEditorHook:
@@ -51,107 +150,208 @@ class ReibunEditorHook:
     def __init__(self):
         self.config = AnkiConfig()
         self.generator = ReibunGenerator(self.config)
-
-        # Store current note state
-        self._current_note_type = None
-        self._current_field_name = None
-
-    def on_editor_context_menu(
-        self, editor_web_view: editor.EditorWebView, menu: QMenu
-    ) -> None:
-        """Called before the context menu is shown from the editor window.
-
-        Handles adding the "Generate Smart Reibun" menu item to the context menu.
+        # Requests are slow and don't touch the collection, so they run here
+        # instead of occupying Anki's collection worker.
+        self._executor = ThreadPoolExecutor(
+            max_workers=GENERATION_WORKERS, thread_name_prefix="reibun"
+        )
+        self.prefetcher = ReibunPrefetcher(
+            self.generator,
+            ThreadPoolExecutor(
+                max_workers=PREFETCH_WORKERS, thread_name_prefix="reibun-prefetch"
+            ),
+        )
+        # Ahead of the first lookup.
+        self.generator.start_loading_corpus()
+
+        # Context menu state, rebuilt lazily whenever the config changes.
+        self._menu_models: Dict[str, ContextMenuModel] = {}
+        self._context_combo: Optional[ComboBoxActionTemplate] = None
+        self._difficulty_combo: Optional[ComboBoxActionTemplate] = None
+        self.config.add_change_listener(self._menu_models.clear)
+
+        # The latest generation job of each open editor, keyed by `id(editor)`.
+        self._jobs: Dict[int, GenerationJob] = {}
+        # The note each open editor last prefetched for, keyed by `id(editor)`.
+        self._prefetched_notes: Dict[int, int] = {}
+        self._generation_listeners: List[Callable[[Note], None]] = []
+
+    def add_generation_listener(self, listener: Callable[[Note], None]) -> None:
+        """Registers a callback run with every saved note a reibun was
+        generated for."""
+        self._generation_listeners.append(listener)
+
+    def on_editor_did_load_note(self, editor: editor.Editor, focus_to=None) -> None:
+        """Called when a note is loaded into the editor.
+
+        If prefetching is enabled and the note's reibun fields are still empty,
+        starts generating its reibun in the background so that a later
+        "Generate Smart Reibun" can be applied straight away.
         """
+        job = self._jobs.get(id(editor))
+        if job is not None and job.note is not editor.note:
+            # The editor moved on to another note, its result would be dropped.
+            job.cancel()
+
+        prefetched_note_id = self._prefetched_notes.get(id(editor))
+        if prefetched_note_id is not None and (
+            editor.note is None or editor.note.id != prefetched_note_id
+        ):
+            # Nor will the left note's prefetch be asked for anymore.
+            self.prefetcher.cancel_note(prefetched_note_id)
+            del self._prefetched_notes[id(editor)]
+
         try:
-            editor_instance = editor_web_view.editor
-            if not editor_instance:
-                log.error("No valid editor instance was found. Skipping menu creation.")
+            # Prefetches are single reibun, which candidate pools would replace.
+            if (
+                not getattr(self.config, ConfigKeys.PREFETCH)
+                or getattr(self.config, ConfigKeys.CANDIDATE_COUNT) > 1
+            ):
                 return
 
-            # Only show actions when a valid field is selected.
-            current_field_index = editor_instance.currentField
-            if current_field_index is None:
+            note = editor.note
+            # New notes don't have an id to key the result by yet.
+            if note is None or not note.id:
                 return
 
-            self._current_note_type = get_note_type(editor_instance.note)
-
-            # Add the reibun generation actions to context menu.
-            generate_field_item = QAction("📝 Generate Smart Reibun", menu)
-            configure_fields_item = QAction("📝 Configure Smart Fields", menu)
+            note_type_config = self.config.get_note_type_config(get_note_type(note))
+            target_field_name = note_type_config.get(NoteConfig.TARGET)
+            target_mappings = note_type_config.get(NoteConfig.FIELDS)
+            if (
+                not target_field_name
+                or not target_mappings
+                or target_field_name not in note
+            ):
+                return
 
-            generate_field_item.triggered.connect(
-                lambda: self.handle_field_generation(editor_instance)
-            )
-            configure_fields_item.triggered.connect(
-                lambda: self.configure_field_mapping(editor_instance)
-            )
+            target_phrase = strip_html_tags(note[target_field_name])
+            if not target_phrase:
+                return
 
-            note_type = get_note_type(editor_instance.note)
-            existing_config = self.config.get_note_type_config(note_type)
+            # Only prefetch when the user is likely to ask for a reibun next.
+            if any(
+                note[field]
+                for field in target_mappings.values()
+                if "[Append]" not in field and field in note
+            ):
+                return
 
-            context_options = getattr(self.config, ConfigKeys.CONTEXT_OPTIONS)
-            difficulty_levels = getattr(self.config, ConfigKeys.DIFFICULTY_OPTIONS)
+            self.prefetcher.prefetch(
+                note.id,
+                target_phrase,
+                difficulty=note_type_config.get(NoteConfig.DIFFICULTY),
+                context=note_type_config.get(NoteConfig.CONTEXT),
+            )
+            self._prefetched_notes[id(editor)] = note.id
 
-            default_context = existing_config.get(NoteConfig.CONTEXT, "")
-            default_difficulty = existing_config.get(NoteConfig.DIFFICULTY, "")
+        except Exception as e:
+            log.debug(f"Skipping reibun prefetch: {e}")
 
-            context_action = self._add_combobox(
-                "Context:", context_options, default_context, NoteConfig.CONTEXT, menu
-            )
-            difficulty_action = self._add_combobox(
-                "Difficulty:",
-                difficulty_levels,
-                default_difficulty,
-                NoteConfig.DIFFICULTY,
-                menu,
-            )
+    def on_editor_context_menu(
+        self, editor_web_view: editor.EditorWebView, menu: QMenu
+    ) -> None:
+        """Called before the context menu is shown from the editor window.
 
-            menu.addSeparator()
-            menu.addAction(generate_field_item)
-            menu.addAction(configure_fields_item)
-            menu.addAction(context_action)
-            menu.addAction(difficulty_action)
-            menu.addSeparator()
+        Handles adding the "Generate Smart Reibun" menu item to the context menu.
+        """
+        try:
+            with metrics.span("menu_build"):
+                editor_instance = editor_web_view.editor
+                if not editor_instance:
+                    log.error(
+                        "No valid editor instance was found. Skipping menu creation."
+                    )
+                    return
+
+                # Only show actions when a valid field is selected.
+                current_field_index = editor_instance.currentField
+                if current_field_index is None:
+                    return
+
+                note_type = get_note_type(editor_instance.note)
+
+                # Add the reibun generation actions to context menu.
+                generate_field_item = QAction("📝 Generate Smart Reibun", menu)
+                regenerate_field_item = QAction(
+                    "📝 Regenerate Smart Reibun (Bypass Cache)", menu
+                )
+                configure_fields_item = QAction("📝 Configure Smart Fields", menu)
+
+                generate_field_item.triggered.connect(
+                    lambda: self.handle_field_generation(editor_instance)
+                )
+                regenerate_field_item.triggered.connect(
+                    lambda: self.handle_field_generation(
+                        editor_instance, bypass_cache=True
+                    )
+                )
+                configure_fields_item.triggered.connect(
+                    lambda: self.configure_field_mapping(editor_instance)
+                )
+
+                model = self._get_menu_model(note_type)
+                context_combo, difficulty_combo = self._get_combo_templates()
+                context_action = context_combo.bind(
+                    model.context_options, model.context, note_type
+                )
+                difficulty_action = difficulty_combo.bind(
+                    model.difficulty_options, model.difficulty, note_type
+                )
+
+                menu.addSeparator()
+                menu.addAction(generate_field_item)
+                menu.addAction(regenerate_field_item)
+                # With a single candidate per request there's no pool to cycle.
+                if getattr(self.config, ConfigKeys.CANDIDATE_COUNT) > 1:
+                    next_candidate_item = QAction("📝 Next Reibun Candidate", menu)
+                    next_candidate_item.triggered.connect(
+                        lambda: self.handle_next_candidate(editor_instance)
+                    )
+                    menu.addAction(next_candidate_item)
+                menu.addAction(configure_fields_item)
+                menu.addAction(context_action)
+                menu.addAction(difficulty_action)
+                menu.addSeparator()
 
         except Exception as e:
             log.exception("Failed to generate Smart Reibun menu: %s", e)
             showWarning(f"Failed to generate Smart Reibun menu: {str(e)}")
 
-    def get_current_field(self):
-        return self._current_field_name
-
-    def _add_combobox(
-        self, label: str, items: List[str], value: str, config_key: str, parent: QMenu
-    ) -> QAction:
-        widget = QWidget()
-        layout = QHBoxLayout(widget)
-        layout.setContentsMargins(20, 2, 8, 2)
-        label = QLabel(label)
-        combo = QComboBox()
-        combo.addItems(items)
-
-        if value and value in items:
-            combo.setCurrentText(value)
-
-        layout.addWidget(label)
-        layout.addWidget(combo)
-        context_action = QWidgetAction(parent)
-        context_action.setDefaultWidget(widget)
-
-        combo.setItemData(0, config_key, Qt.ItemDataRole.UserRole)
-        combo.currentTextChanged.connect(
-            lambda text, cb=combo: self._on_combo_changed(text, cb)
-        )
+    def _get_menu_model(self, note_type: str) -> ContextMenuModel:
+        model = self._menu_models.get(note_type)
+        if model is None:
+            existing_config = self.config.get_note_type_config(note_type)
+            model = ContextMenuModel(
+                context_options=tuple(
+                    getattr(self.config, ConfigKeys.CONTEXT_OPTIONS)
+                ),
+                difficulty_options=tuple(
+                    getattr(self.config, ConfigKeys.DIFFICULTY_OPTIONS)
+                ),
+                context=existing_config.get(NoteConfig.CONTEXT, ""),
+                difficulty=existing_config.get(NoteConfig.DIFFICULTY, ""),
+            )
+            self._menu_models[note_type] = model
+        return model
 
-        return context_action
+    def _get_combo_templates(
+        self,
+    ) -> Tuple[ComboBoxActionTemplate, ComboBoxActionTemplate]:
+        if self._context_combo is None:
+            self._context_combo = ComboBoxActionTemplate(
+                "Context:", NoteConfig.CONTEXT, self._on_combo_changed
+            )
+            self._difficulty_combo = ComboBoxActionTemplate(
+                "Difficulty:", NoteConfig.DIFFICULTY, self._on_combo_changed
+            )
+        return self._context_combo, self._difficulty_combo
 
-    def _on_combo_changed(self, current_text: str, combo: QComboBox) -> None:
-        config_entry_key = combo.itemData(0, Qt.ItemDataRole.UserRole)
-        if self._current_note_type is not None:
-            existing_config = self.config.get_note_type_config(self._current_note_type)
-            existing_config[config_entry_key] = current_text
-            self.config.set_note_type_config(self._current_note_type, existing_config)
+    def _on_combo_changed(
+        self, note_type: str, config_entry_key: str, current_text: str
+    ) -> None:
+        existing_config = self.config.get_note_type_config(note_type)
+        existing_config[config_entry_key] = current_text
+        self.config.set_note_type_config(note_type, existing_config)
 
     def configure_field_mapping(
         self, editor: editor.Editor, target_field_name: Optional[str] = None
@@ -187,51 +387,145 @@ class ReibunEditorHook:
 
         return False
 
-    def handle_field_generation(self, editor: editor.Editor) -> None:
+    def handle_field_generation(
+        self, editor: editor.Editor, bypass_cache: bool = False
+    ) -> None:
         """Generates values for the fields defined by the editor's note type via
         the configured LLM API configuration.
 
         :param editor: Editor instance.
+        :param bypass_cache: Skip the response cache and request a new reibun.
         """
+        context = self._prepare_generation(editor)
+        if context is None:
+            return
+        job = self._start_job(editor)
+
+        prefetched = None
+        if not bypass_cache and context.note.id:
+            prefetched = self.prefetcher.take(
+                context.note.id,
+                context.target_field_value,
+                context.difficulty,
+                context.context_type,
+            )
+
+        if prefetched is None:
+            self._generate_field_content(context, editor, bypass_cache, job=job)
+            return
+
+        # The prefetch may still be running, apply it whenever it's done. If it
+        # failed, retry the normal way.
+        self._apply_when_done(
+            prefetched,
+            context,
+            editor,
+            job,
+            retry=lambda: self._generate_field_content(context, editor, job=job),
+        )
+
+    def handle_next_candidate(self, editor: editor.Editor) -> None:
+        """Replaces the generated fields with the next candidate reibun.
+
+        Candidates come from the note's persisted pool, so cycling through them
+        doesn't make any requests once the pool has been generated.
+
+        :param editor: Editor instance.
+        """
+        context = self._prepare_generation(editor)
+        if context is None:
+            return
+        job = self._start_job(editor)
+
+        future = self._executor.submit(
+            lambda: self.generator.next_candidate_response(
+                context.note.id,
+                context.target_field_value,
+                difficulty=context.difficulty,
+                context=context.context_type,
+                job=job,
+            )
+        )
+        self._apply_when_done(future, context, editor, job)
+
+    def cancel_jobs(self) -> None:
+        """Cancels every running generation, e.g. when the profile is closed."""
+        for key in list(self._jobs):
+            self._cancel_job(key)
+        self.prefetcher.clear()
+        self._prefetched_notes.clear()
+
+    def _start_job(self, editor: editor.Editor) -> GenerationJob:
+        """Starts a generation job for the editor's note, cancelling the one the
+        editor is still running, if any."""
+        key = id(editor)
+        previous = self._jobs.get(key)
+        if previous is not None:
+            previous.cancel()
+        else:
+            # Abort whatever the editor is still generating once it's closed.
+            editor.widget.destroyed.connect(lambda: self._cancel_job(key))
+
+        job = GenerationJob(editor.note)
+        self._jobs[key] = job
+        return job
+
+    def _cancel_job(self, key: int) -> None:
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancel()
+
+    def _prepare_generation(self, editor: editor.Editor) -> Optional[ReibunContext]:
+        """Resolves the reibun context for the editor's current field,
+        configuring the note type first if needed."""
         note_type = get_note_type(editor.note)
-        self._current_field_name = get_current_field_name(editor.note, editor)
-        if self._current_field_name is None:
+        target_field_name = get_current_field_name(editor.note, editor)
+        if target_field_name is None:
             log.error("Unable to retrieve target field name.")
-            return
+            return None
 
         # Try to get existing config or configure a new one.
         field_mappings = self._get_or_create_field_mappings(
-            editor, note_type, self._current_field_name
+            editor, note_type, target_field_name
         )
         if not field_mappings:
-            return
+            return None
 
-        context = self._prepare_reibun_context(editor)
+        # Remember which field holds the target word so bulk generation from
+        # the browser knows where to read it from.
+        if field_mappings.get(NoteConfig.TARGET) != target_field_name:
+            field_mappings[NoteConfig.TARGET] = target_field_name
+            self.config.set_note_type_config(note_type, field_mappings)
+
+        context = self._prepare_reibun_context(
+            editor, target_field_name, field_mappings
+        )
         if context is None:
             log.error("Unable to create valid reibun context.")
-            return
+            return None
 
-        self._generate_field_content(context, editor, field_mappings)
+        return context
 
-    def _prepare_reibun_context(self, editor: editor.Editor) -> Optional[ReibunContext]:
+    def _prepare_reibun_context(
+        self,
+        editor: editor.Editor,
+        target_field_name: str,
+        field_mappings: Dict[str, Any],
+    ) -> Optional[ReibunContext]:
         note = editor.note
         if not note:
             log.error("Invalid note was provided. Unable to generate field.")
             return None
 
-        note_type = get_note_type(note)
-        target_field_name = self.get_current_field()
-        existing_config = self.config.get_note_type_config(note_type)
-        difficulty = existing_config.get(NoteConfig.DIFFICULTY, None)
-        context_type = existing_config.get(NoteConfig.CONTEXT, None)
-
         return ReibunContext(
             note=note,
             note_type=get_note_type(note),
             target_field_name=target_field_name,
             target_field_value=strip_html_tags(note[target_field_name]),
-            difficulty=difficulty,
-            context_type=context_type,
+            difficulty=field_mappings.get(NoteConfig.DIFFICULTY, None),
+            context_type=field_mappings.get(NoteConfig.CONTEXT, None),
+            # A copy, so config changes made while generating don't affect it.
+            field_mappings=copy.deepcopy(field_mappings),
         )
 
     def _get_or_create_field_mappings(
@@ -254,26 +548,117 @@ class ReibunEditorHook:
         self,
         context: ReibunContext,
         editor: editor.Editor,
-        field_mappings: dict,
+        bypass_cache: bool = False,
+        job: Optional[GenerationJob] = None,
     ) -> None:
         """Generates the field content via the selected LLM's API.
 
         :param context: ReibunContext instance containing relevant note field information.
         :param editor: Editor instance.
-        :param field_mappings: Mapping of generated field names to note fields.
+        :param bypass_cache: Skip the response cache and request a new reibun.
+        :param job: Job the generation belongs to, defaults to a new one.
         """
-        # Execute query to LLM in background thread via QueryOp.
-        execute_in_background_thread(
-            lambda: self.generator.update_note_field(
-                context.note,
+        if job is None:
+            job = self._start_job(editor)
+
+        # The request runs on the add-on's own executor rather than Anki's
+        # collection worker, only the note writes happen on the main thread.
+        future = self._executor.submit(
+            lambda: self.generator.generate_response(
                 context.target_field_value,
-                field_mappings,
                 difficulty=context.difficulty,
-                generation_context=context.context_type,
-            ),
-            lambda _: self.post_field_update(context.note, editor),
+                context=context.context_type,
+                bypass_cache=bypass_cache,
+                on_field=lambda response_field, value: mw.taskman.run_on_main(
+                    lambda: self._apply_streamed_field(
+                        editor, job, context, response_field, value
+                    )
+                ),
+                job=job,
+                note_id=context.note.id,
+            )
+        )
+        self._apply_when_done(future, context, editor, job)
+
+    def _apply_when_done(
+        self,
+        future: "Future[Dict[str, str]]",
+        context: ReibunContext,
+        editor: editor.Editor,
+        job: GenerationJob,
+        retry: Optional[Callable[[], None]] = None,
+    ) -> None:
+        future.add_done_callback(
+            lambda future: mw.taskman.run_on_main(
+                lambda: self._apply_result(future, context, editor, job, retry)
+            )
         )
 
+    def _apply_result(
+        self,
+        future: "Future[Dict[str, str]]",
+        context: ReibunContext,
+        editor: editor.Editor,
+        job: GenerationJob,
+        retry: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Writes a finished generation to its note, on the main thread.
+
+        :param retry: Called instead of reporting a failed generation.
+        """
+        if job.cancelled or future.cancelled():
+            log.debug("Dropping the result of a superseded generation.")
+            return
+
+        error = future.exception()
+        if error is not None:
+            log.error(f"Failed to generate Smart Reibun: {error}")
+        response = future.result() if error is None else None
+
+        if not response:
+            if retry is not None:
+                retry()
+            else:
+                tooltip("Failed to generate Smart Reibun.", parent=editor.widget)
+            return
+
+        try:
+            self.generator.apply_response(
+                context.note, response, context.field_mappings
+            )
+        except Exception as e:
+            showWarning(f"Failed to update note: {e}")
+            return
+
+        self.post_field_update(context.note, editor)
+
+    def _apply_streamed_field(
+        self,
+        editor: editor.Editor,
+        job: GenerationJob,
+        context: ReibunContext,
+        response_field: str,
+        value: str,
+    ) -> None:
+        """Shows a field in the editor as soon as it has finished streaming.
+
+        Append targets are skipped, they are written once the full response
+        has been received.
+        """
+        target_field = context.field_mappings.get(NoteConfig.FIELDS, {}).get(
+            response_field
+        )
+        if (
+            not target_field
+            or "[Append]" in target_field
+            or job.cancelled
+            or editor.note is not context.note
+        ):
+            return
+
+        context.note[target_field] = value
+        editor.loadNoteKeepingFocus()
+
     def post_field_update(self, note: Note, editor: editor.Editor) -> None:
         """Callback to handle post-field update operations.
 
@@ -282,5 +667,15 @@ class ReibunEditorHook:
         """
         log.debug("Post-field update.")
         if note.id:
-            note.load()
+            # Reloading the note from the collection would discard the generated
+            # fields, save them instead. The editor skips its own reload for
+            # changes it initiated.
+            update_note(parent=editor.widget, note=note).run_in_background(
+                initiator=editor
+            )
+            for listener in self._generation_listeners:
+                try:
+                    listener(note)
+                except Exception as e:
+                    log.error(f"Generation listener failed: {e}")
         editor.loadNote()
@@ -1,12 +1,24 @@
 from aqt import gui_hooks, mw
 from .editor_hook import ReibunEditorHook
+from .browser_hook import ReibunBrowserHook
 from .options import init_options
+from .metrics import metrics
 
 def setup_hooks():
     editor_hook = ReibunEditorHook()
     gui_hooks.editor_will_show_context_menu.append(editor_hook.on_editor_context_menu)
+    gui_hooks.editor_did_load_note.append(editor_hook.on_editor_did_load_note)
+
+    browser_hook = ReibunBrowserHook(editor_hook.config, editor_hook.generator)
+    editor_hook.add_generation_listener(browser_hook.on_note_generated)
+    gui_hooks.browser_menus_did_init.append(browser_hook.on_browser_menus_did_init)
     gui_hooks.main_window_did_init.append(on_main_window)
 
+    # Make sure debounced config changes aren't lost on exit.
+    gui_hooks.profile_will_close.append(editor_hook.config.flush)
+    gui_hooks.profile_will_close.append(metrics.flush)
+    gui_hooks.profile_will_close.append(editor_hook.cancel_jobs)
+
 def on_main_window():
     """Executed after the main window is fully initialized"""
 
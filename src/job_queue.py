@@ -0,0 +1,216 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import json
+import time
+import logging
+import threading
+
+from .sqlite_store import chunked, open_db, transaction
+
+log = logging.getLogger(__name__)
+
+# Requests made for a job before it's given up on. Failed jobs are retried by
+# resumed runs until they reach it, then dropped.
+MAX_ATTEMPTS = 3
+
+
+class JobState:
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class BulkJobQueue:
+    """SQLite-backed checkpoint of bulk generation runs, one job per note.
+
+    A job moves from pending to in-flight while its request runs, then to done
+    with the raw response stored, or to failed. Responses are stored before
+    they're applied to the note, and a job is only marked applied once its
+    note has been written to the collection. If a run is interrupted, done
+    jobs are applied from their stored response without another request, and
+    every other unapplied job is generated again, failed ones only until they
+    have been attempted `MAX_ATTEMPTS` times.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Location of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = open_db(
+            path,
+            [
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    note_id INTEGER PRIMARY KEY,
+                    target_phrase TEXT NOT NULL,
+                    difficulty TEXT,
+                    context TEXT,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    response TEXT,
+                    error TEXT,
+                    applied INTEGER NOT NULL DEFAULT 0,
+                    updated REAL NOT NULL
+                )""",
+                "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)",
+            ],
+        )
+
+    def enqueue(self, items: List[Any]) -> Dict[int, Dict[str, str]]:
+        """Adds a run's items, resuming the jobs left over from earlier runs.
+
+        A done job whose response hasn't been applied is kept, as long as the
+        note's word and settings haven't changed since. Every other job is
+        (re)set to pending. Applied jobs of earlier runs are dropped, as are
+        failed jobs that ran out of attempts.
+
+        :param items: The run's `BulkItem`s.
+        :returns: The stored responses of the kept done jobs, by note id.
+        """
+        with self._lock, transaction(self._conn):
+            self._conn.execute("DELETE FROM jobs WHERE applied = 1")
+            self._prune_exhausted()
+
+            existing = {
+                row[0]: row[1:]
+                for row in self._select_many(
+                    "SELECT note_id, target_phrase, difficulty, context, state, "
+                    "response FROM jobs WHERE note_id IN",
+                    [item.note.id for item in items],
+                )
+            }
+
+            stored = {}
+            reset = []
+            now = time.time()
+            for item in items:
+                params = (item.target_phrase, item.difficulty, item.context_type)
+                job = existing.get(item.note.id)
+                if job is not None and job[:3] == params and job[3] == JobState.DONE:
+                    response = self._load_response(job[4])
+                    if response is not None:
+                        stored[item.note.id] = response
+                        continue
+
+                reset.append((item.note.id, *params, now))
+
+            # Jobs are only replaced if their settings changed, so retries of
+            # the same note keep counting attempts.
+            self._conn.executemany(
+                "INSERT INTO jobs (note_id, target_phrase, difficulty, context, "
+                "state, updated) VALUES (?, ?, ?, ?, 'pending', ?) "
+                "ON CONFLICT (note_id) DO UPDATE SET "
+                "attempts = CASE WHEN target_phrase = excluded.target_phrase "
+                "AND difficulty IS excluded.difficulty "
+                "AND context IS excluded.context THEN attempts ELSE 0 END, "
+                "target_phrase = excluded.target_phrase, "
+                "difficulty = excluded.difficulty, context = excluded.context, "
+                "state = 'pending', response = NULL, error = NULL, "
+                "updated = excluded.updated",
+                reset,
+            )
+
+        if stored:
+            log.info(f"Resuming {len(stored)} already generated notes.")
+        return stored
+
+    def mark_in_flight(self, note_ids: Iterable[int]) -> None:
+        with self._lock, transaction(self._conn):
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? "
+                "WHERE note_id = ?",
+                [(JobState.IN_FLIGHT, time.time(), note_id) for note_id in note_ids],
+            )
+
+    def store_responses(
+        self, responses: Dict[int, Optional[Dict[str, str]]]
+    ) -> None:
+        """Marks jobs done with their response, or failed if it's empty."""
+        rows = []
+        now = time.time()
+        for note_id, response in responses.items():
+            if response:
+                raw = json.dumps(response, ensure_ascii=False)
+                rows.append((JobState.DONE, raw, None, now, note_id))
+            else:
+                rows.append((JobState.FAILED, None, "No valid response", now, note_id))
+
+        with self._lock, transaction(self._conn):
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, response = ?, error = ?, updated = ? "
+                "WHERE note_id = ?",
+                rows,
+            )
+
+    def mark_failed(self, note_ids: Iterable[int], error: str) -> None:
+        with self._lock, transaction(self._conn):
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE note_id = ?",
+                [
+                    (JobState.FAILED, error, time.time(), note_id)
+                    for note_id in note_ids
+                ],
+            )
+
+    def mark_applied(self, note_ids: Iterable[int]) -> None:
+        """Records that the jobs' notes were written to the collection."""
+        with self._lock, transaction(self._conn):
+            self._conn.executemany(
+                "UPDATE jobs SET applied = 1, updated = ? WHERE note_id = ?",
+                [(time.time(), note_id) for note_id in note_ids],
+            )
+
+    def unfinished(self) -> List[int]:
+        """Returns the ids of notes whose jobs were interrupted, or failed, before
+        their result was written to the collection.
+
+        Failed jobs that ran out of attempts are dropped rather than returned.
+        """
+        with self._lock, transaction(self._conn):
+            self._prune_exhausted()
+            return [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT note_id FROM jobs WHERE applied = 0 ORDER BY note_id"
+                )
+            ]
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of unapplied jobs in each state."""
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    "SELECT state, COUNT(*) FROM jobs WHERE applied = 0 GROUP BY state"
+                )
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _select_many(self, query: str, note_ids: List[int]) -> List[tuple]:
+        rows = []
+        for chunk in chunked(note_ids):
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(self._conn.execute(f"{query} ({placeholders})", chunk))
+        return rows
+
+    def _prune_exhausted(self) -> None:
+        deleted = self._conn.execute(
+            "DELETE FROM jobs WHERE state = ? AND attempts >= ?",
+            (JobState.FAILED, MAX_ATTEMPTS),
+        ).rowcount
+        if deleted:
+            log.info(f"Giving up on {deleted} notes that failed {MAX_ATTEMPTS} times.")
+
+    def _load_response(self, raw: Optional[str]) -> Optional[Dict[str, str]]:
+        try:
+            response = json.loads(raw) if raw else None
+        except json.JSONDecodeError:
+            response = None
+        return response if isinstance(response, dict) else None
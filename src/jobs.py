@@ -0,0 +1,30 @@
+import threading
+
+from .reibun import GenerationCancelled
+
+
+class GenerationJob:
+    """Handle for a single generation started from the editor.
+
+    Cancelling a job stops its request at the next streamed chunk and makes the
+    generator drop its result instead of writing it to the note. Safe to use
+    from any thread.
+    """
+
+    def __init__(self, note=None):
+        """
+        :param note: The note the job generates for.
+        """
+        self.note = note
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise GenerationCancelled("Generation was cancelled.")
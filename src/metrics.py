@@ -0,0 +1,333 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from .paths import user_files_path
+
+log = logging.getLogger(__name__)
+
+METRIC_PREFIX = "reibun"
+EVENTS_FILENAME = "metrics.jsonl"
+SNAPSHOT_FILENAME = "metrics.prom"
+PROFILES_DIRNAME = "profiles"
+
+EVENTS_MAX_BYTES = 5 * 1024 * 1024
+EVENTS_BACKUP_COUNT = 3
+
+# Minimum number of seconds between rewrites of the Prometheus snapshot.
+SNAPSHOT_INTERVAL = 15.0
+
+# Marks the queued records asking for a snapshot, rather than an event.
+SNAPSHOT_REQUEST = "snapshot_request"
+
+# Upper bounds, in seconds, of the duration histogram buckets.
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Span:
+    """A timed section of work, see `Metrics.span`."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.marks: Dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    def mark(self, name: str) -> None:
+        """Records the time elapsed since the start, e.g. at the first token.
+
+        Only the first call for each name is kept.
+        """
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class Metrics:
+    """Collects timings and counters for generation.
+
+    Every finished span is appended to a rotating JSONL event log, and the
+    aggregated counters and duration histograms are periodically written as a
+    Prometheus text snapshot, both in the add-on's user_files folder. Writing
+    either never raises, instrumentation must not break generation.
+
+    Spans finish on the main thread too, e.g. while building a context menu,
+    so events and snapshots are only queued there and written by a background
+    thread.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        :param directory: Where to write the exports, defaults to user_files.
+        """
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._events: Optional[logging.Logger] = None
+        self._event_queue: Optional[queue.Queue] = None
+        # The process the event writer was started in, see `_get_event_log`.
+        self._events_pid: Optional[int] = None
+        self._last_snapshot = 0.0
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Times the enclosed block as the span `name`.
+
+        Exceptions are recorded on the span and re-raised.
+        """
+        span = Span(name, attributes)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._finish_span(span, time.perf_counter() - span.start, error)
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._maybe_write_snapshot()
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def flush(self) -> None:
+        """Waits for the queued writes, and writes the Prometheus snapshot
+        immediately."""
+        self.wait_for_events()
+        self._write_snapshot()
+
+    def wait_for_events(self) -> None:
+        """Waits until the queued events and snapshots have been written."""
+        event_queue = self._event_queue
+        if event_queue is not None and self._events_pid == os.getpid():
+            event_queue.join()
+
+    def to_prometheus(self) -> str:
+        """Renders the counters and histograms in the Prometheus text format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(histogram.counts), histogram.count, histogram.sum)
+                for key, histogram in self._histograms.items()
+            )
+
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), counts, count, total in histograms:
+            metric = f"{METRIC_PREFIX}_{name}_seconds"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, bucket_count in zip(DURATION_BUCKETS, counts):
+                bucket_labels = labels + (("le", f"{bound:g}"),)
+                lines.append(
+                    f"{metric}_bucket{_format_labels(bucket_labels)} {bucket_count}"
+                )
+            inf_labels = labels + (("le", "+Inf"),)
+            lines.append(f"{metric}_bucket{_format_labels(inf_labels)} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def profile(self, name: str, enabled: bool = True) -> Iterator[None]:
+        """Profiles the enclosed block with cProfile when `enabled`.
+
+        Stats are saved to `user_files/profiles/<name>-<timestamp>.prof`, which
+        can be inspected with `python -m pstats` or snakeviz.
+        """
+        if not enabled:
+            yield
+            return
+
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            try:
+                directory = self._path(PROFILES_DIRNAME)
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(
+                    directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof"
+                )
+                profiler.dump_stats(path)
+                log.debug(f"Saved profile to {path}.")
+            except Exception as e:
+                log.warning(f"Failed to save profile {name}: {e}")
+
+    def _finish_span(self, span: Span, duration: float, error: Optional[str]) -> None:
+        self.observe("span_duration", duration, span=span.name)
+        for mark, elapsed in span.marks.items():
+            self.observe("span_mark", elapsed, span=span.name, mark=mark)
+
+        event = {
+            "ts": round(time.time(), 3),
+            "span": span.name,
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if span.marks:
+            event["marks_ms"] = {
+                mark: round(elapsed * 1000, 3) for mark, elapsed in span.marks.items()
+            }
+        if error is not None:
+            event["error"] = error
+        event.update(span.attributes)
+
+        self._write_event(event)
+        self._maybe_write_snapshot()
+
+    def _write_event(self, event: Dict[str, Any]) -> None:
+        try:
+            message = json.dumps(event, ensure_ascii=False, default=str)
+            self._get_event_log().info(message)
+        except Exception as e:
+            log.debug(f"Failed to write metrics event: {e}")
+
+    def _get_event_log(self) -> logging.Logger:
+        # A forked worker process inherits the logger, but not the thread
+        # writing its events, so it starts its own.
+        if self._events is None or self._events_pid != os.getpid():
+            with self._lock:
+                if self._events is None or self._events_pid != os.getpid():
+                    handler = RotatingFileHandler(
+                        self._path(EVENTS_FILENAME),
+                        maxBytes=EVENTS_MAX_BYTES,
+                        backupCount=EVENTS_BACKUP_COUNT,
+                        encoding="utf-8",
+                    )
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    handler.addFilter(lambda record: not _is_snapshot_request(record))
+
+                    snapshot_handler = _SnapshotHandler(self)
+                    snapshot_handler.addFilter(_is_snapshot_request)
+
+                    # Joined by `wait_for_events`, which the listener supports
+                    # through `task_done`.
+                    event_queue: queue.Queue = queue.Queue()
+                    listener = QueueListener(event_queue, handler, snapshot_handler)
+                    listener.start()
+
+                    # Not registered with logging, so it's never shared with
+                    # another instance or configured by other loggers.
+                    events = logging.Logger(f"{__name__}.events", logging.INFO)
+                    events.propagate = False
+                    events.addHandler(QueueHandler(event_queue))
+
+                    self._event_queue = event_queue
+                    self._events_pid = os.getpid()
+                    self._events = events
+        return self._events
+
+    def _maybe_write_snapshot(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_snapshot < SNAPSHOT_INTERVAL:
+                return
+            self._last_snapshot = now
+
+        try:
+            self._get_event_log().info("", extra={SNAPSHOT_REQUEST: True})
+        except Exception as e:
+            log.debug(f"Failed to queue metrics snapshot: {e}")
+
+    def _write_snapshot(self) -> None:
+        try:
+            path = self._path(SNAPSHOT_FILENAME)
+            # Write atomically, scrapers may read the file at any time.
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(temp_path, path)
+        except Exception as e:
+            log.debug(f"Failed to write metrics snapshot: {e}")
+
+    def _path(self, name: str) -> str:
+        if self._directory is None:
+            return user_files_path(name)
+        os.makedirs(self._directory, exist_ok=True)
+        return os.path.join(self._directory, name)
+
+
+class _SnapshotHandler(logging.Handler):
+    """Writes the Prometheus snapshot for each queued snapshot request."""
+
+    def __init__(self, metrics: Metrics):
+        super().__init__()
+        self._metrics = metrics
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._metrics._write_snapshot()
+
+
+def _is_snapshot_request(record: logging.LogRecord) -> bool:
+    return getattr(record, SNAPSHOT_REQUEST, False)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+# Shared by every part of the add-on, like a logger.
+metrics = Metrics()
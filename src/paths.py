@@ -0,0 +1,12 @@
+import os
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Anki preserves the user_files folder when the add-on is updated.
+USER_FILES_DIR = os.path.join(ADDON_DIR, "user_files")
+
+
+def user_files_path(*parts: str) -> str:
+    """Returns a path inside the add-on's user_files folder, creating it if needed."""
+    os.makedirs(USER_FILES_DIR, exist_ok=True)
+    return os.path.join(USER_FILES_DIR, *parts)
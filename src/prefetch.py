@@ -0,0 +1,96 @@
+from typing import Dict, Optional, Tuple
+
+import logging
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+
+from .jobs import GenerationJob
+from .reibun import ReibunGenerator
+
+log = logging.getLogger(__name__)
+
+# Prefetched responses kept in memory, the least recently requested go first.
+MAX_PREFETCHED = 8
+
+PrefetchKey = Tuple[int, str, Optional[str], Optional[str]]
+PrefetchEntry = Tuple[Future, GenerationJob]
+
+
+class ReibunPrefetcher:
+    """Generates reibun in the background for notes opened in the editor.
+
+    Results are held in memory, keyed by note and generation settings, so an
+    explicit request for the same reibun can be served without waiting on the
+    API. Prefetches that are evicted, or whose note the editor has left, are
+    cancelled so they stop spending tokens. Only used from the main thread.
+    """
+
+    def __init__(
+        self,
+        generator: ReibunGenerator,
+        executor: Executor,
+        max_entries: int = MAX_PREFETCHED,
+    ):
+        """
+        :param executor: Runs the requests, off Anki's collection worker and
+            apart from explicit generations. At most `max_entries` of them are
+            ever queued or running, as evicted ones are cancelled.
+        """
+        self._generator = generator
+        self._executor = executor
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[PrefetchKey, PrefetchEntry]" = OrderedDict()
+
+    def prefetch(
+        self,
+        note_id: int,
+        target_phrase: str,
+        difficulty: Optional[str] = None,
+        context: Optional[str] = None,
+    ) -> None:
+        key = (note_id, target_phrase, difficulty, context)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+
+        log.debug(f"Prefetching reibun for {target_phrase}.")
+        job = GenerationJob()
+        future = self._executor.submit(
+            lambda: self._generator.generate_response(
+                target_phrase, difficulty=difficulty, context=context, job=job
+            )
+        )
+        self._entries[key] = (future, job)
+        while len(self._entries) > self._max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._cancel(*evicted)
+
+    def take(
+        self,
+        note_id: int,
+        target_phrase: str,
+        difficulty: Optional[str] = None,
+        context: Optional[str] = None,
+    ) -> Optional["Future[Dict[str, str]]"]:
+        """Removes and returns the prefetch for these settings, if there is one.
+
+        The returned future may still be running, and is no longer cancelled
+        by the prefetcher.
+        """
+        entry = self._entries.pop((note_id, target_phrase, difficulty, context), None)
+        return entry[0] if entry is not None else None
+
+    def cancel_note(self, note_id: int) -> None:
+        """Cancels the prefetches for a note, e.g. once the editor has left it."""
+        for key in [key for key in self._entries if key[0] == note_id]:
+            self._cancel(*self._entries.pop(key))
+
+    def clear(self) -> None:
+        while self._entries:
+            _, entry = self._entries.popitem()
+            self._cancel(*entry)
+
+    def _cancel(self, future: Future, job: GenerationJob) -> None:
+        # Queued requests never start, running ones stop at their next chunk.
+        future.cancel()
+        job.cancel()
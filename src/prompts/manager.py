@@ -1,16 +1,86 @@
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
 import os
-import glob
 import yaml
 import logging
+from dataclasses import dataclass
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, Template
+from jinja2.exceptions import TemplateNotFound
 
-from ..config import AnkiConfig
+from ..paths import user_files_path
 
-from aqt.utils import showWarning
+if TYPE_CHECKING:
+    from ..config import AnkiConfig
 
 log = logging.getLogger(__name__)
 
+REIBUN_TEMPLATE = "reibun"
+BYTECODE_CACHE_DIR = "jinja_cache"
+
+# Stands in for the target word in the static instructions, the actual word
+# is sent in the per-word user block.
+WORD_REFERENCE = "the target word given in the user message"
+PACKED_WORD_REFERENCE = "each of the target words given in the user message"
+
+
+@dataclass
+class ReibunPrompt:
+    """A prompt split into a static system block, identical for every word,
+    and a small per-word user block."""
+
+    system: str
+    user: str
+
+    @property
+    def full(self) -> str:
+        return f"{self.system}\n\n{self.user}"
+
+
+class PromptTemplateLoader(BaseLoader):
+    """Loads prompt templates assembled from sections of YAML template files.
+
+    Template names take the form `<yaml name>/<section>.<key>+<section>.<key>...`,
+    e.g. `reibun/customizable.default+required.format`. Going through a loader,
+    rather than `Environment.from_string`, lets Jinja store the compiled
+    templates in its bytecode cache.
+    """
+
+    def __init__(self, template_dir: str):
+        self.template_dir = template_dir
+
+    def get_source(self, environment, template):
+        try:
+            yaml_name, parts = template.split("/")
+        except ValueError:
+            raise TemplateNotFound(template)
+
+        path = os.path.join(self.template_dir, f"{yaml_name}.yaml")
+        if not os.path.exists(path):
+            raise TemplateNotFound(template)
+
+        mtime = os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            templates = yaml.safe_load(f)["templates"]
+
+        sources = []
+        for part in parts.split("+"):
+            section, _, key = part.partition(".")
+            try:
+                source = templates[section][key]
+            except KeyError:
+                raise TemplateNotFound(template)
+
+            if section == "customizable" and "{{word}}" not in source:
+                raise ValueError("Custom prompt must include {{word}} placeholder")
+            sources.append(source)
+
+        return (
+            "\n\n".join(sources),
+            path,
+            lambda: os.path.exists(path) and os.path.getmtime(path) == mtime,
+        )
+
 
 class PromptManager:
     """Manages templated prompts for generating example sentences.
@@ -19,40 +89,135 @@ class PromptManager:
     configurable config prompt options.
     """
 
-    def __init__(self, config: AnkiConfig):
+    def __init__(self, config: "AnkiConfig"):
         self.config = config
         self.template_dir = os.path.join(
             os.path.dirname(os.path.realpath(__file__)), "templates"
         )
+        bytecode_dir = user_files_path(BYTECODE_CACHE_DIR)
+        os.makedirs(bytecode_dir, exist_ok=True)
+
+        # Compiled templates are tracked in `_compiled` and only rebuilt when
+        # the backing YAML file changes, so Jinja's own cache is disabled.
         self.env = Environment(
-            loader=FileSystemLoader(self.template_dir),
+            loader=PromptTemplateLoader(self.template_dir),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
             trim_blocks=True,
             lstrip_blocks=True,
+            cache_size=0,
+            auto_reload=False,
         )
-        self.templates = self._load_templates()
+
+        # Template parts -> (yaml mtime, compiled template)
+        self._compiled: Dict[Tuple[str, ...], Tuple[float, Template]] = {}
 
     def build_reibun_prompt(self, word: str, difficulty: str, context: str) -> str:
-        base_prompt = self._get_base_prompt()
-        if "{{word}}" not in base_prompt:
-            showWarning("Custom prompt must include {{word}} placeholder")
-            raise ValueError("Custom prompt must include {{word}} placeholder")
+        return self.build_reibun_messages(word, difficulty, context).full
+
+    def build_reibun_messages(
+        self, word: str, difficulty: str, context: str
+    ) -> ReibunPrompt:
+        """Builds the prompt for a single word.
+
+        The system block only depends on the YAML templates, so it is
+        identical across words.
+        """
+        system_template = self._get_compiled_template(
+            f"customizable.{self._get_base_key()}", "required.format"
+        )
+        user_template = self._get_compiled_template("required.payload")
 
         try:
-            return self._render_prompt(base_prompt, word, difficulty, context)
+            return ReibunPrompt(
+                system=self._render_prompt(system_template, WORD_REFERENCE).strip(),
+                user=self._render_prompt(user_template, word, difficulty, context).strip(),
+            )
         except Exception as e:
             log.error(f"Failed to generate reibun prompt: {e}")
             raise RuntimeError(f"Failed to generate reibun prompt: {e}") from e
 
-    def _render_prompt(self, base_prompt, word, difficulty, context) -> str:
-        required_suffix = self._get_required_prompt()
-        full_prompt = self.env.from_string(
-            f"{base_prompt}\n\n{required_suffix}"
-        ).render(
+    def build_candidate_messages(
+        self, word: str, difficulty: str, context: str, count: int
+    ) -> ReibunPrompt:
+        """Builds a prompt requesting `count` alternative examples for one word.
+
+        The model is asked to return a JSON array of single-word response objects.
+        """
+        system_template = self._get_compiled_template(
+            f"customizable.{self._get_base_key()}", "required.candidates_format"
+        )
+        user_template = self._get_compiled_template("required.payload")
+
+        try:
+            return ReibunPrompt(
+                system=self._render_prompt(
+                    system_template, WORD_REFERENCE, count=count
+                ).strip(),
+                user=self._render_prompt(user_template, word, difficulty, context).strip(),
+            )
+        except Exception as e:
+            log.error(f"Failed to generate candidate reibun prompt: {e}")
+            raise RuntimeError(
+                f"Failed to generate candidate reibun prompt: {e}"
+            ) from e
+
+    def build_packed_messages(
+        self, words: List[str], difficulty: str, context: str
+    ) -> ReibunPrompt:
+        """Builds a single prompt requesting one example for each word.
+
+        The model is asked to return a JSON array of objects keyed by `word`.
+        """
+        system_template = self._get_compiled_template(
+            f"customizable.{self._get_base_key()}", "required.packed_format"
+        )
+        user_template = self._get_compiled_template("required.packed_payload")
+
+        try:
+            return ReibunPrompt(
+                system=self._render_prompt(
+                    system_template, PACKED_WORD_REFERENCE
+                ).strip(),
+                user=self._render_prompt(
+                    user_template, None, difficulty, context, words=words
+                ).strip(),
+            )
+        except Exception as e:
+            log.error(f"Failed to generate packed reibun prompt: {e}")
+            raise RuntimeError(f"Failed to generate packed reibun prompt: {e}") from e
+
+    def _render_prompt(
+        self, template: Template, word, difficulty=None, context=None, **kwargs
+    ) -> str:
+        return template.render(
             word=word,
             difficulty=self._format_difficulty(difficulty),
             context_type=self._format_context(context),
+            **kwargs,
         )
-        return full_prompt
+
+    def _get_compiled_template(self, *parts: str) -> Template:
+        yaml_path = os.path.join(self.template_dir, f"{REIBUN_TEMPLATE}.yaml")
+        mtime = os.path.getmtime(yaml_path)
+
+        cached = self._compiled.get(parts)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        # The YAML has been edited since the template was compiled.
+        if cached is not None:
+            log.debug(f"Reloading prompt templates from {yaml_path}.")
+
+        try:
+            template = self.env.get_template(f"{REIBUN_TEMPLATE}/{'+'.join(parts)}")
+        except ValueError as e:
+            # Templates are compiled on generation threads, so leave reporting
+            # the error to the caller rather than showing a dialog here.
+            log.error(f"Invalid prompt template: {e}")
+            raise
+
+        self._compiled[parts] = (mtime, template)
+        return template
 
     def _format_difficulty(self, difficulty):
         if difficulty is None:
@@ -66,19 +231,6 @@ class PromptManager:
 
         return f"Ensure the example sentence is suitable for a {context_type} context."
 
-    def _load_templates(self):
-        templates = {}
-
-        yaml_pattern = os.path.join(self.template_dir, "*.yaml")
-        for yaml_file in glob.glob(yaml_pattern):
-            with open(yaml_file, "r", encoding="utf-8") as f:
-                yaml_name = os.path.splitext(os.path.basename(yaml_file))[0]
-                templates[yaml_name] = yaml.safe_load(f)
-        return templates
-
-    def _get_required_prompt(self):
-        return self.templates["reibun"]["templates"]["required"]["format"]
-
-    def _get_base_prompt(self):
+    def _get_base_key(self):
         # TODO read config
-        return self.templates["reibun"]["templates"]["customizable"]["default"]
+        return "default"
@@ -1,17 +1,48 @@
-from typing import Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 import json
+import inspect
 import logging
+import threading
 
-from .dev.estimate import TokenCostEstimator
+from .paths import user_files_path
+from .metrics import metrics
+from .singleflight import SingleFlight
+from .stream_parser import IncrementalJSONParser
+from .constants import ConfigKeys, NoteConfig, ResponseFields
 
-from anthropic import Anthropic
+# The SDK, templating and tokenizer dependencies are slow to import, so they
+# are only imported once generation is first used, not at Anki startup.
+if TYPE_CHECKING:
+    from anthropic import Anthropic, AsyncAnthropic
 
-from .prompts.manager import PromptManager
-from .constants import NoteConfig, ResponseFields
+    from .batch import ReibunBatchProcessor
+    from .bulk import BulkItem, BulkResult
+    from .cache import ResponseCache
+    from .candidates import CandidatePool
+    from .corpus import CorpusIndex
+    from .dev.estimate import TokenCostEstimator
+    from .jobs import GenerationJob
+    from .prompts.manager import PromptManager
+    from .scheduler import RateLimitScheduler
+    from .usage import UsageLedger
 
 
 MODEL = "claude-3-haiku-20240307"
+MAX_TOKENS = 300
+MAX_PACKED_OUTPUT_TOKENS = 4096
+CACHE_FILENAME = "response_cache.sqlite3"
+LEDGER_FILENAME = "usage_ledger.sqlite3"
+CANDIDATE_POOL_FILENAME = "candidate_pool.sqlite3"
+CORPUS_DIRNAME = "corpus_index"
+# Candidates requested by "Next candidate" when the configured count is lower.
+DEFAULT_CANDIDATES = 3
+MAX_CANDIDATES = MAX_PACKED_OUTPUT_TOKENS // MAX_TOKENS
+# Shortest prompt prefix, in tokens, that the API caches for Haiku models. The
+# built-in instructions are well below it, only long custom ones reach it.
+MIN_CACHEABLE_TOKENS = 2048
+# Rough characters per token, erring towards more tokens for Japanese text.
+CHARS_PER_TOKEN = 3
 log = logging.getLogger(__name__)
 
 
@@ -27,12 +58,196 @@ class ParsingError(ReibunGenerationError):
     pass
 
 
+class GenerationCancelled(ReibunGenerationError):
+    """Raised when a generation's job is cancelled before it completes."""
+
+    pass
+
+
 class ReibunGenerator(object):
     def __init__(self, config):
         self.config = config
 
-        self._prompt_manager = PromptManager(config)
-        self.client = Anthropic(api_key=self.config.claude_api_key)
+        # Created on first use, see the properties below.
+        self._client = None
+        self._request_client = None
+        self._prompt_manager_instance = None
+        self._scheduler = None
+        self._cache = None
+        self._estimator = None
+        self._ledger = None
+        self._candidate_pool = None
+        self._corpus = None
+        # A corpus that failed to load isn't retried until the path changes.
+        self._corpus_failed_path = None
+        # Held while the corpus index is opened or built.
+        self._corpus_lock = threading.Lock()
+        self._corpus_loading = False
+        # Identical requests made while one is in flight share its response.
+        # A caller whose in-flight request was cancelled by someone else's job
+        # makes its own request instead.
+        self._single_flight = SingleFlight(
+            "generation", rejoin_on=(GenerationCancelled,)
+        )
+        # Reentrant, as some factories use other lazily created attributes.
+        self._init_lock = threading.RLock()
+
+    @property
+    def client(self) -> "Anthropic":
+        def create_client():
+            from anthropic import Anthropic
+
+            return Anthropic(
+                api_key=self.config.claude_api_key,
+                base_url=self.config.claude_base_url,
+            )
+
+        return self._get_or_create("_client", create_client)
+
+    @property
+    def request_client(self) -> "Anthropic":
+        # Retries for generation requests are handled by the scheduler.
+        return self._get_or_create(
+            "_request_client", lambda: self.client.with_options(max_retries=0)
+        )
+
+    @property
+    def scheduler(self) -> "RateLimitScheduler":
+        def create_scheduler():
+            from .scheduler import RateLimitScheduler
+
+            return RateLimitScheduler(
+                requests_per_minute=getattr(self.config, ConfigKeys.RATE_LIMIT_RPM),
+                tokens_per_minute=getattr(self.config, ConfigKeys.RATE_LIMIT_TPM),
+                max_concurrency=getattr(self.config, ConfigKeys.BULK_CONCURRENCY),
+            )
+
+        return self._get_or_create("_scheduler", create_scheduler)
+
+    @property
+    def cache(self) -> "ResponseCache":
+        def create_cache():
+            from .cache import ResponseCache
+
+            return ResponseCache(
+                user_files_path(CACHE_FILENAME),
+                max_entries=getattr(self.config, ConfigKeys.CACHE_MAX_ENTRIES),
+                ttl_seconds=getattr(self.config, ConfigKeys.CACHE_TTL_DAYS) * 86400,
+            )
+
+        return self._get_or_create("_cache", create_cache)
+
+    @property
+    def estimator(self) -> "TokenCostEstimator":
+        def create_estimator():
+            from .dev.estimate import TokenCostEstimator
+
+            return TokenCostEstimator(ledger=self.ledger)
+
+        return self._get_or_create("_estimator", create_estimator)
+
+    @property
+    def ledger(self) -> "UsageLedger":
+        def create_ledger():
+            from .usage import UsageLedger
+
+            return UsageLedger(user_files_path(LEDGER_FILENAME))
+
+        return self._get_or_create("_ledger", create_ledger)
+
+    @property
+    def candidate_pool(self) -> "CandidatePool":
+        def create_candidate_pool():
+            from .candidates import CandidatePool
+
+            return CandidatePool(user_files_path(CANDIDATE_POOL_FILENAME))
+
+        return self._get_or_create("_candidate_pool", create_candidate_pool)
+
+    @property
+    def corpus(self) -> Optional["CorpusIndex"]:
+        """The index of the configured local corpus, or None if there's none.
+
+        Lookups can run on an event loop, so they never wait for the index to
+        be built: it's loaded on a background thread, see
+        `start_loading_corpus`, and lookups go to the API until it's ready.
+        """
+        corpus = self._corpus
+        source_path = getattr(self.config, ConfigKeys.CORPUS_PATH)
+        if corpus is not None and corpus.source_path == source_path:
+            return corpus
+
+        self.start_loading_corpus()
+        return None
+
+    def start_loading_corpus(self) -> None:
+        """Loads the index of the configured local corpus on a background
+        thread, unless it's already loaded or loading."""
+        source_path = getattr(self.config, ConfigKeys.CORPUS_PATH)
+        if not source_path or source_path == self._corpus_failed_path:
+            return
+
+        corpus = self._corpus
+        if corpus is not None and corpus.source_path == source_path:
+            return
+
+        with self._init_lock:
+            if self._corpus_loading:
+                return
+            self._corpus_loading = True
+
+        def load() -> None:
+            try:
+                self.load_corpus()
+            finally:
+                self._corpus_loading = False
+
+        threading.Thread(target=load, name="reibun-corpus", daemon=True).start()
+
+    def load_corpus(self) -> Optional["CorpusIndex"]:
+        """Opens the index of the configured local corpus, building it first
+        if it's missing or out of date, which takes a while for large corpora.
+
+        :returns: The index, or None if there's no corpus or it can't be loaded.
+        """
+        source_path = getattr(self.config, ConfigKeys.CORPUS_PATH)
+        if not source_path or source_path == self._corpus_failed_path:
+            return None
+
+        with self._corpus_lock:
+            if self._corpus is None or self._corpus.source_path != source_path:
+                from .corpus import CorpusIndex
+
+                # An index still in use by other threads is closed once
+                # they're done with it.
+                self._corpus = None
+                try:
+                    self._corpus = CorpusIndex.open_or_build(
+                        source_path, user_files_path(CORPUS_DIRNAME)
+                    )
+                except (OSError, ValueError) as e:
+                    log.error(f"Unable to load the corpus {source_path}: {e}")
+                    self._corpus_failed_path = source_path
+            return self._corpus
+
+    @property
+    def _prompt_manager(self) -> "PromptManager":
+        def create_prompt_manager():
+            from .prompts.manager import PromptManager
+
+            return PromptManager(self.config)
+
+        return self._get_or_create("_prompt_manager_instance", create_prompt_manager)
+
+    def _get_or_create(self, attr: str, factory: Callable[[], Any]) -> Any:
+        value = getattr(self, attr)
+        if value is None:
+            with self._init_lock:
+                value = getattr(self, attr)
+                if value is None:
+                    value = factory()
+                    setattr(self, attr, value)
+        return value
 
     def update_note_field(
         self,
@@ -41,12 +256,32 @@ class ReibunGenerator(object):
         field_mappings,
         difficulty=None,
         generation_context=None,
+        bypass_cache=False,
+        on_field: Optional[Callable[[str, str], None]] = None,
+        job: Optional["GenerationJob"] = None,
     ):
+        """Generates a reibun and writes it to the note's mapped fields.
+
+        :param on_field: Called with each response field and its value as soon
+            as it has finished streaming, before the note itself is updated.
+        :param job: Cancels the request when cancelled, the note is then left
+            untouched and False is returned.
+        """
         try:
-            response = self._generate_reibun(
-                target_phrase, difficulty=difficulty, context=generation_context
+            response = self.generate_response(
+                target_phrase,
+                difficulty=difficulty,
+                context=generation_context,
+                bypass_cache=bypass_cache,
+                on_field=on_field,
+                job=job,
+                note_id=note.id,
             )
 
+            if job is not None and job.cancelled:
+                log.debug(f"Dropping cancelled reibun for {target_phrase}.")
+                return False
+
             if not response:
                 log.error("Failed when attempting to generate reibun.")
                 return False
@@ -59,6 +294,301 @@ class ReibunGenerator(object):
 
         return True
 
+    def next_candidate_response(
+        self,
+        note_id: int,
+        target_phrase,
+        difficulty=None,
+        context=None,
+        job: Optional["GenerationJob"] = None,
+    ) -> Dict[str, str]:
+        """Moves the note's candidate pool on, without writing to the note.
+
+        :param note_id: Note the reibun is for. Notes that haven't been added
+            yet have no pool, a new reibun is requested for them instead.
+        :returns: The next candidate, or an empty dict if generation failed.
+        """
+        from .candidates import CandidatePool
+
+        if not note_id:
+            return self._generate_reibun(
+                target_phrase,
+                difficulty=difficulty,
+                context=context,
+                bypass_cache=True,
+                job=job,
+            )
+
+        key = CandidatePool.make_key(note_id, target_phrase, difficulty, context)
+        selected = self.candidate_pool.advance(key)
+        if selected is not None:
+            index, size, response = selected
+            log.debug(f"Using candidate {index + 1}/{size} for {target_phrase}.")
+            metrics.increment("candidates_served", source="pool")
+            return response
+
+        count = max(
+            getattr(self.config, ConfigKeys.CANDIDATE_COUNT), DEFAULT_CANDIDATES
+        )
+        return self._generate_from_pool(
+            note_id,
+            target_phrase,
+            count,
+            difficulty=difficulty,
+            context=context,
+            bypass_cache=True,
+            job=job,
+        )
+
+    def generate_response(
+        self,
+        target_phrase,
+        difficulty=None,
+        context=None,
+        bypass_cache=False,
+        on_field: Optional[Callable[[str, str], None]] = None,
+        job: Optional["GenerationJob"] = None,
+        note_id: Optional[int] = None,
+    ) -> Dict[str, str]:
+        """Generates a reibun without writing it to any note.
+
+        Doesn't touch the note, so it can run on any thread while the response
+        is applied with `apply_response` on the main thread.
+
+        :param note_id: Note the reibun is for. Required to generate from the
+            note's candidate pool when multiple candidates are enabled, notes
+            that haven't been added yet (id 0) have no pool.
+        :returns: The parsed response, or an empty dict if generation failed.
+        """
+        candidate_count = getattr(self.config, ConfigKeys.CANDIDATE_COUNT)
+        with metrics.profile("generation", enabled=self.config.profile_mode):
+            if candidate_count > 1 and note_id:
+                return self._generate_from_pool(
+                    note_id,
+                    target_phrase,
+                    candidate_count,
+                    difficulty=difficulty,
+                    context=context,
+                    bypass_cache=bypass_cache,
+                    job=job,
+                )
+
+            return self._generate_reibun(
+                target_phrase,
+                difficulty=difficulty,
+                context=context,
+                bypass_cache=bypass_cache,
+                on_field=on_field,
+                job=job,
+            )
+
+    def apply_response(self, note, response: Dict[str, str], field_mappings) -> None:
+        """Writes a response from `generate_response` to the note's mapped fields."""
+        self._update_note_fields(note, response, field_mappings)
+
+    def create_async_client(self) -> "AsyncAnthropic":
+        """Creates a new async client.
+
+        `AsyncAnthropic` binds its connection pool to the running event loop, so
+        a fresh client is required for each `asyncio.run` invocation.
+        """
+        from anthropic import AsyncAnthropic
+
+        return AsyncAnthropic(
+            api_key=self.config.claude_api_key,
+            base_url=self.config.claude_base_url,
+            max_retries=0,
+        )
+
+    async def generate_response_async(
+        self,
+        client: "AsyncAnthropic",
+        target_phrase,
+        difficulty=None,
+        context=None,
+    ) -> Dict[str, str]:
+        """Async counterpart of `generate_response` used by bulk generation.
+
+        :returns: The validated response, or an empty dict if generation failed.
+        """
+        response = await self._generate_reibun_async(
+            client, target_phrase, difficulty=difficulty, context=context
+        )
+        if not response:
+            log.error("Failed when attempting to generate reibun.")
+        return response
+
+    def plan_packs(
+        self, items: List["BulkItem"], token_budget: int
+    ) -> List[List["BulkItem"]]:
+        """Groups items into packs that can each be generated in one request.
+
+        Items are grouped by difficulty and context, as those are shared by the
+        whole packed prompt, and each pack is filled until its prompt plus the
+        expected output would exceed `token_budget` tokens.
+        """
+        groups: Dict[Tuple[Optional[str], Optional[str]], List["BulkItem"]] = {}
+        for item in items:
+            groups.setdefault((item.difficulty, item.context_type), []).append(item)
+
+        max_words = max(1, MAX_PACKED_OUTPUT_TOKENS // MAX_TOKENS)
+        packs = []
+        for (difficulty, context), group in groups.items():
+            base_prompt = self._prompt_manager.build_packed_messages(
+                [], difficulty, context
+            )
+            base_tokens = self.estimator.count_tokens(base_prompt.full)
+            word_tokens = self.estimator.count_tokens_batch(
+                [f"- {item.target_phrase}\n" for item in group]
+            )
+
+            pack, pack_tokens = [], base_tokens
+            for item, item_word_tokens in zip(group, word_tokens):
+                item_tokens = item_word_tokens + MAX_TOKENS
+                if pack and (
+                    pack_tokens + item_tokens > token_budget or len(pack) >= max_words
+                ):
+                    packs.append(pack)
+                    pack, pack_tokens = [], base_tokens
+
+                pack.append(item)
+                pack_tokens += item_tokens
+
+            if pack:
+                packs.append(pack)
+
+        return packs
+
+    async def generate_packed_responses_async(
+        self, client: "AsyncAnthropic", items: List["BulkItem"]
+    ) -> List[Dict[str, str]]:
+        """Generates reibun for a pack of notes with a single request.
+
+        All items must share the same difficulty and context, see `plan_packs`.
+        Words missing from the packed response fall back to single-word requests.
+
+        :returns: Each item's response, or an empty dict if it failed, in order.
+        """
+        difficulty, context = items[0].difficulty, items[0].context_type
+        words = list(dict.fromkeys(item.target_phrase for item in items))
+
+        responses = await self._generate_packed_async(client, words, difficulty, context)
+
+        missing = [word for word in words if word not in responses]
+        if missing:
+            log.warning(f"Packed response missing {len(missing)} words, retrying.")
+        for word in missing:
+            response = await self._generate_reibun_async(
+                client, word, difficulty=difficulty, context=context
+            )
+            if response:
+                responses[word] = response
+
+        return [responses.get(item.target_phrase, {}) for item in items]
+
+    def create_batch_processor(
+        self,
+        poll_interval: float = 60.0,
+        max_attempts: int = 3,
+        on_status: Optional[Callable[[Any], None]] = None,
+    ) -> "ReibunBatchProcessor":
+        """Creates the processor `update_note_fields_batch` submits through,
+        which can be cancelled from another thread while it waits.
+
+        :param poll_interval: Seconds to wait between batch status checks.
+        :param max_attempts: Number of times a failed request is submitted.
+        :param on_status: Called with the `MessageBatch` after every poll.
+        """
+        from .batch import ReibunBatchProcessor
+
+        return ReibunBatchProcessor(
+            self.client,
+            self._process_response,
+            poll_interval=poll_interval,
+            max_attempts=max_attempts,
+            on_status=on_status,
+            on_usage=lambda usage: self._record_usage(usage, mode="batch"),
+        )
+
+    def update_note_fields_batch(
+        self,
+        items: List["BulkItem"],
+        processor: Optional["ReibunBatchProcessor"] = None,
+    ) -> "BulkResult":
+        """Generates reibun for many notes through the Message Batches API.
+
+        Slower than `BulkReibunRunner` but billed at the discounted batch rate,
+        which suits large offline backfills. Notes are only modified in memory.
+
+        :param items: Notes and their generation settings.
+        :param processor: Submits the requests, defaults to one created by
+            `create_batch_processor`.
+        """
+        from .bulk import BulkResult
+
+        requests = {
+            f"reibun-{index}": self._build_request(
+                item.target_phrase, item.difficulty, item.context_type
+            )
+            for index, item in enumerate(items)
+        }
+
+        cache_keys = {
+            f"reibun-{index}": self._cache_key(
+                item.target_phrase, item.difficulty, item.context_type, request
+            )
+            for index, (item, request) in enumerate(zip(items, requests.values()))
+        }
+
+        responses = {}
+        if self.config.debug_mode:
+            responses = {
+                custom_id: self._process_response(get_example_return_value())
+                for custom_id in requests
+            }
+        else:
+            for (custom_id, cache_key), item in zip(cache_keys.items(), items):
+                found = self._lookup_corpus(
+                    item.target_phrase, item.difficulty, item.context_type
+                )
+                if found is None:
+                    found = self._get_cached(cache_key)
+                if found is not None:
+                    responses[custom_id] = found
+                    del requests[custom_id]
+
+            if processor is None:
+                processor = self.create_batch_processor()
+            generated = processor.run(requests) if requests else {}
+            for custom_id, response in generated.items():
+                self.cache.put(cache_keys[custom_id], response)
+            responses.update(generated)
+            metrics.increment(
+                "generations", len(generated), outcome="success", mode="batch"
+            )
+            metrics.increment(
+                "generations",
+                len(requests) - len(generated),
+                outcome="failure",
+                mode="batch",
+            )
+
+        result = BulkResult()
+        for index, item in enumerate(items):
+            response = responses.get(f"reibun-{index}")
+            if not response:
+                result.failed_notes.append(item.note)
+                continue
+
+            try:
+                self._update_note_fields(item.note, response, item.field_mappings)
+                result.updated_notes.append(item.note)
+            except Exception as e:
+                log.error(f"Failed to update note: {e}")
+                result.failed_notes.append(item.note)
+
+        return result
+
     def _update_note_fields(self, note, response, note_field_mappings):
         # Retrieve the per-note type field mappings.
         # Defines how the JSON response gets mapped to the note's fields.
@@ -69,51 +599,549 @@ class ReibunGenerator(object):
                 "No target mappings defined for the current note type!"
             )
 
-        for response_field, target_field in sorted(
-            target_mappings.items(), key=lambda x: x[1]
-        ):
-            # Check if this is an append operation
-            if "[Append]" in target_field:
-                base_field = target_field.replace(" [Append]", "")
-                existing_content = note[base_field]
-                # Add new content with separator
-                note[base_field] = (
-                    f"{existing_content}<br><br>{response[response_field]}"
-                    if existing_content
-                    else response[response_field]
-                )
-            else:
-                note[target_field] = response[response_field]
+        with metrics.span("note_write", in_memory=True):
+            for response_field, target_field in sorted(
+                target_mappings.items(), key=lambda x: x[1]
+            ):
+                # Corpus sentences leave the fields they can't fill untouched.
+                if response_field not in response:
+                    continue
+
+                # Check if this is an append operation
+                if "[Append]" in target_field:
+                    base_field = target_field.replace(" [Append]", "")
+                    existing_content = note[base_field]
+                    # Applying the same response again, e.g. when resuming an
+                    # interrupted bulk run, mustn't append it twice.
+                    if existing_content.endswith(response[response_field]):
+                        continue
+                    # Add new content with separator
+                    note[base_field] = (
+                        f"{existing_content}<br><br>{response[response_field]}"
+                        if existing_content
+                        else response[response_field]
+                    )
+                else:
+                    note[target_field] = response[response_field]
+
+    def _generate_reibun(
+        self,
+        target_phrase,
+        difficulty=None,
+        context=None,
+        bypass_cache=False,
+        on_field=None,
+        job=None,
+    ):
+        try:
+            # Regenerating asks for a different sentence than the corpus has.
+            if not bypass_cache:
+                found = self._lookup_corpus(target_phrase, difficulty, context)
+                if found is not None:
+                    return found
+
+            request = self._build_request(target_phrase, difficulty, context)
+            if self.config.debug_mode:
+                return self._process_response(get_example_return_value())
+
+            cache_key = self._cache_key(target_phrase, difficulty, context, request)
+            if not bypass_cache:
+                cached = self._get_cached(cache_key)
+                if cached is not None:
+                    log.debug(f"Using cached reibun for {target_phrase}.")
+                    return cached
+
+            # Callers joining an in-flight request only get the final response,
+            # fields are streamed to the caller that started it.
+            response_dict = self._single_flight.call(
+                f"{cache_key}:bypass" if bypass_cache else cache_key,
+                lambda: self._request_reibun(request, cache_key, on_field, job),
+            )
+            metrics.increment("generations", outcome="success", mode="single")
 
-    def _generate_reibun(self, target_phrase, difficulty=None, context=None):
-        full_prompt = self._prompt_manager.build_reibun_prompt(
-            target_phrase, difficulty=difficulty, context=context
+            return response_dict
+
+        except GenerationCancelled:
+            metrics.increment("generations", outcome="cancelled", mode="single")
+            return {}
+
+        except Exception as e:
+            log.error(f"Error generating example for {target_phrase}: {e}")
+            metrics.increment("generations", outcome="failure", mode="single")
+            return {}
+
+    def _request_reibun(
+        self, request, cache_key: str, on_field=None, job=None
+    ) -> Dict[str, str]:
+        response_content = self.scheduler.call(
+            lambda: self._stream_response(request, on_field, job=job),
+            self._estimate_tokens(request),
         )
+        response_dict = self._process_response(response_content)
+        self.cache.put(cache_key, response_dict)
+        return response_dict
 
+    def _generate_from_pool(
+        self,
+        note_id: int,
+        target_phrase,
+        count: int,
+        difficulty=None,
+        context=None,
+        bypass_cache=False,
+        job=None,
+    ) -> Dict[str, str]:
+        """Returns the note's current candidate, requesting a new pool if needed.
+
+        :param bypass_cache: Replace any existing pool with new candidates.
+        :returns: The candidate, or an empty dict if generation failed.
+        """
+        from .candidates import CandidatePool
+
+        key = CandidatePool.make_key(note_id, target_phrase, difficulty, context)
+        if not bypass_cache:
+            selected = self.candidate_pool.current(key)
+            if selected is not None:
+                metrics.increment("candidates_served", source="pool")
+                return selected[2]
+
+        candidates = self._generate_candidates(
+            target_phrase, count, difficulty=difficulty, context=context, job=job
+        )
+        if not candidates:
+            return {}
+
+        self.candidate_pool.store(key, note_id, candidates)
+        metrics.increment("candidates_served", source="request")
+        return candidates[0]
+
+    def _generate_candidates(
+        self, target_phrase, count: int, difficulty=None, context=None, job=None
+    ) -> List[Dict[str, str]]:
+        """Requests up to `count` alternative reibun in a single call.
+
+        :returns: Every candidate that came back complete and valid.
+        """
+        count = max(2, min(count, MAX_CANDIDATES))
         try:
             if self.config.debug_mode:
-                response_content = get_example_return_value()
-            else:
-                response = self.client.messages.create(
-                    model=MODEL,
-                    max_tokens=300,
-                    temperature=0.7,
-                    messages=[{"role": "user", "content": full_prompt.strip()}],
-                )
-                response_content = response.content[0].text
+                return [self._process_response(get_example_return_value())]
 
-            # Parse the response and extract relevant parts
-            response_dict = self._parse_response(response_content)
+            request = self._build_candidate_request(
+                target_phrase, difficulty, context, count
+            )
+            candidates = self._single_flight.call(
+                self._cache_key(target_phrase, difficulty, context, request),
+                lambda: self._process_candidate_response(
+                    self.scheduler.call(
+                        lambda: self._stream_response(
+                            request, mode="candidates", words=count, job=job
+                        ),
+                        self._estimate_tokens(request),
+                    )
+                ),
+            )
+            metrics.increment(
+                "generations",
+                outcome="success" if candidates else "failure",
+                mode="candidates",
+            )
+            return candidates
 
-            # Validate the response dictionary to ensure all required fields are present.
-            self._validate_response(response_dict)
+        except GenerationCancelled:
+            metrics.increment("generations", outcome="cancelled", mode="candidates")
+            return []
+
+        except Exception as e:
+            log.error(f"Error generating candidates for {target_phrase}: {e}")
+            metrics.increment("generations", outcome="failure", mode="candidates")
+            return []
+
+    def _stream_response(
+        self,
+        request,
+        on_field=None,
+        mode: str = "single",
+        words: int = 1,
+        job: Optional["GenerationJob"] = None,
+    ) -> str:
+        """Streams the response, reporting each field as soon as it completes.
+
+        :param job: Checked before every streamed chunk. Once cancelled, the
+            stream is closed, which aborts the HTTP request.
+        :returns: The full response text.
+        :raises GenerationCancelled: If `job` was cancelled.
+        """
+        if job is not None:
+            job.raise_if_cancelled()
+
+        parser = IncrementalJSONParser()
+        chunks = []
+        with metrics.span("api_call", mode=mode, streamed=True) as span:
+            # The stream is only ever closed from this thread, closing it from
+            # the thread cancelling the job would block on the pending read.
+            with self.request_client.messages.stream(**request) as stream:
+                self.scheduler.update_from_headers(stream.response.headers)
+                for text in stream.text_stream:
+                    if job is not None:
+                        job.raise_if_cancelled()
+                    span.mark("first_token")
+                    chunks.append(text)
+                    if on_field is None:
+                        continue
+
+                    for response_field, value in parser.feed(text):
+                        if response_field in ResponseFields.required_fields:
+                            on_field(response_field, value)
+
+                self._record_usage(stream.get_final_message().usage, mode, words)
+
+        return "".join(chunks)
+
+    async def _generate_reibun_async(
+        self, client, target_phrase, difficulty=None, context=None
+    ):
+        try:
+            found = self._lookup_corpus(target_phrase, difficulty, context)
+            if found is not None:
+                return found
+
+            request = self._build_request(target_phrase, difficulty, context)
+            if self.config.debug_mode:
+                return self._process_response(get_example_return_value())
+
+            cache_key = self._cache_key(target_phrase, difficulty, context, request)
+            cached = self._get_cached(cache_key)
+            if cached is not None:
+                return cached
+
+            response_dict = await self._single_flight.call_async(
+                cache_key,
+                lambda: self._request_reibun_async(client, request, cache_key),
+            )
+            metrics.increment("generations", outcome="success", mode="single")
 
             return response_dict
 
         except Exception as e:
-            print(f"Error generating example: {e}")
+            log.error(f"Error generating example for {target_phrase}: {e}")
+            metrics.increment("generations", outcome="failure", mode="single")
             return {}
 
+    async def _request_reibun_async(
+        self, client, request, cache_key: str
+    ) -> Dict[str, str]:
+        response = await self.scheduler.call_async(
+            lambda: self._create_message_async(client, request),
+            self._estimate_tokens(request),
+        )
+        response_dict = self._process_response(response.content[0].text)
+        self.cache.put(cache_key, response_dict)
+        return response_dict
+
+    async def _generate_packed_async(
+        self, client, words: List[str], difficulty=None, context=None
+    ) -> Dict[str, Dict[str, str]]:
+        """Requests reibun for several words in one call.
+
+        :returns: Mapping of word -> response for every word that came back
+            complete and valid.
+        """
+        if self.config.debug_mode:
+            return {
+                word: self._process_response(get_example_return_value())
+                for word in words
+            }
+
+        # Packed results are cached under the single-word keys, so single and
+        # packed generation share entries.
+        responses = {}
+        cache_keys = {}
+        for word in words:
+            found = self._lookup_corpus(word, difficulty, context)
+            if found is not None:
+                responses[word] = found
+                continue
+
+            request = self._build_request(word, difficulty, context)
+            cache_keys[word] = self._cache_key(word, difficulty, context, request)
+            cached = self._get_cached(cache_keys[word])
+            if cached is not None:
+                responses[word] = cached
+
+        pending = [word for word in words if word not in responses]
+        if not pending:
+            return responses
+
+        try:
+            request = self._build_packed_request(pending, difficulty, context)
+            response = await self.scheduler.call_async(
+                lambda: self._create_message_async(
+                    client, request, mode="packed", words=len(pending)
+                ),
+                self._estimate_tokens(request),
+            )
+
+            generated = self._process_packed_response(
+                response.content[0].text, pending
+            )
+            for word, response_dict in generated.items():
+                self.cache.put(cache_keys[word], response_dict)
+            responses.update(generated)
+            metrics.increment(
+                "generations", len(generated), outcome="success", mode="packed"
+            )
+            metrics.increment(
+                "generations",
+                len(pending) - len(generated),
+                outcome="failure",
+                mode="packed",
+            )
+
+        except Exception as e:
+            log.error(f"Error generating packed examples: {e}")
+            metrics.increment(
+                "generations", len(pending), outcome="failure", mode="packed"
+            )
+
+        return responses
+
+    async def _create_message_async(self, client, request, mode="single", words=1):
+        with metrics.span("api_call", mode=mode, streamed=False, words=words):
+            raw_response = await client.messages.with_raw_response.create(**request)
+        self.scheduler.update_from_headers(raw_response.headers)
+
+        response = raw_response.parse()
+        # Older SDK versions parse synchronously, newer ones return a coroutine.
+        if inspect.isawaitable(response):
+            response = await response
+        self._record_usage(response.usage, mode, words)
+        return response
+
+    def _estimate_tokens(self, request) -> int:
+        # A rough input token estimate for pacing, the buckets are corrected
+        # from the rate limit headers after every response.
+        text = "".join(block["text"] for block in request.get("system", []))
+        text += "".join(message["content"] for message in request["messages"])
+        return _approximate_tokens(text)
+
+    def _build_packed_request(
+        self, words: List[str], difficulty, context
+    ) -> Dict[str, Any]:
+        with metrics.span("prompt_render", mode="packed", words=len(words)):
+            prompt = self._prompt_manager.build_packed_messages(
+                words, difficulty=difficulty, context=context
+            )
+        return {
+            "model": MODEL,
+            "max_tokens": min(MAX_TOKENS * len(words), MAX_PACKED_OUTPUT_TOKENS),
+            "temperature": 0.7,
+            "system": self._system_blocks(prompt.system),
+            "messages": [{"role": "user", "content": prompt.user}],
+        }
+
+    def _build_candidate_request(
+        self, target_phrase, difficulty, context, count: int
+    ) -> Dict[str, Any]:
+        with metrics.span("prompt_render", mode="candidates", words=count):
+            prompt = self._prompt_manager.build_candidate_messages(
+                target_phrase, difficulty=difficulty, context=context, count=count
+            )
+        return {
+            "model": MODEL,
+            "max_tokens": min(MAX_TOKENS * count, MAX_PACKED_OUTPUT_TOKENS),
+            "temperature": 0.7,
+            "system": self._system_blocks(prompt.system),
+            "messages": [{"role": "user", "content": prompt.user}],
+        }
+
+    def _system_blocks(self, system: str) -> List[Dict[str, Any]]:
+        """The static instructions of a request, identical for every word.
+
+        They're only marked cacheable once long enough for the API to cache
+        them.
+        """
+        block = {"type": "text", "text": system}
+        if _approximate_tokens(system) >= MIN_CACHEABLE_TOKENS:
+            block["cache_control"] = {"type": "ephemeral"}
+        return [block]
+
+    def _build_request(self, target_phrase, difficulty, context) -> Dict[str, Any]:
+        with metrics.span("prompt_render", mode="single"):
+            prompt = self._prompt_manager.build_reibun_messages(
+                target_phrase, difficulty=difficulty, context=context
+            )
+        return {
+            "model": MODEL,
+            "max_tokens": MAX_TOKENS,
+            "temperature": 0.7,
+            "system": self._system_blocks(prompt.system),
+            "messages": [{"role": "user", "content": prompt.user}],
+        }
+
+    def _record_usage(self, usage, mode: str = "single", words: int = 1) -> None:
+        tokens = {
+            "input": usage.input_tokens,
+            "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "output": usage.output_tokens,
+        }
+        log.debug(
+            "Token usage: %s input, %s cache write, %s cache read, %s output.",
+            *tokens.values(),
+        )
+        for kind, amount in tokens.items():
+            metrics.increment("tokens", amount, kind=kind, mode=mode)
+
+        # The ledger only feeds cost estimates, never fail a request over it.
+        try:
+            self.ledger.record(usage, MODEL, mode=mode, words=words)
+        except Exception as e:
+            log.warning(f"Failed to record token usage: {e}")
+
+    def _lookup_corpus(
+        self, target_phrase, difficulty, context
+    ) -> Optional[Dict[str, str]]:
+        """Looks for a suitable sentence in the local corpus.
+
+        The corpus has no notion of register, so requests for a specific
+        context, rather than the "None" context option, always go to the API.
+
+        :returns: Only the response fields the corpus can fill, see
+            `CorpusEntry.to_response`.
+        """
+        if context and context != "None":
+            return None
+
+        corpus = self.corpus
+        if corpus is None:
+            return None
+
+        entry = corpus.lookup(target_phrase, difficulty)
+        if entry is None:
+            return None
+
+        log.debug(f"Using corpus sentence {entry.sentence_id} for {target_phrase}.")
+        return entry.to_response()
+
+    def _get_cached(self, cache_key: str) -> Optional[Dict[str, str]]:
+        with metrics.span("cache_lookup") as span:
+            cached = self.cache.get(cache_key)
+            span.set("hit", cached is not None)
+
+        metrics.increment("cache_lookups", result="hit" if cached else "miss")
+        return cached
+
+    def _cache_key(self, target_phrase, difficulty, context, request) -> str:
+        from .cache import ResponseCache
+
+        # The rendered request covers the prompt text and sampling parameters,
+        # so editing the template or settings naturally invalidates old entries.
+        rendered = json.dumps(
+            {k: v for k, v in request.items() if k != "model"},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return ResponseCache.make_key(
+            target_phrase, difficulty, context, rendered, request["model"]
+        )
+
+    def _process_response(self, response_content: str) -> Dict[str, str]:
+        with metrics.span("parse_validate", mode="single"):
+            # Parse the response and extract relevant parts
+            response_dict = self._parse_response(response_content)
+
+            # Validate the response dictionary to ensure all required fields
+            # are present.
+            self._validate_response(response_dict)
+
+        return response_dict
+
+    def _process_packed_response(
+        self, response_content: str, words: List[str]
+    ) -> Dict[str, Dict[str, str]]:
+        """Splits a packed JSON array response back into per-word responses.
+
+        Entries that are invalid or don't match a requested word are dropped,
+        as are any trailing entries cut off by the token limit.
+        """
+        from .cache import normalize_word
+
+        requested = {normalize_word(word): word for word in words}
+
+        results = {}
+        with metrics.span("parse_validate", mode="packed", words=len(words)):
+            for entry in self._parse_packed_entries(response_content):
+                if not isinstance(entry, dict):
+                    continue
+
+                word = requested.get(normalize_word(str(entry.pop("word", ""))))
+                if word is None:
+                    continue
+
+                try:
+                    self._validate_response(entry)
+                except ParsingError as e:
+                    log.error(f"Invalid packed entry for {word}: {e}")
+                    continue
+
+                results[word] = entry
+
+        return results
+
+    def _process_candidate_response(
+        self, response_content: str
+    ) -> List[Dict[str, str]]:
+        """Splits a candidate JSON array response into validated responses.
+
+        Invalid and repeated candidates are dropped.
+        """
+        candidates = []
+        sentences = set()
+        with metrics.span("parse_validate", mode="candidates"):
+            for entry in self._parse_packed_entries(response_content):
+                if not isinstance(entry, dict):
+                    continue
+
+                try:
+                    self._validate_response(entry)
+                except ParsingError as e:
+                    log.error(f"Invalid candidate: {e}")
+                    continue
+
+                if entry[ResponseFields.SENTENCE] in sentences:
+                    continue
+                sentences.add(entry[ResponseFields.SENTENCE])
+                candidates.append(entry)
+
+        return candidates
+
+    def _parse_packed_entries(self, response: str) -> List[Any]:
+        try:
+            entries = json.loads(response)
+            # Models occasionally answer with a bare object instead of an array.
+            if isinstance(entries, dict):
+                return [entries]
+            return entries if isinstance(entries, list) else []
+        except json.decoder.JSONDecodeError:
+            pass
+
+        # The array was most likely truncated, salvage the complete objects.
+        decoder = json.JSONDecoder()
+        entries = []
+        index = response.find("[") + 1
+        while 0 < index < len(response):
+            index = response.find("{", index)
+            if index < 0:
+                break
+            try:
+                entry, index = decoder.raw_decode(response, index)
+            except json.decoder.JSONDecodeError:
+                break
+            entries.append(entry)
+
+        return entries
+
     def _parse_response(self, response: str) -> Dict[str, str]:
         """Parse Claude's response into field values"""
         try:
@@ -128,8 +1156,14 @@ class ReibunGenerator(object):
             raise ParsingError(f"Missing required fields: {missing}")
 
 
+def _approximate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
 # Example usage with your Reibun generator
 def estimate_reibun_cost(prompt: str):
+    from .dev.estimate import TokenCostEstimator
+
     estimator = TokenCostEstimator()
     return estimator.estimate_cost(prompt, expected_output_length=200)
 
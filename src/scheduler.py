@@ -0,0 +1,278 @@
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limited, overloaded and transient server errors.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RATE_LIMITED_STATUS_CODES = {429, 529}
+
+# How often to re-check for a free concurrency slot.
+SLOT_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """Token bucket refilled continuously over a fixed period."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = max(1.0, float(capacity))
+        self.period = period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, limit: float, remaining: float, now: float) -> None:
+        """Aligns the bucket with the limits reported by the API."""
+        self.capacity = max(1.0, float(limit))
+        self.tokens = min(float(remaining), self.capacity)
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+
+class RateLimitScheduler:
+    """Paces API calls to stay within the account's rate limits.
+
+    Keeps token buckets for requests and tokens per minute, synchronised from
+    the `anthropic-ratelimit-*` response headers, retries rate limited and
+    transient failures with jittered exponential backoff (honouring
+    `retry-after`), and adapts the number of concurrent requests with AIMD:
+    +1 per window of successes, halved on every rate limit.
+
+    Safe to share between threads and event loops.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 50,
+        tokens_per_minute: int = 50000,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._max_concurrency = max(1, max_concurrency)
+        self._concurrency = float(self._max_concurrency)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+        self._lock = threading.Lock()
+
+    @property
+    def concurrency(self) -> int:
+        return int(self._concurrency)
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """Runs `fn` once capacity is available, retrying retryable failures."""
+        for attempt in range(self._max_retries + 1):
+            while True:
+                wait = self._try_acquire(estimated_tokens)
+                if not wait:
+                    break
+                time.sleep(wait)
+
+            try:
+                result = fn()
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self._release()
+
+            if error is None:
+                self._on_success()
+                return result
+
+            delay = self._on_failure(error, attempt)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+
+    async def call_async(
+        self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0
+    ) -> Any:
+        """Async counterpart of `call`."""
+        for attempt in range(self._max_retries + 1):
+            while True:
+                wait = self._try_acquire(estimated_tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+
+            try:
+                result = await fn()
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self._release()
+
+            if error is None:
+                self._on_success()
+                return result
+
+            delay = self._on_failure(error, attempt)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Synchronises the buckets with the `anthropic-ratelimit-*` headers."""
+        now = time.monotonic()
+        with self._lock:
+            self._sync_bucket(self._requests, headers, "requests", now)
+
+            # Prefer the more specific input token limit when present.
+            if not self._sync_bucket(self._tokens, headers, "input-tokens", now):
+                self._sync_bucket(self._tokens, headers, "tokens", now)
+
+    def _sync_bucket(
+        self, bucket: TokenBucket, headers: Mapping[str, str], name: str, now: float
+    ) -> bool:
+        limit = _parse_float(headers.get(f"anthropic-ratelimit-{name}-limit"))
+        remaining = _parse_float(headers.get(f"anthropic-ratelimit-{name}-remaining"))
+        if limit is None or remaining is None:
+            return False
+
+        bucket.sync(limit, remaining, now)
+        return True
+
+    def _try_acquire(self, estimated_tokens: int) -> float:
+        """Reserves a concurrency slot and bucket capacity.
+
+        :returns: 0 if reserved, otherwise the number of seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+
+            if self._in_flight >= int(self._concurrency):
+                return SLOT_POLL_INTERVAL
+
+            wait = max(
+                self._requests.time_until(1, now),
+                self._tokens.time_until(estimated_tokens, now),
+            )
+            if wait > 0:
+                return wait
+
+            self._requests.consume(1, now)
+            self._tokens.consume(estimated_tokens, now)
+            self._in_flight += 1
+            return 0.0
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _on_success(self) -> None:
+        with self._lock:
+            # Additive increase: one extra slot per window of successes.
+            self._concurrency = min(
+                float(self._max_concurrency),
+                self._concurrency + 1.0 / self._concurrency,
+            )
+
+    def _on_failure(self, error: Exception, attempt: int) -> Optional[float]:
+        """Works out how long to back off after a failed call.
+
+        :returns: The delay in seconds, or None if the error should be raised.
+        """
+        status_code = getattr(error, "status_code", None)
+        # Matched by name so the scheduler doesn't depend on the SDK, this also
+        # covers APITimeoutError which subclasses APIConnectionError.
+        is_connection_error = any(
+            cls.__name__ == "APIConnectionError" for cls in type(error).__mro__
+        )
+        if status_code not in RETRYABLE_STATUS_CODES and not is_connection_error:
+            return None
+
+        if attempt >= self._max_retries:
+            log.error(f"Giving up after {attempt + 1} attempts: {error}")
+            return None
+
+        backoff = min(self._max_delay, self._base_delay * 2**attempt)
+        delay = random.uniform(backoff / 2, backoff)
+
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = _parse_retry_after(response.headers)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        with self._lock:
+            if status_code in RATE_LIMITED_STATUS_CODES:
+                # Multiplicative decrease, and pause every caller until the
+                # limit has had a chance to recover.
+                self._concurrency = max(1.0, self._concurrency / 2)
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + delay
+                )
+
+        metrics.increment("retries", reason=status_code or type(error).__name__)
+        log.warning(
+            f"Request failed with {status_code or type(error).__name__}, "
+            f"retrying in {delay:.1f}s (attempt {attempt + 1})."
+        )
+        return delay
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+
+    seconds = _parse_float(value)
+    if seconds is not None:
+        return seconds
+
+    # retry-after may also be an HTTP date.
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,242 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import logging
+import threading
+
+from anki.collection import Collection, SearchNode
+from anki.notes import Note, NoteId
+from anki.utils import field_checksum
+
+from .config import AnkiConfig
+from .constants import NoteConfig, ResponseFields
+from .metrics import metrics
+from .sqlite_store import MAX_PARAMETERS, chunked, open_db, transaction
+from .utils import get_note_type, get_note_type_fields
+
+log = logging.getLogger(__name__)
+
+# Anki separates the fields of a note with this character.
+FIELD_SEPARATOR = "\x1f"
+
+
+class GenerationWatermarks:
+    """SQLite-backed modification times and target field checksums of notes
+    as of their last generation.
+
+    A note whose modification time has moved past its watermark has been
+    edited since. If its target field no longer matches the checksum, the
+    edit changed its word.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Location of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = open_db(
+            path,
+            [
+                """CREATE TABLE IF NOT EXISTS watermarks (
+                    note_id INTEGER PRIMARY KEY,
+                    note_type_id INTEGER NOT NULL,
+                    checksum INTEGER NOT NULL,
+                    mod INTEGER NOT NULL DEFAULT 0
+                )""",
+                "CREATE INDEX IF NOT EXISTS watermarks_note_type "
+                "ON watermarks (note_type_id)",
+            ],
+        )
+
+        columns = {
+            row[1] for row in self._conn.execute("PRAGMA table_info(watermarks)")
+        }
+        if "mod" not in columns:
+            # Checked against the notes once, then moved up to their mod.
+            self._conn.execute(
+                "ALTER TABLE watermarks ADD COLUMN mod INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def record(self, rows: Iterable[Tuple[int, int, int, int]]) -> None:
+        """Stores `(note id, note type id, checksum, mod)` rows for generated
+        notes."""
+        with self._lock, transaction(self._conn):
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO watermarks (note_id, note_type_id, "
+                "checksum, mod) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def refresh(self, rows: Iterable[Tuple[int, int]]) -> None:
+        """Moves watermarks up to `(mod, note id)`, for notes edited without
+        changing their word."""
+        with self._lock, transaction(self._conn):
+            self._conn.executemany(
+                "UPDATE watermarks SET mod = ? WHERE note_id = ?", rows
+            )
+
+    def for_note_type(self, note_type_id: int) -> Dict[int, Tuple[int, int]]:
+        """Returns the `(mod, checksum)` watermarks of a note type's notes,
+        keyed by note id."""
+        with self._lock:
+            return {
+                note_id: (mod, checksum)
+                for note_id, mod, checksum in self._conn.execute(
+                    "SELECT note_id, mod, checksum FROM watermarks "
+                    "WHERE note_type_id = ?",
+                    (note_type_id,),
+                )
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM watermarks")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM watermarks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class NoteSelector:
+    """Finds the notes that still need a reibun, without loading every note.
+
+    A note needs one if its target field is filled and either its mapped
+    sentence field is empty, or its target field has changed since its reibun
+    was last generated. Empty fields are found with Anki's own search, built
+    from each note type's field mappings. Changed words are found by having
+    SQLite compare the modification times in the notes table against the
+    recorded watermarks, and checking only the target fields of the notes
+    edited since. Edits to any other field, e.g. fixing up a generated
+    sentence by hand, don't make a note need a new reibun.
+    """
+
+    def __init__(self, config: AnkiConfig, watermarks: GenerationWatermarks):
+        self.config = config
+        self.watermarks = watermarks
+
+    def build_queries(self, col: Collection) -> Dict[int, str]:
+        """Builds a search for the notes of each configured note type whose
+        sentence field is empty.
+
+        :returns: The search strings, keyed by note type id.
+        """
+        queries = {}
+        for note_type in col.models.all_names_and_ids():
+            fields = self._resolve_fields(col, note_type.id, note_type.name)
+            if fields is None:
+                continue
+
+            target_field, sentence_field = fields
+            queries[note_type.id] = col.build_search_string(
+                SearchNode(note=note_type.name),
+                SearchNode(
+                    negated=SearchNode(
+                        field=SearchNode.Field(field_name=target_field, text="")
+                    )
+                ),
+                SearchNode(field=SearchNode.Field(field_name=sentence_field, text="")),
+            )
+        return queries
+
+    def select(self, col: Collection) -> List[NoteId]:
+        """Returns the ids of the notes that need a reibun, oldest first."""
+        note_ids = set()
+        with metrics.span("note_selection") as span:
+            for note_type_id, query in self.build_queries(col).items():
+                missing = col.find_notes(query)
+                stale = self._find_stale(col, note_type_id)
+                log.debug(
+                    f"Note type {note_type_id}: {len(missing)} missing, "
+                    f"{len(stale)} with a changed word since generation."
+                )
+                note_ids.update(missing)
+                note_ids.update(stale)
+            span.set("notes", len(note_ids))
+
+        return sorted(note_ids)
+
+    def record_generated(self, notes: Iterable[Note]) -> None:
+        """Records the target fields of notes whose reibun was just generated.
+
+        :param notes: The notes, with the target field they were generated
+            from. They needn't be saved yet.
+        """
+        rows = []
+        for note in notes:
+            note_type_config = self.config.get_note_type_config(get_note_type(note))
+            target_field = note_type_config.get(NoteConfig.TARGET)
+            if note.id and target_field and target_field in note:
+                checksum = field_checksum(note[target_field])
+                rows.append((note.id, note.mid, checksum, note.mod))
+
+        if rows:
+            self.watermarks.record(rows)
+
+    def _find_stale(self, col: Collection, note_type_id: int) -> List[NoteId]:
+        generated = self.watermarks.for_note_type(note_type_id)
+        if not generated:
+            return []
+
+        note_type = col.models.get(note_type_id)
+        fields = self._resolve_fields(col, note_type_id, note_type["name"])
+        if fields is None:
+            return []
+        target_ord = get_note_type_fields(note_type).ords[fields[0]]
+
+        stale = []
+        unchanged = []
+        watermarks = [(note_id, mod) for note_id, (mod, _) in generated.items()]
+        # Two bound parameters per note.
+        for chunk in chunked(watermarks, MAX_PARAMETERS // 2):
+            values = ",".join(["(?, ?)"] * len(chunk))
+            # Only the raw fields of notes edited since generation are read.
+            rows = col.db.all(
+                f"WITH watermarks (id, mod) AS (VALUES {values}) "
+                "SELECT notes.id, notes.mod, notes.flds FROM notes "
+                "JOIN watermarks ON notes.id = watermarks.id "
+                "WHERE notes.mid = ? AND notes.mod > watermarks.mod",
+                *[value for watermark in chunk for value in watermark],
+                note_type_id,
+            )
+            for note_id, mod, flds in rows:
+                checksum = field_checksum(flds.split(FIELD_SEPARATOR)[target_ord])
+                if checksum != generated[note_id][1]:
+                    stale.append(NoteId(note_id))
+                else:
+                    unchanged.append((mod, note_id))
+
+        # Not read again until they're edited again.
+        if unchanged:
+            self.watermarks.refresh(unchanged)
+        return stale
+
+    def _resolve_fields(
+        self, col: Collection, note_type_id: int, note_type_name: str
+    ) -> Optional[Tuple[str, str]]:
+        """Looks up the target and sentence field names of a note type.
+
+        :returns: The field names, or None if the note type isn't set up for
+            generation.
+        """
+        note_type_config = self.config.get_note_type_config(note_type_name)
+        target_field = note_type_config.get(NoteConfig.TARGET)
+        sentence_field = note_type_config.get(NoteConfig.FIELDS, {}).get(
+            ResponseFields.SENTENCE
+        )
+        if not target_field or not sentence_field:
+            return None
+
+        sentence_field = sentence_field.replace(" [Append]", "")
+        note_type = col.models.get(note_type_id)
+        names = get_note_type_fields(note_type).names if note_type else ()
+        if target_field not in names or sentence_field not in names:
+            log.warning(
+                f"Skipping note type {note_type_name}, its mapped fields no "
+                f"longer exist."
+            )
+            return None
+
+        return target_field, sentence_field
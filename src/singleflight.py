@@ -0,0 +1,106 @@
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+
+import logging
+import threading
+from concurrent.futures import Future
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single call.
+
+    The first caller for a key runs the call, every caller arriving while it is
+    still in flight waits for and receives the same result, or exception. Sync
+    callers on worker threads and async callers on any event loop can share a
+    call, as they all wait on the same `concurrent.futures.Future`.
+    """
+
+    def __init__(self, name: str, rejoin_on: Tuple[Type[BaseException], ...] = ()):
+        """
+        :param name: Label for the `coalesced_calls` counter.
+        :param rejoin_on: Exceptions raised by another caller's call that
+            shouldn't be shared, e.g. cancellation. Callers waiting on such a
+            call start or join a new one instead.
+        """
+        self._name = name
+        self._rejoin_on = rejoin_on
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def call(self, key: str, func: Callable[[], Any]) -> Any:
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+
+            self._count_coalesced("sync")
+            try:
+                return future.result()
+            except self._rejoin_on:
+                continue
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+
+        self._finish(key, future, result=result)
+        return result
+
+    async def call_async(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        import asyncio
+
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+
+            self._count_coalesced("async")
+            try:
+                return await asyncio.wrap_future(future)
+            except self._rejoin_on:
+                continue
+
+        try:
+            result = await func()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+
+        self._finish(key, future, result=result)
+        return result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _finish(
+        self, key: str, future: Future, result: Any = None, exception=None
+    ) -> None:
+        # Remove the entry first, so callers woken by the result can't join a
+        # call that has already finished.
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def _count_coalesced(self, path: str) -> None:
+        log.debug(f"Joined an in-flight {self._name} call.")
+        metrics.increment("coalesced_calls", kind=self._name, path=path)
@@ -0,0 +1,74 @@
+"""Shared setup of the add-on's SQLite stores.
+
+Generation runs on background threads, so each store shares a single
+connection guarded by its own lock rather than one connection per thread.
+Connections are in autocommit mode, with explicit transactions where several
+statements must apply together.
+"""
+
+from typing import Iterable, Iterator, Sequence, TypeVar
+
+import sqlite3
+from contextlib import contextmanager
+
+T = TypeVar("T")
+
+# Bound parameters per statement, below the limit of older SQLite versions.
+MAX_PARAMETERS = 500
+
+
+def open_db(path: str, schema: Iterable[str] = ()) -> sqlite3.Connection:
+    """Opens a store's database with write-ahead logging.
+
+    :param path: Location of the SQLite database file.
+    :param schema: Statements creating the store's tables and indices, if they
+        don't exist yet.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in schema:
+        conn.execute(statement)
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    """Runs the block in a transaction, rolled back if the block raises."""
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def evict_least_recent(
+    conn: sqlite3.Connection, table: str, key_column: str, max_rows: int
+) -> None:
+    """Deletes the least recently accessed rows of `table` beyond `max_rows`,
+    going by its `accessed` column.
+
+    :param max_rows: Number of rows kept, 0 keeps every row.
+    """
+    if max_rows <= 0:
+        return
+
+    (count,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    overflow = count - max_rows
+    if overflow <= 0:
+        return
+
+    conn.execute(
+        f"DELETE FROM {table} WHERE {key_column} IN "
+        f"(SELECT {key_column} FROM {table} ORDER BY accessed ASC LIMIT ?)",
+        (overflow,),
+    )
+
+
+def chunked(values: Sequence[T], size: int = MAX_PARAMETERS) -> Iterator[Sequence[T]]:
+    """Splits `values` into chunks that can each be bound to one statement,
+    e.g. as the ids of an `IN (?, ...)` list."""
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
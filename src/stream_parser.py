@@ -0,0 +1,86 @@
+from typing import List, Optional, Tuple
+
+import json
+
+
+class IncrementalJSONParser:
+    """Extracts top-level string fields from a JSON object as it streams in.
+
+    Each call to `feed` returns the `(key, value)` pairs whose string value
+    was completed by that chunk, so fields can be used before the rest of the
+    object has arrived. Non-string values are skipped, and any text around
+    the object (e.g. a preamble from the model) is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._expecting_key = False
+        self._current_key: Optional[str] = None
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self._buffer += chunk
+        completed = []
+
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self._done:
+            char = buffer[self._pos]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    field = self._on_string_end(buffer[self._string_start : self._pos + 1])
+                    if field is not None:
+                        completed.append(field)
+
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1 and char == "{":
+                    self._expecting_key = True
+
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._done = True
+
+            elif char == "," and self._depth == 1:
+                self._expecting_key = True
+                self._current_key = None
+
+            self._pos += 1
+
+        return completed
+
+    def _on_string_end(self, raw: str) -> Optional[Tuple[str, str]]:
+        if self._depth != 1:
+            return None
+
+        value = json.loads(raw)
+        if self._expecting_key:
+            self._expecting_key = False
+            self._current_key = value
+            return None
+
+        if self._current_key is None:
+            return None
+
+        key, self._current_key = self._current_key, None
+        return key, value
@@ -112,6 +112,8 @@ class FieldMappingDialog(QDialog):
 
         if self._target_field_name:
             self.set_combobox_item("Sentence", self._target_field_name)
+        else:
+            self._target_field_name = existing_config.get(NoteConfig.TARGET, None)
 
         difficulty = existing_config.get(NoteConfig.DIFFICULTY, None)
         if difficulty:
@@ -193,6 +195,7 @@ class FieldMappingDialog(QDialog):
             NoteConfig.FIELDS: self._field_mappings,
             NoteConfig.DIFFICULTY: self._get_difficulty(),
             NoteConfig.CONTEXT: self._get_context(),
+            NoteConfig.TARGET: self._target_field_name,
         }
 
     def _get_context(self):
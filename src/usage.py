@@ -0,0 +1,145 @@
+from typing import Optional
+
+import time
+import threading
+from dataclasses import dataclass
+
+from .sqlite_store import open_db, transaction
+
+# Requests averaged over by default, and kept for each model and mode.
+USAGE_WINDOW = 500
+
+
+@dataclass
+class UsageAverages:
+    """Mean token usage per generated word over a sample of recorded requests."""
+
+    sample_size: int
+    input_tokens: float
+    output_tokens: float
+    cache_creation_input_tokens: float
+    cache_read_input_tokens: float
+
+    @property
+    def prompt_tokens(self) -> float:
+        """Every prompt token, whether it was billed as input or via the cache."""
+        return (
+            self.input_tokens
+            + self.cache_creation_input_tokens
+            + self.cache_read_input_tokens
+        )
+
+
+class UsageLedger:
+    """SQLite-backed record of the token usage reported for each request.
+
+    Unlike estimates from the local tokenizer, these are the counts the API
+    actually billed, so they are used to calibrate cost estimates. Only the
+    most recent `USAGE_WINDOW` requests of each model and mode are kept, which
+    covers the most recent requests matching any filter of `averages`.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Location of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = open_db(
+            path,
+            [
+                """CREATE TABLE IF NOT EXISTS usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recorded REAL NOT NULL,
+                    model TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    words INTEGER NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    cache_creation_input_tokens INTEGER NOT NULL,
+                    cache_read_input_tokens INTEGER NOT NULL
+                )""",
+                "CREATE INDEX IF NOT EXISTS usage_model_mode ON usage (model, mode)",
+            ],
+        )
+
+    def record(self, usage, model: str, mode: str = "single", words: int = 1) -> None:
+        """Stores the `usage` of one API response.
+
+        :param usage: The `Usage` of a message response.
+        :param model: Model that served the request.
+        :param mode: How the request was made, e.g. "single", "packed" or "batch".
+        :param words: Number of words generated by the request.
+        """
+        with self._lock, transaction(self._conn):
+            self._conn.execute(
+                "INSERT INTO usage (recorded, model, mode, words, input_tokens, "
+                "output_tokens, cache_creation_input_tokens, cache_read_input_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    model,
+                    mode,
+                    words,
+                    usage.input_tokens,
+                    usage.output_tokens,
+                    getattr(usage, "cache_creation_input_tokens", 0) or 0,
+                    getattr(usage, "cache_read_input_tokens", 0) or 0,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM usage WHERE model = ? AND mode = ? AND id <= "
+                "(SELECT id FROM usage WHERE model = ? AND mode = ? "
+                "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (model, mode, model, mode, USAGE_WINDOW),
+            )
+
+    def averages(
+        self,
+        model: Optional[str] = None,
+        mode: Optional[str] = None,
+        limit: int = USAGE_WINDOW,
+    ) -> Optional[UsageAverages]:
+        """Averages the most recent requests, per word generated.
+
+        :param model: Only include requests served by this model.
+        :param mode: Only include requests made in this mode.
+        :param limit: Number of most recent requests to average over, at most
+            `USAGE_WINDOW` are kept.
+        :returns: The averages, or None if no matching requests were recorded.
+        """
+        conditions, params = [], []
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+        if mode is not None:
+            conditions.append("mode = ?")
+            params.append(mode)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), SUM(words), SUM(input_tokens), SUM(output_tokens), "
+                "SUM(cache_creation_input_tokens), SUM(cache_read_input_tokens) "
+                f"FROM (SELECT * FROM usage {where} ORDER BY id DESC LIMIT ?)",
+                (*params, limit),
+            ).fetchone()
+
+        count, words = row[0], row[1]
+        if not count or not words:
+            return None
+
+        return UsageAverages(
+            sample_size=count,
+            input_tokens=row[2] / words,
+            output_tokens=row[3] / words,
+            cache_creation_input_tokens=row[4] / words,
+            cache_read_input_tokens=row[5] / words,
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
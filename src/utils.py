@@ -1,9 +1,11 @@
-from typing import Optional
+from typing import Optional, Dict, Tuple
 
 import re
+from dataclasses import dataclass
 
 from aqt import mw, editor
 from anki.notes import Note
+from anki.models import NotetypeDict
 from aqt.operations import QueryOp
 
 
@@ -30,16 +32,51 @@ def get_note_type(note: Note) -> str:
     return note_info["name"]
 
 
-def get_field_names_from_note(note: Note) -> list:
-    note_type = get_note_type(note)
-    if not note_type:
-        return []
+@dataclass(frozen=True)
+class NoteTypeFields:
+    """Field layout of a note type at a given modification time."""
+
+    mod: int
+    names: Tuple[str, ...]
+    ords: Dict[str, int]
+
+
+# Field layouts keyed by notetype id, rebuilt when the notetype's mod changes.
+_field_index: Dict[int, NoteTypeFields] = {}
+
+
+def get_note_type_fields(note_type: NotetypeDict) -> NoteTypeFields:
+    """Returns the ordered field names and name -> ordinal map of a note type.
+
+    :param note_type: The notetype dict, e.g. from `note.note_type()`.
+    """
+    fields = _field_index.get(note_type["id"])
+    if fields is None or fields.mod != note_type["mod"]:
+        names = tuple(
+            field["name"] for field in sorted(note_type["flds"], key=lambda x: x["ord"])
+        )
+        fields = NoteTypeFields(
+            mod=note_type["mod"],
+            names=names,
+            ords={name: index for index, name in enumerate(names)},
+        )
+        _field_index[note_type["id"]] = fields
+    return fields
 
-    model = mw.col.models.by_name(note_type)
-    if not model:
+
+def get_note_fields(note: Note) -> Optional[NoteTypeFields]:
+    note_info = note.note_type()
+    if not note_info:
+        return None
+    return get_note_type_fields(note_info)
+
+
+def get_field_names_from_note(note: Note) -> list:
+    fields = get_note_fields(note)
+    if not fields:
         return []
 
-    return [field["name"] for field in sorted(model["flds"], key=lambda x: x["ord"])]
+    return list(fields.names)
 
 
 def get_current_field_name(note: Note, editor: editor.Editor) -> Optional[str]:
@@ -0,0 +1,53 @@
+"""Loads the add-on as a package without running Anki.
+
+Run from the repository root with the Python environment Anki uses::
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "dev")
+)
+
+import benchmark  # noqa: E402
+
+benchmark.load_package()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def metrics_dir(tmp_path_factory):
+    """Keeps the tests' spans out of the user's metrics."""
+    metrics = benchmark.import_module("metrics").metrics
+    metrics._directory = str(tmp_path_factory.mktemp("metrics"))
+    yield metrics._directory
+    metrics.flush()
+
+
+@pytest.fixture(autouse=True)
+def user_files(tmp_path, monkeypatch):
+    """Keeps the stores the add-on creates out of its user_files folder."""
+    directory = tmp_path / "user_files"
+    monkeypatch.setattr(
+        benchmark.import_module("paths"), "USER_FILES_DIR", str(directory)
+    )
+    return directory
+
+
+@pytest.fixture
+def generator():
+    """A generator using the defaults of config.json."""
+    config = benchmark.import_module("config")
+    reibun = benchmark.import_module("reibun")
+    return reibun.ReibunGenerator(config.AnkiConfig())
+
+
+@pytest.fixture
+def mock_server():
+    mock_server = benchmark.import_module("dev.mock_server")
+    with mock_server.MockClaudeServer(seed=0) as server:
+        yield server
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+
+import pytest
+from benchmark import import_module
+
+batch = import_module("batch")
+
+
+def _requests(count):
+    return {
+        f"reibun-{index}": {
+            "model": "claude-3-haiku-20240307",
+            "max_tokens": 300,
+            "messages": [{"role": "user", "content": f"word {index}"}],
+        }
+        for index in range(count)
+    }
+
+
+def _processor(server, process_response=json.loads, poll_interval=0.01, **kwargs):
+    from anthropic import Anthropic
+
+    client = Anthropic(base_url=server.base_url, api_key="mock", max_retries=0)
+    return batch.ReibunBatchProcessor(
+        client, process_response, poll_interval=poll_interval, **kwargs
+    )
+
+
+def test_requeues_only_failed_requests(mock_server):
+    mock_server.fail_custom_ids = {"reibun-1", "reibun-3"}
+
+    responses = _processor(mock_server).run(_requests(4))
+
+    submitted = [sorted(custom_ids) for custom_ids in mock_server.submitted_custom_ids]
+    assert submitted == [
+        ["reibun-0", "reibun-1", "reibun-2", "reibun-3"],
+        ["reibun-1", "reibun-3"],
+    ]
+    assert sorted(responses) == ["reibun-0", "reibun-1", "reibun-2", "reibun-3"]
+    assert all(response["sentence"] for response in responses.values())
+
+
+def test_gives_up_after_max_attempts(mock_server):
+    mock_server.fail_custom_ids = {"reibun-0"}
+
+    responses = _processor(mock_server, max_attempts=1).run(_requests(2))
+
+    assert mock_server.submitted_custom_ids == [["reibun-0", "reibun-1"]]
+    assert sorted(responses) == ["reibun-1"]
+
+
+def test_requeues_unparsable_responses(mock_server):
+    calls = []
+
+    def process_response(text):
+        calls.append(text)
+        if len(calls) == 1:
+            raise ValueError("Invalid JSON")
+        return json.loads(text)
+
+    responses = _processor(mock_server, process_response).run(_requests(1))
+
+    assert mock_server.submitted_custom_ids == [["reibun-0"], ["reibun-0"]]
+    assert list(responses) == ["reibun-0"]
+
+
+def test_cancel_stops_waiting_on_the_batch(mock_server):
+    mock_server.polls_until_ended = 10**6
+    started = threading.Event()
+    processor = _processor(
+        mock_server, poll_interval=60.0, on_status=lambda _: started.set()
+    )
+
+    def cancel():
+        started.wait()
+        processor.cancel()
+
+    canceller = threading.Thread(target=cancel)
+    canceller.start()
+    start = time.monotonic()
+    responses = processor.run(_requests(2))
+    canceller.join()
+
+    # Woken by the cancel rather than sleeping out the poll interval.
+    assert time.monotonic() - start < 5
+    assert responses == {}
+    assert len(mock_server.submitted_custom_ids) == 1
+
+
+def test_submit_failure_raises(mock_server):
+    mock_server.stop()
+
+    with pytest.raises(batch.BatchProcessingError):
+        _processor(mock_server).run(_requests(1))
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+from benchmark import import_module
+
+cache = import_module("cache")
+
+ResponseCache = cache.ResponseCache
+
+RESPONSE = {"sentence": "食べてみて。", "translation": "Try eating it."}
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    response_cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    yield response_cache
+    response_cache.close()
+
+
+def _key(word="食べる", difficulty="N5", context=None, prompt="prompt"):
+    return ResponseCache.make_key(word, difficulty, context, prompt, "model")
+
+
+def test_responses_are_cached(response_cache):
+    assert response_cache.get(_key()) is None
+
+    response_cache.put(_key(), RESPONSE)
+
+    assert response_cache.get(_key()) == RESPONSE
+    response_cache.delete(_key())
+    assert response_cache.get(_key()) is None
+
+
+def test_keys_normalize_the_word_only():
+    assert _key("ｶﾀｶﾅ") == _key(" カタカナ ")
+    assert _key() != _key(difficulty="N4")
+    assert _key() != _key(context="Formal")
+    assert _key() != _key(prompt="edited prompt")
+    assert _key() != ResponseCache.make_key("食べる", "N5", None, "prompt", "other")
+
+
+def test_expired_responses_are_dropped(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    response_cache = ResponseCache(path, ttl_seconds=60)
+    response_cache.put(_key(), RESPONSE)
+    response_cache.put(_key("見る"), RESPONSE)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    assert response_cache.get(_key()) is None
+    assert len(response_cache) == 1
+    response_cache.close()
+
+    # The rest are purged when the cache is next opened.
+    response_cache = ResponseCache(path, ttl_seconds=60)
+    assert len(response_cache) == 0
+    response_cache.close()
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    response_cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    response_cache.put(_key("食べる"), RESPONSE)
+    response_cache.put(_key("見る"), RESPONSE)
+    response_cache.get(_key("食べる"))
+
+    response_cache.put(_key("飲む"), RESPONSE)
+
+    assert len(response_cache) == 2
+    assert response_cache.get(_key("食べる")) == RESPONSE
+    assert response_cache.get(_key("見る")) is None
+    response_cache.close()
+
+
+def test_generations_are_served_from_the_cache(generator, monkeypatch):
+    requests = []
+
+    def request_reibun(request, cache_key, on_field, job):
+        requests.append(request)
+        generator.cache.put(cache_key, RESPONSE)
+        return RESPONSE
+
+    monkeypatch.setattr(generator, "_request_reibun", request_reibun)
+
+    assert generator.generate_response("食べる", difficulty="N5") == RESPONSE
+    assert generator.generate_response("食べる", difficulty="N5") == RESPONSE
+    assert len(requests) == 1
+
+    generator.generate_response("食べる", difficulty="N5", bypass_cache=True)
+    generator.generate_response("食べる", difficulty="N4")
+    assert len(requests) == 3
@@ -0,0 +1,112 @@
+import pytest
+from benchmark import import_module
+
+candidates = import_module("candidates")
+constants = import_module("constants")
+
+CandidatePool = candidates.CandidatePool
+ConfigKeys = constants.ConfigKeys
+
+CANDIDATES = [{"sentence": f"文{index}。"} for index in range(3)]
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = CandidatePool(str(tmp_path / "pool.sqlite3"))
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def requests(generator, monkeypatch):
+    """Records the requests made by the generator instead of making them."""
+    made = []
+
+    def generate_candidates(target_phrase, count, **kwargs):
+        made.append(("candidates", target_phrase, count))
+        return CANDIDATES
+
+    def generate_reibun(target_phrase, bypass_cache=False, **kwargs):
+        made.append(("single", target_phrase, bypass_cache))
+        return {"sentence": "単。"}
+
+    monkeypatch.setattr(generator, "_generate_candidates", generate_candidates)
+    monkeypatch.setattr(generator, "_generate_reibun", generate_reibun)
+    setattr(generator.config, ConfigKeys.CANDIDATE_COUNT, 3)
+    return made
+
+
+def test_advancing_cycles_through_the_pool(pool):
+    key = CandidatePool.make_key(1, "食べる", None, None)
+    assert pool.current(key) is None
+
+    pool.store(key, 1, CANDIDATES)
+
+    assert pool.current(key) == (0, 3, CANDIDATES[0])
+    assert [pool.advance(key)[0] for _ in range(4)] == [1, 2, 0, 1]
+    assert pool.current(key) == (1, 3, CANDIDATES[1])
+
+
+def test_pools_are_kept_across_restarts(tmp_path):
+    path = str(tmp_path / "pool.sqlite3")
+    key = CandidatePool.make_key(1, "食べる", "N5", None)
+    pool = CandidatePool(path)
+    pool.store(key, 1, CANDIDATES)
+    pool.advance(key)
+    pool.close()
+
+    pool = CandidatePool(path)
+    try:
+        assert pool.current(key) == (1, 3, CANDIDATES[1])
+    finally:
+        pool.close()
+
+
+def test_pools_are_keyed_by_note_and_options():
+    key = CandidatePool.make_key(1, "食べる", "N5", "Formal")
+
+    assert key == CandidatePool.make_key(1, " 食べる ", "N5", "Formal")
+    assert key != CandidatePool.make_key(2, "食べる", "N5", "Formal")
+    assert key != CandidatePool.make_key(1, "食べる", "N4", "Formal")
+    assert key != CandidatePool.make_key(1, "食べる", "N5", None)
+
+
+def test_least_recently_used_pools_are_evicted(tmp_path):
+    pool = CandidatePool(str(tmp_path / "pool.sqlite3"), max_pools=2)
+    keys = [CandidatePool.make_key(note_id, "食べる", None, None) for note_id in (1, 2)]
+    for note_id, key in enumerate(keys, 1):
+        pool.store(key, note_id, CANDIDATES)
+    pool.advance(keys[0])
+
+    pool.store(CandidatePool.make_key(3, "食べる", None, None), 3, CANDIDATES)
+
+    assert len(pool) == 2
+    assert pool.current(keys[0]) is not None
+    assert pool.current(keys[1]) is None
+    pool.close()
+
+
+def test_corrupt_pools_are_discarded(pool):
+    key = CandidatePool.make_key(1, "食べる", None, None)
+    pool.store(key, 1, [])
+
+    assert pool.advance(key) is None
+    assert len(pool) == 0
+
+
+def test_saved_notes_are_served_from_their_pool(generator, requests):
+    first = generator.generate_response("食べる", note_id=1)
+    again = generator.generate_response("食べる", note_id=1)
+    following = generator.next_candidate_response(1, "食べる")
+
+    assert (first, again, following) == (CANDIDATES[0], CANDIDATES[0], CANDIDATES[1])
+    assert requests == [("candidates", "食べる", 3)]
+
+
+def test_unsaved_notes_are_generated_directly(generator, requests):
+    # Notes opened in the Add window don't have an id yet.
+    assert generator.generate_response("食べる", note_id=0) == {"sentence": "単。"}
+    assert generator.next_candidate_response(0, "食べる") == {"sentence": "単。"}
+
+    assert requests == [("single", "食べる", False), ("single", "食べる", True)]
+    assert len(generator.candidate_pool) == 0
@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from benchmark import import_module
+
+cli = import_module("cli")
+constants = import_module("constants")
+
+ConfigKeys = constants.ConfigKeys
+
+
+class FakeGenerator:
+    def generate_response(self, word, difficulty=None, context=None):
+        if word == "失敗":
+            raise RuntimeError("Mock failure")
+        return {"sentence": f"{word}の文。", "translation": f"{difficulty} {context}"}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(cli, "_worker_generator", FakeGenerator())
+    # Runs `_generate` in this process, where the fake generator is set.
+    with ThreadPoolExecutor(2) as pool:
+        yield pool
+
+
+def _run(rows, pool, mappings=None, **kwargs):
+    mappings = mappings or {"sentence": "Sentence", "translation": "Translation"}
+    columns = ["Word"] + list(mappings.values())
+    out = io.StringIO()
+    writer = csv.DictWriter(out, columns, delimiter="\t", extrasaction="ignore")
+    counts = cli.run(iter(rows), writer, "Word", mappings, pool, 1, **kwargs)
+    lines = out.getvalue().splitlines()
+    return counts, [line.split("\t") for line in lines]
+
+
+def test_run_writes_rows_in_input_order(pool):
+    rows = [{"Word": word} for word in ("食べる", "見る", "飲む", "行く")]
+
+    counts, written = _run(rows, pool, difficulty="N5", context="Formal")
+
+    assert counts == (4, 0, 0)
+    assert written == [
+        [word, f"{word}の文。", "N5 Formal"] for word in ("食べる", "見る", "飲む", "行く")
+    ]
+
+
+def test_run_skips_filled_and_empty_rows(pool):
+    rows = [
+        {"Word": "食べる", "Sentence": "done", "Translation": "done"},
+        {"Word": " "},
+        {"Word": "見る", "Sentence": "partial"},
+    ]
+
+    counts, written = _run(rows, pool)
+
+    assert counts == (1, 0, 2)
+    assert written[0] == ["食べる", "done", "done"]
+    assert written[2] == ["見る", "見るの文。", "None None"]
+
+
+def test_run_keeps_failed_rows(pool):
+    counts, written = _run([{"Word": "失敗"}, {"Word": "見る"}], pool)
+
+    assert counts == (1, 1, 0)
+    assert written[0] == ["失敗", "", ""]
+
+
+def test_run_only_fills_returned_fields(pool):
+    mappings = {"sentence": "Sentence", "notes": "Notes"}
+
+    _, written = _run([{"Word": "見る", "Notes": "mine"}], pool, mappings)
+
+    assert written == [["見る", "見るの文。", "mine"]]
+
+
+def test_parse_mappings():
+    mappings = cli.parse_mappings(["sentence=Example", "reading=Furigana"])
+
+    assert mappings["sentence"] == "Example"
+    assert mappings["reading"] == "Furigana"
+    assert mappings["translation"] == "translation"
+
+    for value in ("unknown=Column", "sentence=", "sentence"):
+        with pytest.raises(ValueError):
+            cli.parse_mappings([value])
+
+
+def test_worker_overrides_split_rate_limits(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps({ConfigKeys.RATE_LIMIT_RPM: 100, ConfigKeys.CANDIDATE_COUNT: 3})
+    )
+
+    overrides = cli.worker_overrides(4, str(config_path))
+
+    assert overrides[ConfigKeys.RATE_LIMIT_RPM] == 25
+    assert overrides[ConfigKeys.RATE_LIMIT_TPM] >= 1
+    assert overrides[ConfigKeys.CANDIDATE_COUNT] == 3
+    assert cli.worker_overrides(10**9, None)[ConfigKeys.RATE_LIMIT_RPM] == 1
+
+
+def test_worker_overrides_reject_unknown_options(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"no_such_option": 1}))
+
+    with pytest.raises(ValueError):
+        cli.worker_overrides(1, str(config_path))
+
+
+def test_read_delimited(tmp_path):
+    path = tmp_path / "words.csv"
+    path.write_text("﻿Word,Sentence\n食べる,\n見る,done\n", encoding="utf-8")
+
+    columns, rows = cli.read_delimited(str(path), ",")
+
+    assert columns == ["Word", "Sentence"]
+    assert list(rows) == [
+        {"Word": "食べる", "Sentence": ""},
+        {"Word": "見る", "Sentence": "done"},
+    ]
@@ -0,0 +1,147 @@
+import copy
+
+import pytest
+from benchmark import import_module
+
+config = import_module("config")
+constants = import_module("constants")
+
+ConfigKeys = constants.ConfigKeys
+
+
+class FakeMainWindow:
+    """Stands in for Anki's main window, running debounced writes on demand.
+
+    Users start out with the defaults of config.json.
+    """
+
+    def __init__(self, defaults):
+        self.defaults = defaults
+        self.user_config = copy.deepcopy(defaults)
+        self.writes = []
+        self.timers = []
+        self.updated_action = None
+
+        self.addonManager = self
+        self.taskman = self
+        self.progress = self
+
+    def getConfig(self, module):
+        return copy.deepcopy(self.user_config)
+
+    def writeConfig(self, module, conf):
+        self.writes.append(copy.deepcopy(conf))
+
+    def addonConfigDefaults(self, addon):
+        return self.defaults
+
+    def setConfigUpdatedAction(self, module, action):
+        self.updated_action = action
+
+    def run_on_main(self, callback):
+        callback()
+
+    def single_shot(self, delay, callback, requires_collection):
+        self.timers.append((delay, callback))
+
+    def fire_timers(self):
+        timers, self.timers = self.timers, []
+        for _, callback in timers:
+            callback()
+
+
+@pytest.fixture
+def mw(monkeypatch):
+    # Read before patching, while config.json is still loaded from disk.
+    mw = FakeMainWindow(config.AnkiConfig().get_defaults())
+    monkeypatch.setattr(config, "mw", mw)
+    return mw
+
+
+def test_nothing_is_written_at_startup_without_new_options(mw):
+    config.AnkiConfig()
+
+    assert mw.writes == []
+    assert mw.timers == []
+
+
+def test_missing_options_are_added_without_touching_others(mw):
+    del mw.user_config[ConfigKeys.CANDIDATE_COUNT]
+    mw.user_config[ConfigKeys.RATE_LIMIT_RPM] = 7
+
+    anki_config = config.AnkiConfig()
+
+    assert len(mw.writes) == 1
+    written = mw.writes[0]
+    default_count = mw.defaults[ConfigKeys.CANDIDATE_COUNT]
+    assert written[ConfigKeys.CANDIDATE_COUNT] == default_count
+    assert written[ConfigKeys.RATE_LIMIT_RPM] == 7
+    assert getattr(anki_config, ConfigKeys.RATE_LIMIT_RPM) == 7
+
+
+def test_rapid_changes_are_written_once(mw):
+    anki_config = config.AnkiConfig()
+
+    for rpm in (10, 20, 30):
+        setattr(anki_config, ConfigKeys.RATE_LIMIT_RPM, rpm)
+    anki_config.set_note_type_config("Vocab", {"target_field": "Word"})
+
+    assert getattr(anki_config, ConfigKeys.RATE_LIMIT_RPM) == 30
+    assert mw.writes == []
+    assert [delay for delay, _ in mw.timers] == [config.WRITE_DEBOUNCE_MS]
+
+    mw.fire_timers()
+
+    assert len(mw.writes) == 1
+    assert mw.writes[0][ConfigKeys.RATE_LIMIT_RPM] == 30
+    assert mw.writes[0]["Vocab"] == {"target_field": "Word"}
+
+
+def test_flush_writes_pending_changes_immediately(mw):
+    anki_config = config.AnkiConfig()
+    setattr(anki_config, ConfigKeys.RATE_LIMIT_RPM, 10)
+
+    anki_config.flush()
+    mw.fire_timers()
+
+    assert len(mw.writes) == 1
+
+
+def test_note_type_configs_are_copies(mw):
+    anki_config = config.AnkiConfig()
+    anki_config.set_note_type_config("Vocab", {"field_mappings": {"sentence": "A"}})
+
+    note_type_config = anki_config.get_note_type_config("Vocab")
+    note_type_config["field_mappings"]["sentence"] = "B"
+
+    assert anki_config.get_note_type_config("Vocab") == {
+        "field_mappings": {"sentence": "A"}
+    }
+    assert anki_config.get_note_type_config("Other") == {}
+
+
+def test_listeners_are_told_about_changes(mw):
+    anki_config = config.AnkiConfig()
+    changes = []
+    anki_config.add_change_listener(lambda: changes.append("first"))
+    anki_config.add_change_listener(lambda: 1 / 0)
+    anki_config.add_change_listener(lambda: changes.append("last"))
+
+    setattr(anki_config, ConfigKeys.RATE_LIMIT_RPM, 10)
+    edited = dict(mw.user_config, **{ConfigKeys.RATE_LIMIT_RPM: 20})
+    mw.updated_action(edited)
+
+    assert changes == ["first", "last", "first", "last"]
+    assert getattr(anki_config, ConfigKeys.RATE_LIMIT_RPM) == 20
+    # Edits from Anki's config editor are already saved.
+    mw.fire_timers()
+    assert mw.writes == []
+
+
+def test_unknown_options_are_rejected(mw):
+    anki_config = config.AnkiConfig()
+
+    with pytest.raises(AttributeError):
+        anki_config.no_such_option
+    with pytest.raises(AttributeError):
+        anki_config.no_such_option = 1
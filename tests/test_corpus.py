@@ -0,0 +1,115 @@
+import os
+import time
+
+import pytest
+from benchmark import import_module
+
+corpus = import_module("corpus")
+
+SENTENCES = [
+    # sentence, translation, reading
+    ("私は毎朝パンを食べる。", "I eat bread every morning.", "私[わたし]は毎朝[まいあさ]パンを食[た]べる。"),
+    ("昨日は寿司を食べました。", "I ate sushi yesterday.", ""),
+    ("食べ物が好きです。", "I like food.", ""),
+    ("水を飲む。", "Drink water.", ""),
+    ("彼は毎日図書館で長い時間本を読んでいます。", "He reads at the library every day.", ""),
+]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "corpus.tsv"
+    path.write_text(
+        "\n".join("\t".join(columns) for columns in SENTENCES) + "\n",
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+@pytest.fixture
+def index(source, tmp_path):
+    index = corpus.CorpusIndex.open_or_build(source, str(tmp_path / "index"))
+    yield index
+    index.close()
+
+
+def test_lookup_bolds_the_word(index):
+    response = index.lookup("食べる", "N5").to_response()
+
+    # The reading spells the word with furigana, so it can't be bolded.
+    assert response == {
+        "sentence": "私は毎朝パンを<b>食べる</b>。",
+        "translation": "I eat bread every morning.",
+    }
+
+
+def test_reading_is_bolded_when_it_contains_the_word(index):
+    response = index.lookup("パン", "N5").to_response()
+
+    assert response["reading"] == "私[わたし]は毎朝[まいあさ]<b>パン</b>を食[た]べる。"
+
+
+def test_lookup_falls_back_to_the_stem(source, tmp_path):
+    with open(source, "w", encoding="utf-8") as f:
+        f.write("昨日は寿司を食べました。\tI ate sushi yesterday.\n")
+        f.write("食べ物が好きです。\tI like food.\n")
+    index = corpus.CorpusIndex.open_or_build(source, str(tmp_path / "stems"))
+
+    response = index.lookup("食べる", "N5").to_response()
+    index.close()
+
+    assert response["sentence"] == "昨日は寿司を<b>食べ</b>ました。"
+
+
+def test_stem_must_be_followed_by_okurigana(source, tmp_path):
+    with open(source, "w", encoding="utf-8") as f:
+        f.write("食べ物が好きです。\tI like food.\n")
+    index = corpus.CorpusIndex.open_or_build(source, str(tmp_path / "stems"))
+
+    assert index.lookup("食べる", "N5") is None
+    index.close()
+
+
+def test_lookup_respects_the_difficulty_length(index):
+    assert index.lookup("読む", "N5") is None
+    assert index.lookup("本", "N2").sentence.startswith("彼は毎日図書館")
+
+
+def test_lookup_misses_unknown_words(index):
+    assert index.lookup("走る") is None
+    assert index.lookup("") is None
+
+
+def test_index_is_rebuilt_when_the_corpus_changes(source, tmp_path):
+    directory = str(tmp_path / "rebuilt")
+    corpus.CorpusIndex.open_or_build(source, directory).close()
+
+    with open(source, "a", encoding="utf-8") as f:
+        f.write("走るのが好きです。\tI like running.\n")
+    index = corpus.CorpusIndex.open_or_build(source, directory)
+
+    assert len(index) == len(SENTENCES) + 1
+    assert index.lookup("走る").translation == "I like running."
+    index.close()
+
+
+def test_generator_loads_the_corpus_in_the_background(generator, source):
+    generator.config.corpus_path = source
+    assert generator._lookup_corpus("食べる", "N5", None) is None
+
+    generator.start_loading_corpus()
+    while generator._corpus_loading:
+        time.sleep(0.01)
+
+    response = generator._lookup_corpus("食べる", "N5", None)
+    assert response["sentence"] == "私は毎朝パンを<b>食べる</b>。"
+    # The corpus has no notion of register.
+    assert generator._lookup_corpus("食べる", "N5", "Formal") is None
+
+
+def test_generator_skips_a_missing_corpus(generator, tmp_path):
+    generator.config.corpus_path = str(tmp_path / "missing.tsv")
+
+    assert generator.load_corpus() is None
+    generator.start_loading_corpus()
+    assert not generator._corpus_loading
@@ -0,0 +1,143 @@
+import pytest
+from benchmark import BenchmarkNote, FIELD_MAPPINGS, import_module
+
+bulk = import_module("bulk")
+job_queue = import_module("job_queue")
+
+JobState = job_queue.JobState
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def queue(queue_path):
+    queue = job_queue.BulkJobQueue(queue_path)
+    yield queue
+    queue.close()
+
+
+def _items(words, difficulty="N5"):
+    return [
+        bulk.BulkItem(BenchmarkNote(note_id), word, FIELD_MAPPINGS, difficulty)
+        for note_id, word in enumerate(words, 1)
+    ]
+
+
+def _response(word):
+    return {
+        "sentence": f"{word}の文。",
+        "reading": "",
+        "translation": f"A sentence with {word}.",
+        "notes": "",
+    }
+
+
+class FakeGenerator:
+    """Generates a response per word, failing for the words in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requested = []
+
+    def create_async_client(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def generate_response_async(self, client, word, difficulty, context):
+        self.requested.append(word)
+        if word in self.failing:
+            raise RuntimeError("Mock failure")
+        return _response(word)
+
+    def apply_response(self, note, response, field_mappings):
+        note["Sentence"] = response["sentence"]
+
+
+def test_resume_reuses_stored_responses(queue):
+    items = _items(["食べる", "見る"])
+    assert queue.enqueue(items) == {}
+    queue.mark_in_flight([1, 2])
+    queue.store_responses({1: _response("食べる")})
+
+    # Interrupted before either note was written.
+    assert queue.unfinished() == [1, 2]
+    assert queue.enqueue(items) == {1: _response("食べる")}
+    assert queue.counts() == {JobState.DONE: 1, JobState.PENDING: 1}
+
+
+def test_resume_regenerates_changed_notes(queue):
+    queue.enqueue(_items(["食べる"]))
+    queue.mark_in_flight([1])
+    queue.store_responses({1: _response("食べる")})
+
+    assert queue.enqueue(_items(["飲む"])) == {}
+    assert queue.enqueue(_items(["飲む"], difficulty="N3")) == {}
+    assert queue.counts() == {JobState.PENDING: 1}
+
+
+def test_applied_jobs_are_dropped(queue):
+    items = _items(["食べる", "見る"])
+    queue.enqueue(items)
+    queue.mark_in_flight([1, 2])
+    queue.store_responses({1: _response("食べる"), 2: _response("見る")})
+    queue.mark_applied([1, 2])
+
+    assert queue.unfinished() == []
+    assert queue.enqueue(items) == {}
+    assert queue.counts() == {JobState.PENDING: 2}
+
+
+def test_failed_jobs_are_pruned_after_max_attempts(queue):
+    items = _items(["食べる"])
+    for _ in range(job_queue.MAX_ATTEMPTS):
+        queue.enqueue(items)
+        assert queue.unfinished() == [1]
+        queue.mark_in_flight([1])
+        queue.store_responses({1: {}})
+
+    assert queue.unfinished() == []
+
+
+def test_changed_note_restarts_attempts(queue):
+    queue.enqueue(_items(["食べる"]))
+    for _ in range(job_queue.MAX_ATTEMPTS - 1):
+        queue.mark_in_flight([1])
+        queue.store_responses({1: {}})
+        queue.enqueue(_items(["食べる"]))
+
+    queue.enqueue(_items(["飲む"]))
+    queue.mark_in_flight([1])
+    queue.store_responses({1: {}})
+
+    assert queue.unfinished() == [1]
+
+
+def test_runner_resumes_interrupted_run(queue_path):
+    items = _items(["食べる", "見る", "飲む"])
+    generator = FakeGenerator(failing={"見る"})
+    queue = job_queue.BulkJobQueue(queue_path)
+    result = bulk.BulkReibunRunner(generator, job_queue=queue).run(items)
+    queue.close()
+
+    assert len(result.updated_notes) == 2
+    assert [note.id for note in result.failed_notes] == [2]
+
+    # Restarted before the updated notes were written to the collection.
+    items = _items(["食べる", "見る", "飲む"])
+    generator = FakeGenerator()
+    queue = job_queue.BulkJobQueue(queue_path)
+    assert queue.unfinished() == [1, 2, 3]
+    result = bulk.BulkReibunRunner(generator, job_queue=queue).run(items)
+
+    assert generator.requested == ["見る"]
+    assert sorted(note.id for note in result.updated_notes) == [1, 2, 3]
+    assert items[0].note["Sentence"] == "食べるの文。"
+    queue.close()
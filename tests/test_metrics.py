@@ -0,0 +1,60 @@
+import json
+import threading
+
+import pytest
+from benchmark import import_module
+
+metrics_module = import_module("metrics")
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    return metrics_module.Metrics(str(tmp_path))
+
+
+def test_spans_are_written_to_the_event_log(metrics, tmp_path):
+    with metrics.span("api_call", mode="single") as span:
+        span.mark("first_token")
+    with pytest.raises(ValueError):
+        with metrics.span("parse_validate"):
+            raise ValueError()
+    metrics.wait_for_events()
+
+    with open(tmp_path / metrics_module.EVENTS_FILENAME, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f]
+    assert [event["span"] for event in events] == ["api_call", "parse_validate"]
+    assert events[0]["mode"] == "single"
+    assert "first_token" in events[0]["marks_ms"]
+    assert events[1]["error"] == "ValueError"
+
+
+def test_snapshots_are_written_off_the_calling_thread(metrics, monkeypatch):
+    threads = []
+    write_snapshot = metrics._write_snapshot
+
+    def record_thread():
+        threads.append(threading.current_thread())
+        write_snapshot()
+
+    monkeypatch.setattr(metrics, "_write_snapshot", record_thread)
+    with metrics.span("menu_build"):
+        pass
+    metrics.wait_for_events()
+
+    assert threads and threading.current_thread() not in threads
+
+
+def test_flush_writes_the_snapshot(metrics, tmp_path):
+    metrics.increment("requests", mode="single")
+    metrics.increment("requests", 2, mode="single")
+    metrics.observe("span_duration", 0.02, span="api_call")
+    metrics.flush()
+
+    snapshot = (tmp_path / metrics_module.SNAPSHOT_FILENAME).read_text("utf-8")
+    assert 'reibun_requests_total{mode="single"} 3' in snapshot
+    assert 'reibun_span_duration_seconds_bucket{span="api_call",le="0.025"} 1' in (
+        snapshot
+    )
+    assert 'reibun_span_duration_seconds_count{span="api_call"} 1' in snapshot
+    # Snapshot requests aren't events.
+    assert not (tmp_path / metrics_module.EVENTS_FILENAME).read_text("utf-8")
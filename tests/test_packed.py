@@ -0,0 +1,147 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from benchmark import import_module
+
+bulk = import_module("bulk")
+reibun = import_module("reibun")
+
+
+def _entry(word, sentence=None):
+    return {
+        "word": word,
+        "sentence": sentence or f"{word}の文。",
+        "reading": "よみ",
+        "translation": "A sentence.",
+        "notes": "",
+    }
+
+
+def _item(word, difficulty="N5", context=None):
+    return bulk.BulkItem(None, word, {}, difficulty=difficulty, context_type=context)
+
+
+class FakeEstimator:
+    """Counts one token per character, avoiding the tokenizer download."""
+
+    def count_tokens(self, text):
+        return len(text)
+
+    def count_tokens_batch(self, texts):
+        return [len(text) for text in texts]
+
+
+class FakeClient:
+    """Answers the packed request with entries for the given words only, and
+    any following single-word request for 見る."""
+
+    def __init__(self, words):
+        self.words = words
+        self.requests = []
+        self.messages = SimpleNamespace(
+            with_raw_response=SimpleNamespace(create=self.create)
+        )
+
+    async def create(self, **request):
+        self.requests.append(request)
+        if len(self.requests) == 1:
+            entries = [_entry(word) for word in self.words]
+        else:
+            entries = _entry("見る")
+        text = json.dumps(entries, ensure_ascii=False)
+        response = SimpleNamespace(
+            content=[SimpleNamespace(text=text)],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=10),
+        )
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+def test_entries_are_matched_to_the_requested_words(generator):
+    response = json.dumps(
+        [_entry("ﾀﾍﾞﾙ"), _entry("飲む"), {"word": "見る"}, "noise", _entry("行く")]
+    )
+
+    results = generator._process_packed_response(response, ["タベル", "見る", "行く"])
+
+    assert list(results) == ["タベル", "行く"]
+    assert results["タベル"]["sentence"] == "ﾀﾍﾞﾙの文。"
+    assert "word" not in results["行く"]
+
+
+def test_complete_entries_of_truncated_responses_are_kept(generator):
+    response = json.dumps([_entry("食べる"), _entry("見る")], ensure_ascii=False)
+
+    results = generator._process_packed_response(response[:-30], ["食べる", "見る"])
+
+    assert list(results) == ["食べる"]
+
+
+def test_bare_objects_are_accepted(generator):
+    response = json.dumps(_entry("食べる"), ensure_ascii=False)
+
+    assert list(generator._process_packed_response(response, ["食べる"])) == ["食べる"]
+    assert generator._process_packed_response("Sorry.", ["食べる"]) == {}
+
+
+def test_candidates_drop_invalid_and_repeated_entries(generator):
+    response = json.dumps(
+        [_entry("食べる", "一。"), {"sentence": "二。"}, _entry("食べる", "一。")]
+        + [_entry("食べる", "三。")],
+        ensure_ascii=False,
+    )
+
+    candidates = generator._process_candidate_response(response)
+
+    assert [candidate["sentence"] for candidate in candidates] == ["一。", "三。"]
+
+
+def test_packs_share_difficulty_and_context(generator):
+    generator._estimator = FakeEstimator()
+    items = [
+        _item("食べる"),
+        _item("見る", context="Formal"),
+        _item("飲む"),
+        _item("行く", difficulty="N1"),
+    ]
+
+    packs = generator.plan_packs(items, token_budget=10**6)
+
+    assert [[item.target_phrase for item in pack] for pack in packs] == [
+        ["食べる", "飲む"],
+        ["見る"],
+        ["行く"],
+    ]
+
+
+def test_packs_stay_within_the_token_budget(generator):
+    generator._estimator = FakeEstimator()
+    items = [_item(f"語{index}") for index in range(3)]
+
+    assert [len(pack) for pack in generator.plan_packs(items, 0)] == [1, 1, 1]
+
+
+def test_packs_stay_within_the_output_limit(generator):
+    generator._estimator = FakeEstimator()
+    max_words = reibun.MAX_PACKED_OUTPUT_TOKENS // reibun.MAX_TOKENS
+    items = [_item(f"語{index}") for index in range(max_words + 1)]
+
+    packs = generator.plan_packs(items, token_budget=10**6)
+
+    assert [len(pack) for pack in packs] == [max_words, 1]
+
+
+def test_missing_words_fall_back_to_single_requests(generator):
+    client = FakeClient(["食べる"])
+    items = [_item("食べる"), _item("見る"), _item("食べる")]
+
+    responses = asyncio.run(generator.generate_packed_responses_async(client, items))
+
+    assert [response["sentence"] for response in responses] == [
+        "食べるの文。",
+        "見るの文。",
+        "食べるの文。",
+    ]
+    assert len(client.requests) == 2
+    # Packed results are cached for single-word generation too.
+    assert generator.generate_response("食べる", difficulty="N5")["reading"] == "よみ"
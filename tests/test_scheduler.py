@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from benchmark import import_module
+
+scheduler = import_module("scheduler")
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def _scheduler(**kwargs):
+    kwargs.setdefault("requests_per_minute", 10_000)
+    kwargs.setdefault("tokens_per_minute", 10_000_000)
+    return scheduler.RateLimitScheduler(base_delay=0.001, max_delay=0.01, **kwargs)
+
+
+def _failing(*errors, result="ok"):
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return call
+
+
+def test_successes_increase_concurrency_additively():
+    limiter = _scheduler(max_concurrency=8)
+    limiter._concurrency = 2.0
+
+    limiter.call(lambda: None)
+    limiter.call(lambda: None)
+
+    # +1/concurrency per success, i.e. +1 per window of successes.
+    assert limiter._concurrency == pytest.approx(2.0 + 1 / 2 + 1 / 2.5)
+    assert limiter.concurrency == 2
+
+
+def test_concurrency_is_capped():
+    limiter = _scheduler(max_concurrency=2)
+
+    for _ in range(10):
+        limiter.call(lambda: None)
+
+    assert limiter.concurrency == 2
+
+
+def test_rate_limits_halve_concurrency():
+    limiter = _scheduler(max_concurrency=8)
+
+    result = limiter.call(_failing(StatusError(429), StatusError(529)))
+
+    assert result == "ok"
+    assert limiter.concurrency == 2
+
+
+def test_transient_errors_are_retried_without_backing_off_concurrency():
+    limiter = _scheduler(max_concurrency=8)
+
+    assert limiter.call(_failing(StatusError(500), StatusError(503))) == "ok"
+    assert limiter.concurrency == 8
+
+
+def test_client_errors_are_not_retried():
+    limiter = _scheduler()
+    call = _failing(StatusError(400))
+
+    with pytest.raises(StatusError):
+        limiter.call(call)
+    assert call() == "ok"
+
+
+def test_gives_up_after_max_retries():
+    limiter = _scheduler(max_retries=2)
+
+    with pytest.raises(StatusError):
+        limiter.call(_failing(*[StatusError(529) for _ in range(3)]))
+
+
+def test_backoff_is_exponential_with_jitter():
+    limiter = scheduler.RateLimitScheduler(base_delay=1.0, max_delay=60.0)
+
+    for attempt, backoff in enumerate([1.0, 2.0, 4.0, 8.0]):
+        delay = limiter._on_failure(StatusError(500), attempt)
+        assert backoff / 2 <= delay <= backoff
+
+    assert limiter._on_failure(StatusError(500), 5) is None
+
+
+def test_backoff_honours_retry_after():
+    limiter = scheduler.RateLimitScheduler(base_delay=1.0)
+
+    delay = limiter._on_failure(StatusError(429, {"retry-after": "30"}), 0)
+
+    assert delay == 30.0
+
+
+def test_async_calls_are_retried():
+    limiter = _scheduler(max_concurrency=4)
+    call = _failing(StatusError(429))
+
+    async def generate():
+        return call()
+
+    assert asyncio.run(limiter.call_async(generate)) == "ok"
+    assert limiter.concurrency == 2
+
+
+def test_headers_sync_the_request_bucket():
+    limiter = _scheduler()
+
+    limiter.update_from_headers(
+        {
+            "anthropic-ratelimit-requests-limit": "60",
+            "anthropic-ratelimit-requests-remaining": "0",
+        }
+    )
+
+    # One request refills every second.
+    assert 0 < limiter._try_acquire(0) <= 1.0
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+from benchmark import import_module
+
+pytest.importorskip("anki.collection")
+
+from anki.collection import Collection  # noqa: E402
+
+config = import_module("config")
+selection = import_module("selection")
+
+
+@pytest.fixture
+def col(tmp_path):
+    import anki.lang
+
+    # Set up by Anki at startup, field checksums strip HTML through it.
+    anki.lang.set_lang("en_US")
+    col = Collection(str(tmp_path / "collection.anki2"))
+    note_type = col.models.new("Vocab")
+    for name in ("Word", "Sentence", "Reading"):
+        col.models.add_field(note_type, col.models.new_field(name))
+    template = col.models.new_template("Card")
+    template["qfmt"] = "{{Word}}"
+    template["afmt"] = "{{Sentence}}"
+    col.models.add_template(note_type, template)
+    col.models.add(note_type)
+    yield col
+    col.close()
+
+
+@pytest.fixture
+def selector(tmp_path):
+    anki_config = config.AnkiConfig()
+    anki_config.set_note_type_config(
+        "Vocab",
+        {"target_field": "Word", "field_mappings": {"sentence": "Sentence"}},
+    )
+    watermarks = selection.GenerationWatermarks(str(tmp_path / "watermarks.sqlite3"))
+    yield selection.NoteSelector(anki_config, watermarks)
+    watermarks.close()
+
+
+def _add_notes(col, *fields):
+    note_type = col.models.by_name("Vocab")
+    ids = []
+    for word, sentence in fields:
+        note = col.new_note(note_type)
+        note["Word"] = word
+        note["Sentence"] = sentence
+        col.add_note(note, 1)
+        ids.append(note.id)
+    return ids
+
+
+def _edit(col, note_id, **fields):
+    # Modification times are in seconds.
+    time.sleep(1.1)
+    note = col.get_note(note_id)
+    for name, value in fields.items():
+        note[name] = value
+    col.update_note(note)
+
+
+def test_selects_notes_missing_a_sentence(col, selector):
+    ids = _add_notes(col, ("食べる", ""), ("見る", "done"), ("", ""), ("飲む", ""))
+
+    assert selector.select(col) == [ids[0], ids[3]]
+
+
+def test_selects_notes_whose_word_changed(col, selector):
+    ids = _add_notes(col, ("食べる", "done"), ("見る", "done"))
+    selector.record_generated([col.get_note(note_id) for note_id in ids])
+    assert selector.select(col) == []
+
+    _edit(col, ids[0], Word="飲む")
+
+    assert selector.select(col) == [ids[0]]
+
+    selector.record_generated([col.get_note(ids[0])])
+    assert selector.select(col) == []
+
+
+def test_hand_edits_are_ignored_and_refresh_the_watermark(col, selector):
+    (note_id,) = _add_notes(col, ("食べる", "done"))
+    selector.record_generated([col.get_note(note_id)])
+
+    _edit(col, note_id, Sentence="Fixed by hand", Reading="たべる")
+
+    assert selector.select(col) == []
+    note_type_id = col.models.by_name("Vocab")["id"]
+    mod, _ = selector.watermarks.for_note_type(note_type_id)[note_id]
+    assert mod == col.get_note(note_id).mod
+
+
+def test_unconfigured_note_types_are_skipped(col, selector):
+    _add_notes(col, ("食べる", ""))
+    selector.config.set_note_type_config("Vocab", {})
+
+    assert selector.build_queries(col) == {}
+    assert selector.select(col) == []
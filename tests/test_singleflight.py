@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from benchmark import import_module
+
+metrics = import_module("metrics").metrics
+singleflight = import_module("singleflight")
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _wait_for_followers(name, count, path="sync"):
+    while metrics.get_counter("coalesced_calls", kind=name, path=path) < count:
+        threading.Event().wait(0.001)
+
+
+def _run_with_followers(flight, name, func, followers=3):
+    """Calls `func` once as the leader, with `followers` concurrent callers
+    joining before it returns."""
+    release = threading.Event()
+    calls = []
+
+    def leader():
+        calls.append("leader")
+        release.wait()
+        return func(len(calls))
+
+    with ThreadPoolExecutor(followers + 1) as pool:
+        futures = [pool.submit(flight.call, "key", leader)]
+        while flight.in_flight() == 0:
+            threading.Event().wait(0.001)
+        futures += [
+            pool.submit(flight.call, "key", leader) for _ in range(followers)
+        ]
+        _wait_for_followers(name, followers)
+        release.set()
+        return calls, [future.exception() or future.result() for future in futures]
+
+
+def test_concurrent_calls_share_one_result():
+    flight = singleflight.SingleFlight("test_share")
+
+    calls, results = _run_with_followers(
+        flight, "test_share", lambda count: f"result {count}"
+    )
+
+    assert calls == ["leader"]
+    assert results == ["result 1"] * 4
+    assert flight.in_flight() == 0
+
+
+def test_exceptions_are_shared():
+    flight = singleflight.SingleFlight("test_errors")
+
+    def fail(count):
+        raise ValueError("failed")
+
+    calls, results = _run_with_followers(flight, "test_errors", fail)
+
+    assert calls == ["leader"]
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_rejoin_on_starts_a_new_call():
+    flight = singleflight.SingleFlight("test_rejoin", rejoin_on=(Cancelled,))
+
+    def cancel_first(count):
+        if count == 1:
+            raise Cancelled()
+        return "result"
+
+    calls, results = _run_with_followers(
+        flight, "test_rejoin", cancel_first, followers=1
+    )
+
+    assert calls == ["leader", "leader"]
+    assert isinstance(results[0], Cancelled)
+    assert results[1] == "result"
+
+
+def test_calls_after_completion_run_again():
+    flight = singleflight.SingleFlight("test_sequential")
+
+    assert flight.call("key", lambda: 1) == 1
+    assert flight.call("key", lambda: 2) == 2
+
+
+def test_async_callers_join_sync_calls():
+    flight = singleflight.SingleFlight("test_async")
+    release = threading.Event()
+
+    def leader():
+        release.wait()
+        return "result"
+
+    async def follow():
+        async def never():
+            pytest.fail("Follower ran its own call")
+
+        return await flight.call_async("key", never)
+
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(flight.call, "key", leader)
+        while flight.in_flight() == 0:
+            threading.Event().wait(0.001)
+
+        async def main():
+            task = asyncio.ensure_future(follow())
+            while not metrics.get_counter(
+                "coalesced_calls", kind="test_async", path="async"
+            ):
+                await asyncio.sleep(0.001)
+            release.set()
+            return await task
+
+        assert asyncio.run(main()) == "result"
+        assert future.result() == "result"
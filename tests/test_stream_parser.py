@@ -0,0 +1,39 @@
+from benchmark import import_module
+
+stream_parser = import_module("stream_parser")
+
+RESPONSE = (
+    'Here is the reibun: {"sentence": "彼は\\"はい\\"と言った。", '
+    '"count": 2, "nested": {"sentence": "ignored"}, "tags": ["a", "b"], '
+    '"translation": "He said \\"yes\\"."} Done.'
+)
+
+
+def _feed(chunks):
+    parser = stream_parser.IncrementalJSONParser()
+    return parser, [parser.feed(chunk) for chunk in chunks]
+
+
+def test_fields_are_completed_as_they_arrive():
+    parser, completed = _feed(list(RESPONSE))
+
+    fields = [field for chunk in completed for field in chunk]
+    assert fields == [
+        ("sentence", '彼は"はい"と言った。'),
+        ("translation", 'He said "yes".'),
+    ]
+    assert parser.done
+
+
+def test_field_is_returned_by_the_chunk_closing_it():
+    parser, completed = _feed(['{"sentence": "食べ', 'る", "rea', 'ding": ""'])
+
+    assert completed == [[], [("sentence", "食べる")], [("reading", "")]]
+    assert not parser.done
+
+
+def test_text_after_the_object_is_ignored():
+    parser, completed = _feed(['{"a": "1"}', ' {"b": "2"}'])
+
+    assert completed == [[("a", "1")], []]
+    assert parser.done
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from benchmark import import_module
+
+estimate = import_module("dev.estimate")
+metrics = import_module("metrics").metrics
+reibun = import_module("reibun")
+usage = import_module("usage")
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = usage.UsageLedger(str(tmp_path / "ledger.sqlite3"))
+    yield ledger
+    ledger.close()
+
+
+def _usage(input_tokens, output_tokens, cache_write=0, cache_read=0):
+    return SimpleNamespace(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_creation_input_tokens=cache_write,
+        cache_read_input_tokens=cache_read,
+    )
+
+
+def test_averages_are_per_word(ledger):
+    ledger.record(_usage(100, 50), reibun.MODEL)
+    ledger.record(_usage(500, 300, cache_read=100), reibun.MODEL, "packed", words=4)
+
+    averages = ledger.averages()
+
+    assert averages.sample_size == 2
+    assert averages.input_tokens == 120
+    assert averages.output_tokens == 70
+    assert averages.cache_read_input_tokens == 20
+    assert averages.prompt_tokens == 140
+
+
+def test_averages_filter_by_model_and_mode(ledger):
+    ledger.record(_usage(100, 50), reibun.MODEL)
+    ledger.record(_usage(300, 90), reibun.MODEL, "packed", words=3)
+    ledger.record(_usage(9000, 900), "claude-3-opus-20240229")
+
+    assert ledger.averages(model=reibun.MODEL).sample_size == 2
+    assert ledger.averages(model=reibun.MODEL, mode="single").input_tokens == 100
+    assert ledger.averages(mode="packed").output_tokens == 30
+    assert ledger.averages(mode="batch") is None
+
+
+def test_averages_use_the_most_recent_requests(ledger):
+    ledger.record(_usage(1000, 1000), reibun.MODEL)
+    ledger.record(_usage(100, 10), reibun.MODEL)
+
+    assert ledger.averages(limit=1).input_tokens == 100
+
+
+def test_only_the_averaging_window_is_kept(ledger, monkeypatch):
+    monkeypatch.setattr(usage, "USAGE_WINDOW", 3)
+    for tokens in range(1, 6):
+        ledger.record(_usage(tokens, 1), reibun.MODEL)
+    ledger.record(_usage(100, 1), reibun.MODEL, "packed")
+
+    assert len(ledger) == 4
+    assert ledger.averages(mode="single").input_tokens == 4
+    assert ledger.averages(mode="packed").input_tokens == 100
+
+
+def test_batch_estimates_are_calibrated_for_the_generators_model(ledger):
+    ledger.record(_usage(200, 100), reibun.MODEL)
+    ledger.record(_usage(9000, 900), "claude-3-opus-20240229")
+
+    cost = estimate.TokenCostEstimator(ledger).estimate_batch_cost(10)
+
+    assert cost["model"] == reibun.MODEL
+    assert cost["calibrated_from"] == 1
+    assert cost["total_input_tokens"] == 2000
+    assert cost["total_output_tokens"] == 1000
+
+
+def test_batch_estimates_price_cache_reads(ledger):
+    estimator = estimate.TokenCostEstimator(ledger)
+    uncached = estimator.estimate_batch_cost(10, avg_prompt_tokens=1000)
+
+    output_tokens = estimate.DEFAULT_OUTPUT_TOKENS
+    ledger.record(_usage(0, output_tokens, cache_read=1000), reibun.MODEL)
+    cached = estimator.estimate_batch_cost(10)
+
+    assert cached["total_input_tokens"] == uncached["total_input_tokens"]
+    assert cached["input_cost"] == pytest.approx(
+        uncached["input_cost"] * estimate.CACHE_READ_MULTIPLIER, abs=1e-4
+    )
+
+
+def test_batch_estimates_fall_back_to_defaults():
+    cost = estimate.TokenCostEstimator().estimate_batch_cost(10)
+
+    assert cost["calibrated_from"] == 0
+    assert cost["total_input_tokens"] == 10 * estimate.DEFAULT_PROMPT_TOKENS
+    assert cost["total_output_tokens"] == 10 * estimate.DEFAULT_OUTPUT_TOKENS
+
+
+def test_generated_tokens_are_counted(generator):
+    def count(kind):
+        return metrics.get_counter("tokens", kind=kind, mode="packed")
+
+    before = {kind: count(kind) for kind in ("input", "cache_read", "output")}
+    generator._record_usage(_usage(100, 50, cache_read=2000), "packed", words=2)
+
+    assert count("input") - before["input"] == 100
+    assert count("cache_read") - before["cache_read"] == 2000
+    assert count("output") - before["output"] == 50
+    assert generator.ledger.averages(mode="packed").output_tokens == 25